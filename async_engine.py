@@ -0,0 +1,807 @@
+import argparse
+import asyncio
+import ssl
+import statistics
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlparse
+
+import h11
+
+import tracing
+import urls
+from attempt_history import HISTORY_PATH, HistoryStore, attach as attach_history, period_of
+from http_submit import PHONE_NUMBER, FormParseError, HttpSubmitter, SlotUnavailableError, parse_slot_form
+from job_queue import CANCELLED, FAILED, PENDING, RUNNING, SUCCESS, WAITING, trigger_groups
+from page_state import CONFIRMED, NOT_OPEN, UNKNOWN, classify_html, recheck_submit, redirect_target, verify_submit_response
+from prewarm import dns_cache, install_dns_cache, preflight, uninstall_dns_cache
+from retry_policy import (FATAL, GOVERNOR, AllSlotsFullError, AuthExpiredError, Backoff, ReservationCancelled,
+                          RetryPolicy, ServerBusyError, SlotNotOpenError, cancel_scope, retry_after_seconds)
+from scheduler import Trigger, estimate_server_offset
+from session_store import SessionStore
+from slot_catalog import CATALOG
+from slot_watch import SlotWatcher, submit_over_http
+from urls import cgyy_host, home_url, ids_host, normalize_activity, room_url, slot_form_url
+
+# GUI 中最多选择一个主要时间段和三个备选时间段，同时获取的表单数也以此为上限
+MAX_SLOTS = 4
+
+# run_reservation 转发给 reserve 的参数，与 automated_login 的同名参数含义相同
+RESERVE_OPTIONS = ("sync_server_clock", "fire_offset", "deadline", "trace_dir", "history_path", "cancel",
+                   "phase_listener")
+
+# 预约队列在两个开放时间之间等待时，每隔这么多秒请求一次总览页面保持会话
+QUEUE_KEEPALIVE_INTERVAL = 300
+
+# 预约队列执行期间会话失效时最多重新登录几次
+QUEUE_MAX_LOGINS = 2
+
+
+class AsyncResponse:
+    """
+    一次 HTTP 响应
+
+    属性:
+        status (int): 状态码
+        headers (dict): 响应头，键为小写
+        data (bytes): 响应体
+    """
+
+    def __init__(self, status, headers, data):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+
+class _Connection:
+    """一条 HTTP/1.1 长连接，用 h11 处理协议细节"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.protocol = h11.Connection(h11.CLIENT)
+
+    async def request(self, method, target, headers, body=None):
+        """
+        发送一个请求并读取完整响应
+
+        返回:
+            tuple: (AsyncResponse, 连接是否可以继续复用)
+        """
+        data = self.protocol.send(h11.Request(method=method, target=target, headers=headers))
+        if body:
+            data += self.protocol.send(h11.Data(data=body))
+        data += self.protocol.send(h11.EndOfMessage())
+        self.writer.write(data)
+        await self.writer.drain()
+
+        response = None
+        chunks = []
+        while True:
+            event = self.protocol.next_event()
+            if event is h11.NEED_DATA:
+                self.protocol.receive_data(await self.reader.read(65536))
+            elif isinstance(event, h11.Response):
+                response = event
+            elif isinstance(event, h11.Data):
+                chunks.append(event.data)
+            elif isinstance(event, h11.EndOfMessage):
+                break
+            elif isinstance(event, h11.ConnectionClosed):
+                raise ConnectionResetError("连接已被服务器关闭")
+
+        headers = {}
+        for name, value in response.headers:
+            headers[name.decode("latin-1").lower()] = value.decode("latin-1")
+        reusable = self.protocol.our_state is h11.DONE and self.protocol.their_state is h11.DONE
+        if reusable:
+            self.protocol.start_next_cycle()
+        return AsyncResponse(response.status_code, headers, b"".join(chunks)), reusable
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    """
+    单个站点的长连接池
+
+    同时进行的请求数不超过 max_connections，请求结束后连接放回池中供下一个请求复用；
+    空闲连接被服务器关闭时自动换一条新连接重试一次。
+
+    属性:
+        max_connections (int): 最大连接数
+        opened (int): 新建的连接数
+        requests (int): 完成的请求数
+        reused (int): 复用已有连接的请求数
+        latencies (list): [(方法, 路径, 耗时秒数, 是否复用连接), ...]
+        handshakes (list): 每次新建连接的耗时（秒），包括 DNS 解析和 TCP/TLS 握手
+    """
+
+    def __init__(self, base_url, max_connections=4, timeout=10):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.host_header = parsed.netloc
+        self.ssl = ssl.create_default_context() if parsed.scheme == "https" else None
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.opened = 0
+        self.requests = 0
+        self.reused = 0
+        self.latencies = []
+        self.handshakes = []
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def _open(self):
+        start = time.monotonic()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl,
+                                    server_hostname=self.host if self.ssl else None),
+            self.timeout)
+        self.opened += 1
+        self.handshakes.append(time.monotonic() - start)
+        return _Connection(reader, writer)
+
+    async def warm(self, count):
+        """提前建立连接，让之后的请求不必在关键路径上握手"""
+        missing = min(count, self.max_connections) - len(self._idle)
+        if missing > 0:
+            self._idle.extend(await asyncio.gather(*(self._open() for _ in range(missing))))
+
+    async def refresh(self, count):
+        """同时在 count 条连接上各发一个 HEAD 请求，确认连接仍然可用，被服务器关闭的连接会在这时重建"""
+        await asyncio.gather(*(self.request("HEAD", "/") for _ in range(min(count, self.max_connections))))
+
+    async def request(self, method, target, headers=None, body=None):
+        """
+        发送请求
+
+        参数:
+            method (str): 请求方法
+            target (str): 路径和查询字符串
+            headers (dict): 请求头
+            body (bytes): 请求体
+
+        返回:
+            AsyncResponse: 响应
+        """
+        request_headers = [("Host", self.host_header)] + list((headers or {}).items())
+        if body is not None:
+            request_headers.append(("Content-Length", str(len(body))))
+        async with self._slots:
+            for attempt in range(2):
+                connection = self._idle.pop() if self._idle else None
+                reused = connection is not None
+                if connection is None:
+                    connection = await self._open()
+                start = time.monotonic()
+                try:
+                    response, reusable = await asyncio.wait_for(
+                        connection.request(method, target, request_headers, body), self.timeout)
+                except (ConnectionError, h11.RemoteProtocolError):
+                    connection.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    connection.close()
+                    raise
+                self.latencies.append((method, target, time.monotonic() - start, reused))
+                self.requests += 1
+                self.reused += reused
+                if reusable:
+                    self._idle.append(connection)
+                else:
+                    connection.close()
+                return response
+
+    def stats(self):
+        """连接复用和请求延迟统计"""
+        durations = [elapsed for _, _, elapsed, _ in self.latencies]
+        return {
+            "requests": self.requests,
+            "connections": self.opened,
+            "reuse_rate": round(self.reused / self.requests, 3) if self.requests else None,
+            "latency_p50": round(statistics.median(durations), 6) if durations else None,
+            "handshake_p50": round(statistics.median(self.handshakes), 6) if self.handshakes else None,
+        }
+
+    def close(self):
+        """关闭所有空闲连接"""
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+
+
+class AsyncSubmitter:
+    """
+    异步获取和提交预约表单
+
+    复用已登录会话的 Cookie，所有请求走同一个到场馆预约系统的长连接池。
+
+    属性:
+        pool (AsyncConnectionPool): 长连接池
+        headers (dict): 每个请求携带的请求头（Cookie、User-Agent）
+    """
+
+    def __init__(self, cookies, user_agent=None, max_connections=4, timeout=10):
+        self.pool = AsyncConnectionPool(urls.CGYY_BASE_URL, max_connections, timeout)
+        self.headers = {"Cookie": "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies
+                                            if cookie.get("domain", cgyy_host()).lstrip(".") == cgyy_host())}
+        if user_agent:
+            self.headers["User-Agent"] = user_agent
+
+    async def _request(self, method, url, headers=None, body=None, before_send=None):
+        delay = GOVERNOR.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if before_send is not None:
+            before_send()
+        parsed = urlparse(url)
+        target = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+        response = await self.pool.request(method, target, dict(self.headers, **(headers or {})), body)
+        GOVERNOR.record(response.status, retry_after_seconds(response.headers.get("retry-after")))
+        if response.status == 429 or response.status >= 500:
+            raise ServerBusyError(response.status)
+        return response
+
+    async def fetch(self, url):
+        """
+        用当前会话获取页面 HTML
+
+        参数:
+            url (str): 页面地址
+
+        返回:
+            str: 页面 HTML
+        """
+        response = await self._request("GET", url)
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.headers.get("location", "")
+            if urlparse(location).hostname == ids_host():
+                raise AuthExpiredError("页面被重定向到统一身份认证，保存的登录会话已失效")
+            raise FormParseError(f"页面被重定向到 {location}")
+        if response.status != 200:
+            raise FormParseError(f"获取页面失败，状态码 {response.status}")
+        return response.data.decode("utf-8", errors="replace")
+
+    async def fetch_form(self, url):
+        """获取并解析预约表单，返回 (表单提交地址, 表单字段字典, 电话号码字段名)"""
+        return parse_slot_form(await self.fetch(url), url)
+
+    async def submit_form(self, url, form, phone_number, before_send=None):
+        """
+        提交已经获取到的预约表单
+
+        参数:
+            url (str): 时间段预约页面地址
+            form (tuple): fetch_form 的返回值
+            phone_number (str): 电话号码
+            before_send (callable): 发出提交请求前调用，例如 Trigger.mark_submit
+
+        返回:
+            SubmitResult: 根据响应判断的提交结果
+        """
+        action, fields, phone_name = form
+        fields = dict(fields)
+        fields[phone_name] = phone_number
+        headers = {"Content-Type": "application/x-www-form-urlencoded", "Referer": url}
+        response = await self._request("POST", action, headers, urlencode(fields).encode("utf-8"), before_send)
+        if response.status not in (200, 301, 302, 303):
+            raise FormParseError(f"提交预约表单失败，状态码 {response.status}")
+        with tracing.span("verify_submit") as span:
+            location = response.headers.get("location", "")
+            target = redirect_target(response.status, location, url)
+            target_html = None
+            if target is not None:
+                # 跳转后的页面才有提示消息，读一次；读不到时结果为 UNKNOWN，由调用方核对
+                try:
+                    target_html = await self.fetch(target)
+                except (FormParseError, ServerBusyError, AuthExpiredError, OSError, asyncio.TimeoutError) as e:
+                    print(f"读取提交后跳转的页面失败: {e}")
+            result = verify_submit_response(response.status, location, response.data.decode("utf-8", errors="replace"),
+                                            url, target_html)
+            span.attrs.update(url=url, outcome=result.outcome, reason=result.reason)
+        return result
+
+    def close(self):
+        self.pool.close()
+
+
+async def _reserve_round(submitter, room, room_name, reserve_date, slots, phone_number, trigger=None):
+    """
+    同时获取所有时间段的表单，按优先顺序提交第一个可预约的时间段
+
+    返回:
+        int: 预约成功的时间段编号
+
+    异常:
+        SlotNotOpenError: 没有预约成功，但有时间段尚未开放，应立即重试
+        AllSlotsFullError: 所选时间段均已约满
+    """
+    start = time.monotonic()
+    form_urls = [slot_form_url(room, reserve_date, slot) for slot in slots]
+    with tracing.span("prefetch_forms", slots=slots) as prefetch_span:
+        results = await asyncio.gather(*(submitter.fetch_form(url) for url in form_urls), return_exceptions=True)
+        prefetch_span.attrs["available"] = [slot for slot, result in zip(slots, results)
+                                            if not isinstance(result, BaseException)]
+
+    errors = [result for result in results if isinstance(result, BaseException)
+              and not isinstance(result, SlotUnavailableError)]
+    not_open = [slot for slot, result in zip(slots, results)
+                if isinstance(result, SlotUnavailableError) and result.state == NOT_OPEN]
+    for error in errors:
+        if isinstance(error, AuthExpiredError):
+            raise error
+
+    for slot, url, form in zip(slots, form_urls, results):
+        if isinstance(form, BaseException):
+            print(f"{slot}:{str(form)}")
+            continue
+        with tracing.span("async_submit", slot=slot) as submit_span:
+            result = await submitter.submit_form(url, form, phone_number,
+                                                 trigger.mark_submit if trigger is not None else None)
+            if result.outcome == UNKNOWN:
+                print(f"{slot}:无法确认提交结果（{result.reason}），重新获取预约表单页面核对")
+                result = recheck_submit(result, classify_html(await submitter.fetch(url), url))
+            submit_span.attrs["outcome"] = result.outcome
+        print(f"异步引擎从获取表单到提交完成耗时 {(time.monotonic() - start) * 1000:.0f} 毫秒")
+        if result.outcome != CONFIRMED:
+            # 已经获取了其他时间段的表单，被拒绝后直接提交下一个
+            print(f"{slot}:预约被拒绝: {result.reason}")
+            continue
+        print(f"预约{room_name}的{slot}时间段成功！")
+        return slot
+
+    if errors:
+        raise errors[0]
+    if not_open:
+        # 触发得稍早时表单还没有开放，按临时错误重试到开放为止，而不是按约满很快停止
+        raise SlotNotOpenError(not_open)
+    raise AllSlotsFullError("所选时间段均已约满")
+
+
+async def reserve(student_id, fitness_or_swimming, reserve_date, reserve_time, cookies=None,
+                  phone_number=PHONE_NUMBER, user_agent=None, start_at=None, sync_server_clock=True,
+                  fire_offset=0.0, deadline=60, session_store=None, trace_dir="traces", cancel=None,
+                  phase_listener=None, history_path=HISTORY_PATH, max_attempts=None, submitter=None):
+    """
+    异步预约引擎，不启动浏览器
+
+    复用已登录会话的 Cookie，通过长连接池同时获取各候选时间段的表单，按优先顺序提交第一个可预约的时间段。
+
+    参数:
+        student_id (str): 学号，用于读取保存的登录会话
+        fitness_or_swimming (str): 预约类型，"健身"/"游泳" 或 "fitness"/"swimming"
+        reserve_date (str): 预约日期，格式为 yyyy-MM-dd
+        reserve_time (list): 按优先级排列的时间段，例如 ["18:00-19:30"]，最多使用前 4 个
+        cookies (list): 已登录会话的 Cookie，为 None 时读取 SessionStore 中保存的会话
+        phone_number (str): 电话号码
+        user_agent (str): 请求携带的 User-Agent
+        start_at (datetime): 预约开放时间，为 None 时立即提交
+        sync_server_clock (bool): 定时执行时是否按服务器时钟触发
+        fire_offset (float): 定时执行时在半个往返时间之外再提前触发的秒数
+        deadline (float): 重试的时间预算（秒），从预约开放时开始计算
+        session_store (SessionStore): 读取登录会话的存储，默认为 SessionStore()
+        trace_dir (str): 分阶段追踪文件的目录，为 None 时不写文件
+        cancel (CancelToken): 用于从其他线程取消预约，取消时返回 False
+        phase_listener (callable): 阶段开始和结束时的回调，见 Tracer.add_listener
+        history_path (str): 预约历史数据库，为 None 时不记录
+        max_attempts (int): 最多尝试几轮，为 None 时只受时间预算限制
+        submitter (AsyncSubmitter): 共用的已登录客户端，由调用方关闭；为 None 时用 cookies 新建
+
+    返回:
+        bool: 是否有时间段预约成功
+
+    异常:
+        AuthExpiredError: 没有可用的登录会话，或会话已失效，需要先用浏览器登录
+    """
+    fitness_or_swimming = normalize_activity(fitness_or_swimming)
+    room, room_name = CATALOG.room(fitness_or_swimming)
+    slots = CATALOG.indexes(fitness_or_swimming, reserve_time)[:MAX_SLOTS]
+    shared = submitter is not None
+    if cookies is None and not shared:
+        cookies = (session_store or SessionStore()).load(student_id)
+        if not cookies:
+            raise AuthExpiredError("没有保存的登录会话，需要先用浏览器登录一次")
+
+    if not shared:
+        submitter = AsyncSubmitter(cookies, user_agent, max_connections=len(slots))
+    policy = RetryPolicy(budget=deadline, max_attempts=max_attempts, backoff=Backoff(cap=1.0))
+    tracer = tracing.start_run(trace_dir)
+    if phase_listener is not None:
+        tracer.add_listener(phase_listener)
+    if history_path is not None:
+        attach_history(tracer, "async", HistoryStore(history_path))
+    cancel_task = None
+    if cancel is not None:
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+
+        def cancel_task():
+            loop.call_soon_threadsafe(task.cancel)
+
+        cancel.on_cancel(cancel_task)
+    try:
+        with dns_cache(), tracing.span("run", engine="async", activity=fitness_or_swimming, date=reserve_date,
+                                       slots=slots) as run_span:
+            try:
+                # 共用的客户端已由调用方预热并保持会话，开放时间已过时直接提交，不再多请求一次总览页面
+                if not shared or (start_at is not None and start_at > datetime.now()):
+                    with tracing.span("prepare"):
+                        # 缓存 DNS 并测量握手开销，确认会话有效，同时提前建立所有连接
+                        if not shared:
+                            await asyncio.get_running_loop().run_in_executor(None, preflight, [home_url()])
+                        html = await submitter.fetch(room_url(room))
+                        if CATALOG.is_stale(fitness_or_swimming) and CATALOG.update(room, html):
+                            slots = CATALOG.indexes(fitness_or_swimming, reserve_time)[:MAX_SLOTS]
+                            run_span.attrs["slots"] = slots
+                        await submitter.pool.warm(len(slots))
+
+                trigger = None
+                if start_at is not None:
+                    clock_source = (lambda: estimate_server_offset(home_url())) if sync_server_clock else None
+                    trigger = Trigger(start_at, clock_source=clock_source, fire_offset=fire_offset)
+                    loop = asyncio.get_running_loop()
+
+                    def keepalive():
+                        asyncio.run_coroutine_threadsafe(submitter.fetch(room_url(room)), loop).result()
+
+                    def warmup():
+                        asyncio.run_coroutine_threadsafe(submitter.pool.refresh(len(slots)), loop).result()
+
+                    def wait():
+                        with cancel_scope(cancel):
+                            trigger.wait(keepalive=keepalive, warmup=warmup)
+
+                    print("准备阶段完成，等待预约开放...")
+                    with tracing.span("wait_trigger", start_at=start_at.isoformat()) as wait_span:
+                        await loop.run_in_executor(None, wait)
+                        wait_span.attrs["clock_offset"] = trigger.clock.offset
+                    policy.start()
+
+                while policy.next_attempt():
+                    try:
+                        with tracing.span("attempt", attempt=policy.attempts):
+                            slot = await _reserve_round(submitter, room, room_name, reserve_date, slots, phone_number,
+                                                        trigger)
+                        run_span.attrs["slot"] = slot
+                        return True
+                    except Exception as e:
+                        kind, delay = policy.on_error(e)
+                        print(f"执行过程中出现错误（{kind}）: {e}")
+                        if policy.needs_login:
+                            raise
+                        if kind == FATAL or delay is None:
+                            break
+                        await asyncio.sleep(delay)
+                run_span.outcome = "failed"
+                return False
+            except (asyncio.CancelledError, ReservationCancelled):
+                if cancel is None or not cancel.cancelled:
+                    raise
+                print("预约已取消")
+                run_span.outcome = "cancelled"
+                return False
+            finally:
+                run_span.attrs.update(submitter.pool.stats())
+    finally:
+        stats = submitter.pool.stats()
+        print(f"异步引擎共发出 {stats['requests']} 个请求，新建 {stats['connections']} 个连接，"
+              f"连接复用率 {stats['reuse_rate']}，请求延迟中位数 {stats['latency_p50']} 秒")
+        if not shared:
+            submitter.close()
+        if cancel_task is not None:
+            # 队列中的任务共用一个 token，结束后注销回调，避免取消时去取消已经结束的任务
+            cancel.remove_callback(cancel_task)
+        tracing.get_tracer().close()
+
+
+def watch_saved_session(student_id, fitness_or_swimming, reserve_date, reserve_time, phone_number=PHONE_NUMBER,
+                        cancel=None):
+    """
+    不启动浏览器，用保存的登录会话监控所选时间段的空位，有人取消就直接用 HTTP 提交
+
+    参数:
+        student_id (str): 学号，用于读取保存的登录会话
+        fitness_or_swimming (str): 预约类型
+        reserve_date (str): 预约日期
+        reserve_time (list): 按优先级排列的时间段，例如 ["18:00-19:30"]
+        phone_number (str): 电话号码
+        cancel (CancelToken): 用于从其他线程取消监控
+
+    返回:
+        bool: 是否预约成功
+
+    异常:
+        AuthExpiredError: 没有保存的会话或会话已失效
+    """
+    cookies = SessionStore().load(student_id)
+    if not cookies:
+        raise AuthExpiredError("没有保存的登录会话")
+    room = CATALOG.room(fitness_or_swimming)[0]
+    submitter = HttpSubmitter()
+    submitter.headers["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies
+                                            if cookie.get("domain", cgyy_host()).lstrip(".") == cgyy_host())
+    watcher = SlotWatcher(submitter, room, reserve_date, CATALOG.indexes(fitness_or_swimming, reserve_time),
+                          reserve_time)
+    try:
+        with cancel_scope(cancel):
+            return watcher.run(submit_over_http(submitter, room, reserve_date, phone_number))
+    except ReservationCancelled:
+        print("监控已取消")
+        return False
+    finally:
+        submitter.http.clear()
+
+
+async def _keep_session_until(submitter, moment, room):
+    """等待到 moment，期间定期请求总览页面保持会话；会话失效时抛出 AuthExpiredError"""
+    while True:
+        remaining = (moment - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, QUEUE_KEEPALIVE_INTERVAL))
+        if moment > datetime.now():
+            await submitter.fetch(room_url(room))
+
+
+async def reserve_queue(student_id, jobs, cookies=None, phone_number=PHONE_NUMBER, user_agent=None, lead_time=120,
+                        sync_server_clock=True, fire_offset=0.0, deadline=60, session_store=None, trace_dir="traces",
+                        cancel=None, phase_listener=None, job_listener=None, history_path=HISTORY_PATH):
+    """
+    用同一个登录会话和同一个长连接池依次执行预约队列中的任务
+
+    任务按开放时间分组（见 trigger_groups），每组在开放时间前 lead_time 秒开始准备，等待期间定期请求总览页面保持会话。
+    同一开放时间的多个任务先按优先级各提交一轮，都没有成功的再按优先级在这组剩余的时间预算内重试，
+    避免排在前面的任务重试时后面的任务错过开放时刻。每个任务的每次执行都是一次单独的运行，分别写入追踪文件和预约历史。
+
+    已经结束的任务会被跳过，会话失效时重新登录后再次调用即可从未完成的任务继续。
+
+    参数:
+        student_id (str): 学号，用于读取保存的登录会话
+        jobs (list): ReservationJob 列表，状态和结果直接写入任务
+        cookies (list): 已登录会话的 Cookie，为 None 时读取 SessionStore 中保存的会话
+        phone_number (str): 电话号码
+        user_agent (str): 请求携带的 User-Agent
+        lead_time (float): 在开放时间前多少秒开始准备
+        sync_server_clock (bool): 是否按服务器时钟触发
+        fire_offset (float): 在半个往返时间之外再提前触发的秒数
+        deadline (float): 每个开放时间的重试时间预算（秒），从开放时开始计算
+        session_store (SessionStore): 读取登录会话的存储，默认为 SessionStore()
+        trace_dir (str): 分阶段追踪文件的目录，为 None 时不写文件
+        cancel (CancelToken): 用于从其他线程取消，取消后未完成的任务都记为已取消
+        phase_listener (callable): 阶段开始和结束时的回调，见 Tracer.add_listener
+        job_listener (callable): 任务状态变化时的回调 job_listener(任务)
+        history_path (str): 预约历史数据库，为 None 时不记录
+
+    返回:
+        bool: 是否所有任务都预约成功
+
+    异常:
+        AuthExpiredError: 没有可用的登录会话，或会话已失效；正在执行的任务恢复为排队状态
+    """
+    def update(job, status, message=""):
+        job.update(status, message)
+        if job_listener is not None:
+            job_listener(job)
+
+    if cookies is None:
+        cookies = (session_store or SessionStore()).load(student_id)
+        if not cookies:
+            raise AuthExpiredError("没有保存的登录会话")
+
+    submitter = AsyncSubmitter(cookies, user_agent, max_connections=MAX_SLOTS)
+    cancel_task = None
+    if cancel is not None:
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+
+        def cancel_task():
+            loop.call_soon_threadsafe(task.cancel)
+
+        cancel.on_cancel(cancel_task)
+
+    async def run_job(job, start_at, job_deadline, max_attempts):
+        booked = []
+
+        def listener(event, span):
+            if event == "end" and span.name == "run" and span.attrs.get("slot") is not None:
+                booked.append(span.attrs["slot"])
+            if phase_listener is not None:
+                phase_listener(event, span)
+
+        update(job, RUNNING)
+        # 同一组中只有第一个任务需要等待开放时间，之后的任务开放时间已过，不再校准时钟
+        success = await reserve(student_id, job.activity, job.reserve_date, job.slots, phone_number=phone_number,
+                                start_at=start_at,
+                                sync_server_clock=sync_server_clock and start_at is not None
+                                and start_at > datetime.now(),
+                                fire_offset=fire_offset, deadline=job_deadline, trace_dir=trace_dir, cancel=cancel,
+                                phase_listener=listener, history_path=history_path, max_attempts=max_attempts,
+                                submitter=submitter)
+        if cancel is not None and cancel.cancelled:
+            raise ReservationCancelled("预约已取消")
+        if success:
+            job.booked = period_of(job.activity, booked[-1]) if booked else None
+            update(job, SUCCESS, f"已预约 {job.booked}" if job.booked else "预约成功")
+        return success
+
+    current = None
+    # 整个队列期间保留预先解析的地址，不只是每个任务的预约期间
+    install_dns_cache()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, preflight, [home_url()])
+        for group in trigger_groups([job for job in jobs if not job.finished]):
+            start_at = group[0].start_at
+            if start_at is not None and datetime.now() > start_at + timedelta(seconds=deadline):
+                for job in group:
+                    update(job, FAILED, "已错过预约开放时间")
+                continue
+            if start_at is not None and start_at - timedelta(seconds=lead_time) > datetime.now():
+                for job in group:
+                    update(job, WAITING, f"{start_at:%m-%d %H:%M:%S} 开放")
+                await _keep_session_until(submitter, start_at - timedelta(seconds=lead_time),
+                                          CATALOG.room(group[0].activity)[0])
+
+            began = datetime.now()
+            retry = []
+            for job in group:
+                current = job
+                try:
+                    if len(group) == 1:
+                        success = await run_job(job, start_at, deadline, None)
+                    else:
+                        success = await run_job(job, start_at, deadline, 1)
+                        if not success:
+                            retry.append(job)
+                            update(job, WAITING, "首轮未成功，等待同一开放时间的其他任务提交后重试")
+                            continue
+                    if not success:
+                        update(job, FAILED, "所选时间段均未预约成功")
+                except (AuthExpiredError, ReservationCancelled, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    update(job, FAILED, f"预约出错: {e}")
+
+            opened = max(began, start_at) if start_at is not None else began
+            for job in retry:
+                current = job
+                remaining = deadline - (datetime.now() - opened).total_seconds()
+                try:
+                    if remaining <= 0 or not await run_job(job, None, remaining, None):
+                        update(job, FAILED, "所选时间段均未预约成功")
+                except (AuthExpiredError, ReservationCancelled, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    update(job, FAILED, f"预约出错: {e}")
+            current = None
+    except AuthExpiredError:
+        if current is not None:
+            update(current, PENDING, "登录会话已失效，等待重新登录")
+        raise
+    except (asyncio.CancelledError, ReservationCancelled):
+        if cancel is None or not cancel.cancelled:
+            raise
+        for job in jobs:
+            if not job.finished:
+                update(job, CANCELLED)
+    finally:
+        stats = submitter.pool.stats()
+        print(f"预约队列共发出 {stats['requests']} 个请求，新建 {stats['connections']} 个连接，"
+              f"连接复用率 {stats['reuse_rate']}")
+        submitter.close()
+        uninstall_dns_cache()
+        if cancel_task is not None:
+            # 重新登录后 run_queue 会用同一个 token 再次执行队列
+            cancel.remove_callback(cancel_task)
+    return all(job.status == SUCCESS for job in jobs)
+
+
+def run_queue(student_id, password, jobs, browser_profile="fast", browser="edge", job_listener=None, **options):
+    """
+    执行预约队列，所有任务共用一个登录会话
+
+    只在没有可用的会话或会话失效时启动浏览器登录一次，保存会话后立即关闭浏览器，之后所有任务都用异步引擎提交。
+    与每个任务单独运行相比，只需登录一次，也只有一个进程和一个连接池。
+
+    参数:
+        student_id (str): 学号
+        password (str): 密码，需要登录时使用
+        jobs (list): ReservationJob 列表
+        browser_profile (str | dict): 登录时使用的浏览器配置
+        browser (str): 登录时使用的浏览器
+        job_listener (callable): 任务状态变化时的回调 job_listener(任务)
+        options: reserve_queue 的其他参数
+
+    返回:
+        bool: 是否所有任务都预约成功
+    """
+    logins = 0
+    try:
+        while True:
+            try:
+                return asyncio.run(reserve_queue(student_id, jobs, job_listener=job_listener, **options))
+            except AuthExpiredError as e:
+                if not password or logins >= QUEUE_MAX_LOGINS:
+                    raise
+                print(f"{e}，用浏览器登录一次，队列中的所有任务共用这个会话")
+                # 延迟导入，会话有效时不必加载 Selenium
+                from main import login_and_save_session
+
+                login_and_save_session(student_id, password, browser_profile, browser)
+                logins += 1
+    except Exception as e:
+        for job in jobs:
+            if not job.finished:
+                job.update(FAILED, str(e))
+                if job_listener is not None:
+                    job_listener(job)
+        return False
+    finally:
+        print(f"预约队列结束，共 {len(jobs)} 个任务，成功 {sum(job.status == SUCCESS for job in jobs)} 个，"
+              f"浏览器登录 {logins} 次")
+
+
+def run_reservation(student_id, password, fitness_or_swimming, reserve_date, reserve_time, start_at=None,
+                    **options):
+    """
+    用异步引擎预约，没有可用的登录会话时回退到浏览器流程
+
+    浏览器流程登录后会保存会话，下次即可直接使用异步引擎。
+
+    参数:
+        options: automated_login 的其他参数，其中 RESERVE_OPTIONS 中的参数也用于异步引擎，max_retries 对应
+            reserve 的 max_attempts；watch 为真时，所选时间段都已约满后用保存的会话监控空位，见 watch_saved_session
+    """
+    engine_options = {name: options[name] for name in RESERVE_OPTIONS if name in options}
+    if "max_retries" in options:
+        engine_options["max_attempts"] = options["max_retries"]
+    try:
+        if asyncio.run(reserve(student_id, fitness_or_swimming, reserve_date, reserve_time, start_at=start_at,
+                               **engine_options)):
+            return True
+        if not options.get("watch"):
+            return False
+        return watch_saved_session(student_id, fitness_or_swimming, reserve_date, reserve_time,
+                                   cancel=options.get("cancel"))
+    except AuthExpiredError as e:
+        print(f"{e}，改用浏览器登录并预约")
+        # 延迟导入，会话有效时不必加载 Selenium
+        from main import automated_login
+
+        options["remember_session"] = True
+        return automated_login(student_id, password, fitness_or_swimming, reserve_date, reserve_time,
+                               start_at=start_at, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步预约引擎")
+    parser.add_argument("student_id", help="学号")
+    parser.add_argument("--password", help="密码，没有可用的登录会话时用于浏览器登录")
+    parser.add_argument("--activity", default="fitness", choices=["fitness", "swimming", "健身", "游泳"])
+    parser.add_argument("--date", required=True, help="预约日期，格式为 yyyy-MM-dd")
+    parser.add_argument("--slots", nargs="+", required=True, help="按优先级排列的时间段，例如 18:00-19:30")
+    parser.add_argument("--start-at", help="预约开放时间，格式为 yyyy-MM-dd HH:MM:SS，不指定时立即提交")
+    parser.add_argument("--fire-offset", type=float, default=0.0, help="提前触发的秒数")
+    parser.add_argument("--deadline", type=float, default=60, help="重试的时间预算（秒）")
+    parser.add_argument("--watch", action="store_true", help="所选时间段都已约满时监控空位，直到时间段开始")
+    args = parser.parse_args()
+
+    start_at = datetime.strptime(args.start_at, "%Y-%m-%d %H:%M:%S") if args.start_at else None
+    if args.password is None:
+        success = asyncio.run(reserve(args.student_id, args.activity, args.date, args.slots, start_at=start_at,
+                                      fire_offset=args.fire_offset, deadline=args.deadline))
+        if not success and args.watch:
+            success = watch_saved_session(args.student_id, args.activity, args.date, args.slots)
+    else:
+        success = run_reservation(args.student_id, args.password, args.activity, args.date, args.slots,
+                                  start_at=start_at, fire_offset=args.fire_offset, deadline=args.deadline,
+                                  watch=args.watch)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import statistics
+import time
+from collections import Counter
+from contextlib import closing
+from datetime import datetime
+
+import urls
+from slot_catalog import CATALOG
+from tracing import percentile
+
+HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".gym_reserve", "history.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    activity TEXT NOT NULL,
+    room INTEGER NOT NULL,
+    reserve_date TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    start_at REAL,
+    prepare_seconds REAL,
+    trigger_offset REAL,
+    outcome TEXT,
+    booked_slot INTEGER,
+    phases TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    slot INTEGER NOT NULL,
+    period TEXT,
+    kind TEXT NOT NULL,
+    result TEXT NOT NULL,
+    reason TEXT,
+    observed_at REAL NOT NULL,
+    since_open REAL
+);
+CREATE INDEX IF NOT EXISTS attempts_run ON attempts(run_id);
+"""
+
+# 这些观察结果说明时间段在当时已经没有名额
+SOLD_OUT_RESULTS = ("full", "unavailable")
+
+# 建议提前准备时间：准备阶段耗时的 p95 乘以这个系数再加上余量，按 10 秒取整
+LEAD_TIME_FACTOR = 1.5
+LEAD_TIME_MARGIN = 30
+
+
+class HistoryStore:
+    """
+    预约尝试的历史记录，保存在 SQLite 数据库中
+
+    runs 表每次运行一行：场馆、日期、开放时间、准备阶段耗时、首次提交相对开放时间的偏差、结果和各阶段耗时；
+    attempts 表每次观察或提交一个时间段一行：页面状态或提交结果、服务器给出的原因、相对开放时间的秒数。
+    记录按场馆预约系统的主机名区分，本地模拟服务器上的测试不会混入真实数据。
+
+    属性:
+        path (str): 数据库文件路径
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        connection.executescript(SCHEMA)
+        return connection
+
+    def add_run(self, run, attempts):
+        """
+        写入一次运行和它的所有尝试
+
+        参数:
+            run (dict): runs 表的一行，phases 为 {阶段名称: 秒数}
+            attempts (list): attempts 表的行，不含 run_id
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (:run_id, :host, :engine, :activity, :room, :reserve_date, "
+                ":started_at, :start_at, :prepare_seconds, :trigger_offset, :outcome, :booked_slot, :phases)",
+                dict(run, phases=json.dumps(run["phases"], ensure_ascii=False)))
+            connection.executemany(
+                "INSERT INTO attempts (run_id, slot, period, kind, result, reason, observed_at, since_open) "
+                "VALUES (:run_id, :slot, :period, :kind, :result, :reason, :observed_at, :since_open)",
+                [dict(attempt, run_id=run["run_id"]) for attempt in attempts])
+
+    def runs(self, activity=None, since=None):
+        """当前站点的运行记录，按时间排列"""
+        query = "SELECT * FROM runs WHERE host = ?"
+        params = [urls.cgyy_host()]
+        if activity is not None:
+            query += " AND activity = ?"
+            params.append(activity)
+        if since is not None:
+            query += " AND started_at >= ?"
+            params.append(since)
+        with closing(self.connect()) as connection:
+            return [dict(row) for row in connection.execute(query + " ORDER BY started_at", params)]
+
+    def attempts(self, activity=None, since=None):
+        """当前站点的尝试记录，附带所属运行的场馆、日期和开放时间"""
+        query = ("SELECT attempts.*, runs.activity, runs.room, runs.reserve_date, runs.start_at FROM attempts "
+                 "JOIN runs USING (run_id) WHERE runs.host = ?")
+        params = [urls.cgyy_host()]
+        if activity is not None:
+            query += " AND runs.activity = ?"
+            params.append(activity)
+        if since is not None:
+            query += " AND runs.started_at >= ?"
+            params.append(since)
+        with closing(self.connect()) as connection:
+            return [dict(row) for row in connection.execute(query + " ORDER BY observed_at", params)]
+
+
+def period_of(activity, slot):
+    """时间段编号对应的时间段，目录中没有时返回 None"""
+    return next((period for period, index in CATALOG.entries()[activity]["slots"].items() if index == slot), None)
+
+
+def slot_of(attrs):
+    """从阶段属性中取出时间段编号：优先用 slot，否则从预约表单地址中解析"""
+    # 延迟导入，界面读取历史时不必加载 HTML 解析器
+    from availability import SLOT_LINK_PATTERN
+
+    if attrs.get("slot") is not None:
+        return attrs["slot"]
+    match = SLOT_LINK_PATTERN.search(attrs.get("url") or "")
+    return int(match.group(3)) if match else None
+
+
+class HistoryRecorder:
+    """
+    追踪回调，收集一次运行中各阶段的信息，运行结束时写入 HistoryStore
+
+    用 Tracer.add_listener 注册。只读取各阶段已有的属性：
+    open_slot_form/activate_tab 的页面状态、verify_submit 的提交结果和原因、
+    scan_availability/prefetch_forms 中可预约的时间段，以及 wait_trigger 的开放时间。
+
+    属性:
+        store (HistoryStore): 历史记录
+        engine (str): "browser" 或 "async"
+        run_id (str): 运行编号
+    """
+
+    def __init__(self, store, engine, run_id):
+        self.store = store
+        self.engine = engine
+        self.run_id = run_id
+        self.slots = []
+        self.phases = {}
+        self.attempts = []
+        self.start_at = None
+        self.clock_offset = 0.0
+        self.prepare_seconds = None
+        self.run_start = None
+
+    def __call__(self, event, span):
+        if event == "start":
+            if span.name == "run":
+                self.run_start = span.start
+                self.slots = span.attrs.get("slots", [])
+            elif span.name == "wait_trigger" and self.run_start is not None:
+                self.prepare_seconds = span.start - self.run_start
+            return
+        self.phases[span.name] = self.phases.get(span.name, 0.0) + span.end - span.start
+        attrs = span.attrs
+        if span.name == "wait_trigger":
+            self.start_at = datetime.fromisoformat(attrs["start_at"]).timestamp()
+            self.clock_offset = attrs.get("clock_offset", 0.0)
+        elif span.name in ("open_slot_form", "activate_tab") and attrs.get("state"):
+            self._observe(slot_of(attrs), "state", attrs["state"], attrs.get("message"), span.wall_time)
+        elif span.name == "verify_submit" and attrs.get("outcome"):
+            self._observe(slot_of(attrs), "submit", attrs["outcome"], attrs.get("reason"), span.wall_time)
+        elif span.name == "scan_availability" and attrs.get("open_slots") is not None:
+            for slot in self.slots:
+                result = "form_open" if slot in attrs["open_slots"] else "unavailable"
+                self._observe(slot, "scan", result, None, span.wall_time)
+        elif span.name == "prefetch_forms":
+            for slot in attrs.get("slots", []):
+                result = "form_open" if slot in attrs.get("available", []) else "unavailable"
+                self._observe(slot, "scan", result, None, span.wall_time)
+        elif span.name == "run":
+            self._save(span)
+
+    def _observe(self, slot, kind, result, reason, observed_at):
+        if slot is not None:
+            self.attempts.append({"slot": slot, "kind": kind, "result": result, "reason": reason or None,
+                                  "observed_at": observed_at})
+
+    def _save(self, run_span):
+        activity = run_span.attrs["activity"]
+        submits = [attempt for attempt in self.attempts if attempt["kind"] == "submit"]
+        # 只有本次运行确认提交成功的才算预约成功；表单页面显示"已预约"可能是之前的运行预约的
+        booked = [attempt["slot"] for attempt in submits if attempt["result"] == "confirmed"]
+        # 开放时间按服务器时钟计划，换算成本地时间再与本地记录的时间比较
+        opened = self.start_at - self.clock_offset if self.start_at is not None else None
+        for attempt in self.attempts:
+            attempt["period"] = period_of(activity, attempt["slot"])
+            attempt["since_open"] = attempt["observed_at"] - opened if opened is not None else None
+        run = {
+            "run_id": self.run_id,
+            "host": urls.cgyy_host(),
+            "engine": self.engine,
+            "activity": activity,
+            "room": CATALOG.room(activity)[0],
+            "reserve_date": run_span.attrs["date"],
+            "started_at": run_span.wall_time,
+            "start_at": self.start_at,
+            "prepare_seconds": self.prepare_seconds,
+            "trigger_offset": submits[0]["since_open"] if submits and opened is not None else None,
+            "outcome": run_span.outcome,
+            "booked_slot": booked[-1] if booked else None,
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+        }
+        try:
+            self.store.add_run(run, self.attempts)
+        except sqlite3.Error as e:
+            print(f"保存预约历史失败: {e}")
+
+
+def attach(tracer, engine, store=None):
+    """为一次运行注册 HistoryRecorder，store 为 None 时使用默认路径"""
+    recorder = HistoryRecorder(store or HistoryStore(), engine, tracer.run_id)
+    tracer.add_listener(recorder)
+    return recorder
+
+
+def slot_report(store, activity=None, since=None):
+    """
+    按时间段统计
+
+    售罄时间：每个开放日第一次观察到时间段没有名额时距开放过了多少秒，取各开放日的中位数；
+    提交距开放：提交完成时距开放过了多少秒（不是提交本身的耗时），只统计定时执行的运行。
+
+    返回:
+        dict: (预约类型, 时间段) -> {"dates", "sold_out_p50", "submits", "confirmed", "submit_p50", "submit_p95",
+        "reasons"}
+    """
+    by_slot = {}
+    for attempt in store.attempts(activity, since):
+        key = (attempt["activity"], attempt["period"] or str(attempt["slot"]))
+        by_slot.setdefault(key, []).append(attempt)
+    report = {}
+    for key, attempts in by_slot.items():
+        sold_out = {}
+        for attempt in attempts:
+            if attempt["since_open"] is None or attempt["since_open"] < 0:
+                continue
+            if attempt["result"] in SOLD_OUT_RESULTS or (attempt["kind"] == "submit"
+                                                          and attempt["result"] == "rejected"
+                                                          and "约满" in (attempt["reason"] or "")):
+                day = attempt["reserve_date"]
+                sold_out[day] = min(sold_out.get(day, math.inf), attempt["since_open"])
+        submits = [attempt for attempt in attempts if attempt["kind"] == "submit"]
+        timed = [attempt["since_open"] for attempt in submits if attempt["since_open"] is not None]
+        report[key] = {
+            "dates": len({attempt["reserve_date"] for attempt in attempts}),
+            "sold_out_p50": statistics.median(sold_out.values()) if sold_out else None,
+            "submits": len(submits),
+            "confirmed": sum(attempt["result"] == "confirmed" for attempt in submits),
+            "submit_p50": statistics.median(timed) if timed else None,
+            "submit_p95": percentile(timed, 0.95) if timed else None,
+            "reasons": Counter(attempt["reason"] for attempt in submits if attempt["result"] == "rejected"
+                               and attempt["reason"]).most_common(2),
+        }
+    return report
+
+
+def suggest_lead_time(store, activity=None):
+    """
+    根据准备阶段（启动浏览器、登录、打开总览页面）耗时的 p95 建议提前准备的秒数
+
+    返回:
+        int: 建议的提前秒数，没有定时执行的记录时返回 None
+    """
+    prepare = [run["prepare_seconds"] for run in store.runs(activity) if run["prepare_seconds"] is not None]
+    if not prepare:
+        return None
+    return int(math.ceil((percentile(prepare, 0.95) * LEAD_TIME_FACTOR + LEAD_TIME_MARGIN) / 10) * 10)
+
+
+def suggest_alternatives(store, activity, primary, candidates):
+    """
+    按历史售罄时间排列备选时间段：卖得越慢越靠前，从未观察到售罄的排在最前，没有记录的保持原顺序排在最后
+
+    参数:
+        store (HistoryStore): 历史记录
+        activity (str): "fitness" 或 "swimming"
+        primary (str): 主要时间段，不出现在结果中
+        candidates (list): 候选的时间段
+
+    返回:
+        list: 排好顺序的备选时间段
+    """
+    report = slot_report(store, activity)
+
+    def rank(item):
+        position, period = item
+        entry = report.get((activity, period))
+        if entry is None:
+            return 2, position
+        if entry["sold_out_p50"] is None:
+            return 0, position
+        return 1, -entry["sold_out_p50"]
+
+    ordered = sorted(enumerate(period for period in candidates if period != primary), key=rank)
+    return [period for _, period in ordered]
+
+
+def print_report(store, activity=None, days=None):
+    since = time.time() - days * 86400 if days else None
+    runs = store.runs(activity, since)
+    print(f"{urls.cgyy_host()} 共 {len(runs)} 次运行，"
+          f"成功 {sum(run['booked_slot'] is not None for run in runs)} 次")
+    report = slot_report(store, activity, since)
+    print(f"{'类型':<10}{'时间段':<14}{'日数':>6}{'售罄(秒)':>10}{'提交':>6}{'成功':>6}"
+          f"{'距开放p50(毫秒)':>14}{'距开放p95(毫秒)':>14}  拒绝原因")
+    for (kind, period), entry in sorted(report.items()):
+        sold_out = f"{entry['sold_out_p50']:.1f}" if entry["sold_out_p50"] is not None else "-"
+        p50 = f"{entry['submit_p50'] * 1000:.0f}" if entry["submit_p50"] is not None else "-"
+        p95 = f"{entry['submit_p95'] * 1000:.0f}" if entry["submit_p95"] is not None else "-"
+        reasons = "；".join(f"{reason}×{count}" for reason, count in entry["reasons"])
+        print(f"{kind:<10}{period:<14}{entry['dates']:>6}{sold_out:>10}{entry['submits']:>6}{entry['confirmed']:>6}"
+              f"{p50:>14}{p95:>14}  {reasons}")
+    offsets = [run["trigger_offset"] for run in runs if run["trigger_offset"] is not None]
+    if offsets:
+        print(f"首次提交完成距开放: p50 {statistics.median(offsets) * 1000:.0f} 毫秒，"
+              f"p95 {percentile(offsets, 0.95) * 1000:.0f} 毫秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预约历史记录")
+    parser.add_argument("--db", default=HISTORY_PATH, help="数据库文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="按时间段统计售罄时间和提交耗时")
+    report_parser.add_argument("--activity", choices=["fitness", "swimming"])
+    report_parser.add_argument("--days", type=int, help="只统计最近几天的运行")
+    plan_parser = subparsers.add_parser("plan", help="建议提前准备时间和备选时间段顺序")
+    plan_parser.add_argument("activity", choices=["fitness", "swimming"])
+    plan_parser.add_argument("--primary", help="主要时间段，例如 18:00-19:30")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    if args.command == "report":
+        print_report(store, args.activity, args.days)
+        return
+    lead_time = suggest_lead_time(store, args.activity)
+    print(f"建议提前准备: {f'{lead_time} 秒' if lead_time is not None else '没有定时执行的记录'}")
+    print(f"建议的备选顺序: {suggest_alternatives(store, args.activity, args.primary, CATALOG.periods(args.activity))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import re
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from retry_policy import GOVERNOR, AuthExpiredError, ServerBusyError, error_page_status
+from urls import ids_host, room_url
+
+# 总览页面中尚未开放预约的时间段显示的文字
+NOT_OPEN_LABEL = "未开放"
+
+SLOT_LINK_PATTERN = re.compile(r"/room_apl/(\d+)/(\d{4}-\d{2}-\d{2})/(\d+)/cg")
+
+
+def parse_open_slots(html, room, reserve_date):
+    """
+    从预约总览页面解析指定日期可预约的时间段编号
+
+    总览页面只为可预约的时间段提供 room_apl 链接。该日期列出了但还没有开放（没有链接、显示"未开放"）时
+    不能当作全部约满，返回 None，由逐个打开表单时识别为尚未开放并重试，例如触发时刻比开放时刻略早。
+
+    参数:
+        html (str): 预约总览页面的 HTML
+        room (int): 场馆编号
+        reserve_date (str): 预约日期，格式为 yyyy-MM-dd
+
+    返回:
+        set: 可预约的时间段编号；页面中找不到该日期的任何链接，或该日期尚未开放时返回 None，表示无法判断
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    open_slots = set()
+    dates_seen = set()
+    for link in soup.find_all("a", href=True):
+        match = SLOT_LINK_PATTERN.search(link["href"])
+        if match is None or int(match.group(1)) != room:
+            continue
+        dates_seen.add(match.group(2))
+        if match.group(2) == reserve_date:
+            open_slots.add(int(match.group(3)))
+    if open_slots:
+        return open_slots
+    if reserve_date not in dates_seen and reserve_date not in soup.get_text():
+        return None
+    for text in soup.find_all(string=re.compile(re.escape(reserve_date))):
+        row = text.find_parent("tr")
+        if row is not None and NOT_OPEN_LABEL in row.get_text():
+            return None
+    return open_slots
+
+
+def scan_open_slots(driver, room, reserve_date, submitter=None):
+    """
+    只请求一次预约总览页面，返回可预约的时间段编号
+
+    有 HTTP 提交器时直接用它的连接池请求页面，否则让浏览器重新打开总览页面，等到页面标题出现后再读取。
+
+    参数:
+        driver: 已登录的浏览器驱动
+        room (int): 场馆编号
+        reserve_date (str): 预约日期
+        submitter (HttpSubmitter): HTTP 提交器
+
+    返回:
+        set: 可预约的时间段编号，无法判断时返回 None
+
+    异常:
+        AuthExpiredError: 浏览器被重定向到统一身份认证
+        ServerBusyError: 服务器返回 429/5xx 错误页
+    """
+    if submitter is not None:
+        html = submitter.fetch(room_url(room))
+    else:
+        html = _load_room_page(driver, room)
+    return parse_open_slots(html, room, reserve_date)
+
+
+def _load_room_page(driver, room, timeout=30):
+    """用浏览器打开总览页面，返回页面 HTML；登录页和错误页不会被当作总览页面解析"""
+    # 延迟导入，只用 HTTP 监控空位的异步引擎不必加载 Selenium
+    from selenium.webdriver.support import expected_conditions as EC
+
+    from interaction import wait_for
+    from pages import RoomPage
+
+    def redirected_to_cas(driver):
+        return urlparse(driver.current_url).hostname == ids_host()
+
+    GOVERNOR.before_request()
+    driver.get(room_url(room))
+    wait_for(driver, EC.any_of(EC.presence_of_element_located(RoomPage.TITLE), redirected_to_cas,
+                               error_page_status), timeout)
+    if redirected_to_cas(driver):
+        raise AuthExpiredError("页面被重定向到统一身份认证，登录会话已失效")
+    status = error_page_status(driver)
+    GOVERNOR.record(status or 200)
+    if status:
+        raise ServerBusyError(status)
+    return driver.page_source
+
+
+def order_by_availability(reserve_time, open_slots):
+    """按用户的优先顺序保留可预约的时间段；无法判断时保持原顺序"""
+    if open_slots is None:
+        return list(reserve_time)
+    return [index for index in reserve_time if index in open_slots]
@@ -0,0 +1,537 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
+
+import urls
+from driver_pool import PROFILES, create_driver
+from http_submit import HttpSubmitter, SlotUnavailableError
+from mock_server import MockConfig, MockServer
+from page_state import BOOKED, CONFIRMED, ERROR_PAGE, FORM_OPEN, FULL, LOGGED_OUT, NOT_OPEN, classify_html
+from pages import SlotFormPage, classify
+from process_watchdog import process_tree_rss
+from slot_catalog import CATALOG
+from tracing import percentile
+
+# 根据模拟服务器的请求日志划分阶段：每个里程碑是满足条件的第一个请求
+MILESTONES = [
+    ("首个请求", lambda site, method, path: True),
+    ("进入统一身份认证", lambda site, method, path: site == "ids"),
+    ("登录回调", lambda site, method, path: path == "/idcallback"),
+    ("打开总览页面", lambda site, method, path: path.startswith("/room/")),
+    ("打开预约表单", lambda site, method, path: path.startswith("/room_apl/") and method == "GET"),
+    ("提交预约", lambda site, method, path: path.startswith("/room_apl/") and method == "POST"),
+]
+
+
+def benchmark_profile(profile_name, targets, runs, browser):
+    """
+    测量某个浏览器配置下每个页面的加载时间和浏览器内存占用
+
+    参数:
+        profile_name (str): 浏览器配置名称
+        targets (list): 需要加载的页面地址
+        runs (int): 每个页面加载的次数
+        browser (str): 使用的浏览器
+
+    返回:
+        dict: 启动耗时、每个页面的加载时间列表和内存峰值
+    """
+    start = time.monotonic()
+    driver = create_driver(profile_name, browser)
+    launch = time.monotonic() - start
+    load_times = {url: [] for url in targets}
+    peak_rss = 0
+    try:
+        for _ in range(runs):
+            for url in targets:
+                start = time.monotonic()
+                driver.get(url)
+                load_times[url].append(time.monotonic() - start)
+                peak_rss = max(peak_rss, process_tree_rss(driver.service.process.pid))
+    finally:
+        driver.quit()
+    return {"launch": launch, "load_times": load_times, "peak_rss": peak_rss}
+
+
+def run_profile_benchmark(args):
+    results = {name: benchmark_profile(name, args.urls, args.runs, args.browser) for name in args.profiles}
+    for name, result in results.items():
+        print(f"[{name}] 启动耗时 {result['launch']:.2f} 秒，浏览器内存峰值 {result['peak_rss'] / 2 ** 20:.0f} MB")
+        for url, times in result["load_times"].items():
+            print(f"    {url}: 中位数 {statistics.median(times) * 1000:.0f} 毫秒，最大 {max(times) * 1000:.0f} 毫秒")
+
+
+def milestone_times(request_log, start):
+    """返回每个里程碑相对于 start 的时间（秒），没有出现的里程碑为 None"""
+    times = {}
+    for name, predicate in MILESTONES:
+        times[name] = next((timestamp - start for timestamp, site, method, path, status in request_log
+                            if timestamp >= start and predicate(site, method, path)), None)
+    return times
+
+
+def run_pipeline_benchmark(args):
+    from main import automated_login
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        full_slots={tuple(int(part) for part in item.split(":")) for item in args.full})
+    server = MockServer(config).start()
+    urls.set_base_urls(server.cgyy_base_url, server.ids_base_url)
+    reserve_date = args.date or (date.today() + timedelta(days=1)).isoformat()
+
+    results = []
+    try:
+        for run in range(args.runs):
+            server.reset()
+            start = time.monotonic()
+            success = automated_login("mock-user", "mock-password", args.activity, reserve_date, args.slots,
+                                      max_retries=args.max_retries, retry_delay=args.retry_delay,
+                                      use_http_submit=args.http, browser_profile=args.profile, browser=args.browser,
+                                      sync_server_clock=False, preload_tabs=args.preload_tabs, history_path=None)
+            results.append((success, time.monotonic() - start, milestone_times(server.requests(), start)))
+            print(f"第 {run + 1} 次运行: {'成功' if success else '失败'}，耗时 {results[-1][1]:.2f} 秒")
+    finally:
+        server.stop()
+
+    print(f"成功率 {sum(success for success, _, _ in results) / len(results) * 100:.0f}% ({len(results)} 次)")
+    print("各里程碑相对开始的时间（中位数 / p95，毫秒）:")
+    previous = None
+    for name, _ in MILESTONES:
+        values = [milestones[name] for _, _, milestones in results if milestones[name] is not None]
+        if not values:
+            print(f"    {name}: 未出现")
+            continue
+        line = f"    {name}: {statistics.median(values) * 1000:.0f} / {percentile(values, 0.95) * 1000:.0f}"
+        if previous is not None:
+            phases = [milestones[name] - milestones[previous] for _, _, milestones in results
+                      if milestones[name] is not None and milestones[previous] is not None]
+            if phases:
+                line += f"（距上一阶段 {statistics.median(phases) * 1000:.0f}）"
+        print(line)
+        previous = name
+    submits = [milestones["提交预约"] for _, _, milestones in results if milestones["提交预约"] is not None]
+    if submits:
+        print(f"首次提交耗时: 中位数 {statistics.median(submits) * 1000:.0f} 毫秒，"
+              f"p95 {percentile(submits, 0.95) * 1000:.0f} 毫秒")
+
+
+def run_async_benchmark(args):
+    """
+    比较异步引擎（长连接池、同时获取所有候选表单）与 HttpSubmitter 逐个获取表单的提交耗时
+
+    两种方式都跳过登录，直接使用模拟服务器创建的会话；耗时从开始获取表单算起，到提交完成为止。
+    """
+    from async_engine import reserve
+    from http_submit import PHONE_NUMBER
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        full_slots={tuple(int(part) for part in item.split(":")) for item in args.full})
+    server = MockServer(config).start()
+    urls.set_base_urls(server.cgyy_base_url, server.ids_base_url)
+    reserve_date = args.date or (date.today() + timedelta(days=1)).isoformat()
+    room = CATALOG.room(args.activity)[0]
+    slots = CATALOG.indexes(args.activity, args.slots)
+
+    results = {"异步引擎": [], "逐个获取": []}
+    try:
+        for run in range(args.runs):
+            server.reset()
+            cookie = server.create_session()
+            # reserve 在 asyncio.run 的任务中开始自己的运行，结束的阶段通过回调收集
+            spans = []
+            success = asyncio.run(reserve("mock-user", args.activity, reserve_date, args.slots, cookies=[cookie],
+                                          sync_server_clock=False, deadline=args.deadline, trace_dir=None,
+                                          history_path=None,
+                                          phase_listener=lambda event, span: event == "end" and spans.append(span)))
+            records = [span.to_record(None) for span in spans]
+            elapsed = sum(record["duration"] for record in records if record["span"] == "attempt")
+            run_record = next(record for record in records if record["span"] == "run")
+            results["异步引擎"].append((success, elapsed, server.state.connections, run_record["reuse_rate"],
+                                        run_record["latency_p50"]))
+
+            server.reset()
+            cookie = server.create_session()
+            submitter = HttpSubmitter()
+            submitter.headers["Cookie"] = f"{cookie['name']}={cookie['value']}"
+            success = False
+            start = time.monotonic()
+            for slot in slots:
+                try:
+                    success = submitter.submit(urls.slot_form_url(room, reserve_date, slot),
+                                               PHONE_NUMBER).outcome == CONFIRMED
+                except SlotUnavailableError:
+                    continue
+                if success:
+                    break
+            results["逐个获取"].append((success, time.monotonic() - start, server.state.connections, None, None))
+            submitter.http.clear()
+    finally:
+        server.stop()
+
+    print(f"{'方式':<10}{'成功率':>8}{'p50(毫秒)':>12}{'p95(毫秒)':>12}{'连接数':>8}{'复用率':>8}{'请求p50(毫秒)':>14}")
+    for name, items in results.items():
+        durations = [elapsed for _, elapsed, _, _, _ in items]
+        success_rate = sum(success for success, _, _, _, _ in items) / len(items) * 100
+        connections = statistics.median(count for _, _, count, _, _ in items)
+        reuse = [rate for _, _, _, rate, _ in items if rate is not None]
+        latency = [value for _, _, _, _, value in items if value is not None]
+        print(f"{name:<10}{success_rate:>7.0f}%{statistics.median(durations) * 1000:>12.0f}"
+              f"{percentile(durations, 0.95) * 1000:>12.0f}{connections:>8.0f}"
+              f"{(f'{statistics.median(reuse):.2f}' if reuse else '-'):>8}"
+              f"{(f'{statistics.median(latency) * 1000:.0f}' if latency else '-'):>14}")
+
+
+# 在子进程中执行一个预约队列，结束后输出成功的任务数
+QUEUE_SCRIPT = """
+import asyncio, json
+from async_engine import reserve_queue
+from job_queue import SUCCESS, ReservationJob
+jobs = [ReservationJob.from_dict(entry) for entry in {jobs!r}]
+asyncio.run(reserve_queue("mock-user", jobs, cookies=[{cookie!r}], sync_server_clock=False, lead_time={lead_time},
+                          deadline={deadline}, trace_dir=None, history_path=None))
+print(json.dumps({{"success": sum(job.status == SUCCESS for job in jobs)}}), flush=True)
+"""
+
+
+def run_queue_benchmark(args):
+    """
+    比较预约队列（一个进程、一个会话执行所有任务）与每个任务一个进程的内存占用、登录次数和成功数
+
+    所有任务的开放时间相同，每个任务预约不同的日期。每个子进程各自建立一个会话，模拟各自登录一次；
+    模拟服务器的登录不需要浏览器，实际使用时每个单独的进程还要各启动一次浏览器登录，差距会更大。
+    内存为同时运行的子进程常驻内存之和的峰值。
+    """
+    import psutil
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter)
+    server = MockServer(config).start()
+    env = dict(os.environ, GYM_CGYY_BASE_URL=server.cgyy_base_url, GYM_IDS_BASE_URL=server.ids_base_url)
+    activities = ["fitness", "swimming"]
+
+    def make_jobs(start_at):
+        jobs = []
+        for index in range(args.jobs):
+            activity = activities[index % len(activities)]
+            jobs.append({"activity": activity, "date": (date.today() + timedelta(days=1 + index)).isoformat(),
+                         "slots": CATALOG.periods(activity)[:2], "start_at": start_at.isoformat(),
+                         "priority": index})
+        return jobs
+
+    def run_processes(batches):
+        """同时启动每批任务的子进程，返回 (成功任务数, 内存峰值, 登录次数, 耗时)"""
+        start = time.monotonic()
+        processes = []
+        for jobs in batches:
+            script = QUEUE_SCRIPT.format(jobs=jobs, cookie=server.create_session(), lead_time=args.lead_time,
+                                         deadline=args.deadline)
+            processes.append(subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, text=True,
+                                              cwd=os.path.dirname(os.path.abspath(__file__)), env=env))
+        peak_rss = 0
+        while any(process.poll() is None for process in processes):
+            rss = 0
+            for process in processes:
+                try:
+                    rss += process_tree_rss(process.pid)
+                except psutil.NoSuchProcess:
+                    pass
+            peak_rss = max(peak_rss, rss)
+            time.sleep(0.05)
+        success = 0
+        for process in processes:
+            for line in process.stdout:
+                if line.startswith("{"):
+                    success += json.loads(line)["success"]
+        return success, peak_rss, len(batches), time.monotonic() - start
+
+    results = {"预约队列": [], "每个任务一个进程": []}
+    try:
+        for run in range(args.runs):
+            for name in results:
+                server.reset()
+                jobs = make_jobs(datetime.now() + timedelta(seconds=args.opens_in))
+                batches = [jobs] if name == "预约队列" else [[job] for job in jobs]
+                results[name].append(run_processes(batches))
+                print(f"第 {run + 1} 次运行（{name}）: 成功 {results[name][-1][0]}/{args.jobs} 个任务")
+    finally:
+        server.stop()
+
+    print(f"{'方式':<14}{'成功任务':>8}{'内存峰值(MB)':>14}{'登录次数':>8}{'耗时(秒)':>10}")
+    for name, items in results.items():
+        print(f"{name:<14}{statistics.median(item[0] for item in items):>8.0f}"
+              f"{statistics.median(item[1] for item in items) / 2 ** 20:>14.0f}"
+              f"{statistics.median(item[2] for item in items):>8.0f}"
+              f"{statistics.median(item[3] for item in items):>10.1f}")
+
+
+# 在子进程中启动界面，窗口显示后输出一行；eager 为真时按改动前的方式先导入预约引擎
+WINDOW_STARTUP_SCRIPT = """
+import sys
+if {eager}:
+    import async_engine, main
+from PyQt6.QtWidgets import QApplication
+from window import ReservationInterface
+app = QApplication(sys.argv)
+window = ReservationInterface()
+window.show()
+app.processEvents()
+print("ready", flush=True)
+"""
+
+# 在子进程中启动浏览器并打开第一个页面，完成后输出一行；cache_path 为 None 时每次由 Selenium Manager 查找驱动
+FIRST_GET_SCRIPT = """
+from driver_cache import DriverCache
+from driver_pool import create_driver
+cache_path = {cache_path!r}
+driver = create_driver({profile!r}, {browser!r}, DriverCache(cache_path) if cache_path else None)
+driver.get({url!r})
+print("ready", flush=True)
+driver.quit()
+"""
+
+
+def time_to_ready(script, env=None, timeout=120):
+    """运行 Python 子进程，返回从启动到输出 ready 的秒数，子进程失败时返回 None"""
+    start = time.monotonic()
+    process = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    try:
+        for line in process.stdout:
+            if line.strip() == "ready":
+                return time.monotonic() - start
+        return None
+    finally:
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_startup_benchmark(args):
+    """
+    比较改动前后的启动耗时
+
+    窗口显示耗时：改动前启动时就导入 main 和 async_engine（连带 Selenium），改动后推迟到点击确认时导入。
+    首次打开页面耗时：改动前每次启动浏览器都运行 Selenium Manager，改动后从磁盘缓存读取驱动路径。
+    每次测量都在新的 Python 进程中进行，包含解释器启动和模块导入的时间。
+    """
+    env = dict(os.environ)
+    if args.offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    results = {}
+    for label, eager in (("窗口显示（启动时导入引擎）", True), ("窗口显示（按需导入引擎）", False)):
+        results[label] = [time_to_ready(WINDOW_STARTUP_SCRIPT.format(eager=eager), env) for _ in range(args.runs)]
+
+    if not args.skip_browser:
+        server = None
+        url = args.url
+        if url is None:
+            server = MockServer(MockConfig(latency=0, jitter=0)).start()
+            url = server.cgyy_base_url + "/"
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                cache_path = os.path.join(directory, "drivers.json")
+                for label, path in (("首次打开页面（Selenium Manager）", None), ("首次打开页面（驱动缓存）", cache_path)):
+                    if path is not None:
+                        # 先查找一次写入缓存，之后的每次测量都命中缓存
+                        time_to_ready(FIRST_GET_SCRIPT.format(cache_path=path, profile=args.profile,
+                                                              browser=args.browser, url=url))
+                    script = FIRST_GET_SCRIPT.format(cache_path=path, profile=args.profile, browser=args.browser,
+                                                     url=url)
+                    results[label] = [time_to_ready(script) for _ in range(args.runs)]
+        finally:
+            if server is not None:
+                server.stop()
+
+    print(f"{'阶段':<24}{'成功':>6}{'p50(毫秒)':>12}{'p95(毫秒)':>12}")
+    for label, values in results.items():
+        durations = [value for value in values if value is not None]
+        if not durations:
+            print(f"{label:<24}{0:>6}{'-':>12}{'-':>12}")
+            continue
+        print(f"{label:<24}{len(durations):>6}{statistics.median(durations) * 1000:>12.0f}"
+              f"{percentile(durations, 0.95) * 1000:>12.0f}")
+
+
+def record_fixtures():
+    """
+    从本地模拟服务器录制各种状态的页面
+
+    返回:
+        dict: {名称: {"url", "html", "expected"}}
+    """
+    import urllib3
+
+    config = MockConfig(latency=0, jitter=0)
+    server = MockServer(config).start()
+    urls.set_base_urls(server.cgyy_base_url, server.ids_base_url)
+    http = urllib3.PoolManager(retries=False)
+    reserve_date = (date.today() + timedelta(days=1)).isoformat()
+    room = CATALOG.room("fitness")[0]
+    slot, full_slot = CATALOG.indexes("fitness", ["18:00-19:30", "19:30-21:00"])
+    fixtures = {}
+
+    def record(name, url, expected, cookie=None):
+        response = http.request("GET", url, headers={"Cookie": cookie} if cookie else {}, redirect=False)
+        fixtures[name] = {"url": url, "html": response.data.decode("utf-8", errors="replace"), "expected": expected}
+
+    try:
+        cookie = server.create_session()
+        cookie = f"{cookie['name']}={cookie['value']}"
+        record("统一身份认证登录页", urls.cas_username_login_url(), LOGGED_OUT)
+        record("未登录的场馆首页", urls.home_url(), LOGGED_OUT)
+        record("可以预约", urls.slot_form_url(room, reserve_date, slot), FORM_OPEN, cookie)
+        config.full_slots = {(room, full_slot)}
+        record("已约满", urls.slot_form_url(room, reserve_date, full_slot), FULL, cookie)
+        submitter = HttpSubmitter()
+        submitter.headers["Cookie"] = cookie
+        submitter.submit(urls.slot_form_url(room, reserve_date, slot), "10000000000")
+        record("已预约", urls.slot_form_url(room, reserve_date, slot), BOOKED, cookie)
+        config.opens_at = time.time() + 3600
+        record("尚未开放", urls.slot_form_url(room, reserve_date, slot + 1), NOT_OPEN, cookie)
+        config.error_rate = 1.0
+        record("503 错误页", urls.slot_form_url(room, reserve_date, slot), ERROR_PAGE, cookie)
+    finally:
+        server.stop()
+    return fixtures
+
+
+def run_classify_benchmark(args):
+    """
+    测量页面状态分类的耗时
+
+    离线部分用 classify_html 对每个录制的页面重复分类；指定 --browser 时再把页面载入浏览器，
+    比较一次 JS 查询的 classify() 与改动前依次 find_element 电话输入框和提交按钮、找不到时抛出异常的做法。
+    """
+    if args.fixtures and os.path.exists(args.fixtures):
+        with open(args.fixtures, "r", encoding="utf-8") as f:
+            fixtures = json.load(f)
+    else:
+        fixtures = record_fixtures()
+        if args.fixtures:
+            with open(args.fixtures, "w", encoding="utf-8") as f:
+                json.dump(fixtures, f, ensure_ascii=False, indent=2)
+            print(f"已保存录制的页面: {args.fixtures}")
+
+    print(f"{'页面':<14}{'预期':>12}{'结果':>12}{'p50(微秒)':>12}{'p95(微秒)':>12}")
+    for name, fixture in fixtures.items():
+        durations = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            state = classify_html(fixture["html"], fixture["url"])
+            durations.append(time.perf_counter() - start)
+        print(f"{name:<14}{fixture['expected']:>12}{state.state:>12}{statistics.median(durations) * 1e6:>12.0f}"
+              f"{percentile(durations, 0.95) * 1e6:>12.0f}")
+
+    if not args.browser:
+        return
+    from selenium.common.exceptions import NoSuchElementException
+
+    def find_elements_state(driver):
+        try:
+            driver.find_element(*SlotFormPage.PHONE)
+            driver.find_element(*SlotFormPage.SUBMIT)
+            return FORM_OPEN
+        except NoSuchElementException:
+            return None
+
+    driver = create_driver(args.profile, args.browser)
+    try:
+        print(f"{'页面':<14}{'classify(毫秒)':>16}{'find_element(毫秒)':>20}")
+        for name, fixture in fixtures.items():
+            driver.get("data:text/html;charset=utf-8," + quote(fixture["html"]))
+            results = []
+            for method in (classify, find_elements_state):
+                durations = []
+                for _ in range(args.browser_runs):
+                    start = time.perf_counter()
+                    method(driver)
+                    durations.append(time.perf_counter() - start)
+                results.append(statistics.median(durations) * 1000)
+            print(f"{name:<14}{results[0]:>16.2f}{results[1]:>20.2f}")
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预约流程性能测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    profile_parser = subparsers.add_parser("profile", help="比较不同浏览器配置的页面加载时间和内存占用")
+    profile_parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    profile_parser.add_argument("--urls", nargs="+",
+                                default=["https://cgyy.xmu.edu.cn/", "https://cgyy.xmu.edu.cn/room/1",
+                                         "https://cgyy.xmu.edu.cn/room/2"])
+    profile_parser.add_argument("--runs", type=int, default=5)
+    profile_parser.add_argument("--browser", default="edge", choices=["edge", "chrome"])
+    profile_parser.set_defaults(func=run_profile_benchmark)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="在本地模拟服务器上运行完整预约流程")
+    pipeline_parser.add_argument("--runs", type=int, default=5)
+    pipeline_parser.add_argument("--activity", default="fitness", choices=["fitness", "swimming"])
+    pipeline_parser.add_argument("--date", help="预约日期，默认为明天")
+    pipeline_parser.add_argument("--slots", nargs="+", default=["18:00-19:30", "19:30-21:00"])
+    pipeline_parser.add_argument("--latency", type=float, default=0.05)
+    pipeline_parser.add_argument("--jitter", type=float, default=0.02)
+    pipeline_parser.add_argument("--error-rate", type=float, default=0.0)
+    pipeline_parser.add_argument("--full", nargs="*", default=[], help="已约满的时间段，格式为 场馆:编号")
+    pipeline_parser.add_argument("--max-retries", type=int, default=5)
+    pipeline_parser.add_argument("--retry-delay", type=float, default=1)
+    pipeline_parser.add_argument("--http", action="store_true", help="使用 HTTP 直接提交")
+    pipeline_parser.add_argument("--preload-tabs", action="store_true", help="在多个标签页中预加载时间段表单")
+    pipeline_parser.add_argument("--profile", default="fast", choices=list(PROFILES))
+    pipeline_parser.add_argument("--browser", default="chrome", choices=["edge", "chrome"])
+    pipeline_parser.set_defaults(func=run_pipeline_benchmark)
+
+    async_parser = subparsers.add_parser("async", help="在本地模拟服务器上比较异步引擎和逐个获取表单的提交耗时")
+    async_parser.add_argument("--runs", type=int, default=20)
+    async_parser.add_argument("--activity", default="fitness", choices=["fitness", "swimming"])
+    async_parser.add_argument("--date", help="预约日期，默认为明天")
+    async_parser.add_argument("--slots", nargs="+", default=["18:00-19:30", "19:30-21:00", "16:30-18:00"])
+    async_parser.add_argument("--latency", type=float, default=0.05)
+    async_parser.add_argument("--jitter", type=float, default=0.02)
+    async_parser.add_argument("--error-rate", type=float, default=0.0)
+    async_parser.add_argument("--full", nargs="*", default=["1:14"], help="已约满的时间段，格式为 场馆:编号")
+    async_parser.add_argument("--deadline", type=float, default=10)
+    async_parser.set_defaults(func=run_async_benchmark)
+
+    startup_parser = subparsers.add_parser("startup", help="比较窗口显示和首次打开页面的耗时")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--offscreen", action="store_true", help="不实际显示窗口，适合没有桌面的环境")
+    startup_parser.add_argument("--skip-browser", action="store_true", help="只测量窗口显示耗时")
+    startup_parser.add_argument("--url", help="首次打开的页面，默认为本地模拟服务器首页")
+    startup_parser.add_argument("--profile", default="fast", choices=list(PROFILES))
+    startup_parser.add_argument("--browser", default="edge", choices=["edge", "chrome"])
+    startup_parser.set_defaults(func=run_startup_benchmark)
+
+    classify_parser = subparsers.add_parser("classify", help="测量录制页面的状态分类耗时")
+    classify_parser.add_argument("--runs", type=int, default=1000)
+    classify_parser.add_argument("--fixtures", help="录制页面的 JSON 文件，存在时直接读取，否则录制后保存到这里")
+    classify_parser.add_argument("--browser", choices=["edge", "chrome"], help="同时在浏览器中比较两种判断方式")
+    classify_parser.add_argument("--browser-runs", type=int, default=50)
+    classify_parser.add_argument("--profile", default="fast", choices=list(PROFILES))
+    classify_parser.set_defaults(func=run_classify_benchmark)
+
+    queue_parser = subparsers.add_parser("queue", help="比较预约队列与每个任务一个进程的内存占用和登录次数")
+    queue_parser.add_argument("--runs", type=int, default=3)
+    queue_parser.add_argument("--jobs", type=int, default=3, help="任务数，健身和游泳交替，每个任务预约不同的日期")
+    queue_parser.add_argument("--opens-in", type=float, default=8, help="所有任务的开放时间在开始后多少秒")
+    queue_parser.add_argument("--lead-time", type=float, default=5)
+    queue_parser.add_argument("--deadline", type=float, default=10)
+    queue_parser.add_argument("--latency", type=float, default=0.05)
+    queue_parser.add_argument("--jitter", type=float, default=0.02)
+    queue_parser.set_defaults(func=run_queue_benchmark)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+STATE_PATH = os.path.join(os.path.expanduser("~"), ".gym_reserve", "daemon_state.json")
+
+WEEKDAYS = {"monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+            "周一": 0, "周二": 1, "周三": 2, "周四": 3, "周五": 4, "周六": 5, "周日": 6}
+
+# 没有任务要准备时，每隔这么多秒检查一次配置文件和时钟
+IDLE_CHECK_INTERVAL = 60
+
+# 任务配置的默认值
+JOB_DEFAULTS = {
+    "activity": "fitness",
+    "at": "08:00",
+    "book_days_ahead": 7,
+    "lead_time": 60,
+    "deadline": 600,
+    "engine": "async",
+    "options": {},
+}
+
+
+def log(message):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+
+def load_jobs(config_path):
+    """
+    读取任务配置文件
+
+    配置文件是一个 JSON 对象，例如:
+
+        {
+          "student_id": "学号",
+          "password": "密码，也可以用环境变量 GYM_PASSWORD 提供",
+          "jobs": [
+            {"name": "周一健身", "every": ["monday"], "at": "08:00", "book_days_ahead": 7,
+             "activity": "fitness", "slots": ["18:00-19:30", "19:30-21:00"]},
+            {"name": "一次性", "start_at": "2024-10-12 08:00:00", "date": "2024-10-12",
+             "activity": "swimming", "slots": ["09:30-11:00"], "engine": "browser",
+             "options": {"browser_profile": "fast"}}
+          ]
+        }
+
+    every 为每周的哪几天，at 为预约开放时间，book_days_ahead 为预约开放后预约几天后的场地；
+    只运行一次的任务用 start_at 和 date 指定。lead_time 为提前多少秒开始登录准备，
+    deadline 为开放后重试的时间预算，engine 为 "async"（异步引擎，没有会话时回退到浏览器）或 "browser"，
+    options 原样传给预约函数。
+
+    返回:
+        tuple: (学号, 密码, 任务列表)，任务中已填好默认值
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    password = config.get("password") or os.environ.get("GYM_PASSWORD")
+    jobs = []
+    names = set()
+    for raw in config.get("jobs", []):
+        job = dict(JOB_DEFAULTS, **raw)
+        if not job.get("name") or job["name"] in names:
+            raise ValueError(f"任务名称为空或重复: {job.get('name')!r}")
+        if not job.get("slots"):
+            raise ValueError(f"任务 {job['name']} 没有指定时间段")
+        if "start_at" in job:
+            if "date" not in job:
+                raise ValueError(f"任务 {job['name']} 指定了 start_at，还需要指定预约日期 date")
+        else:
+            every = job.get("every")
+            every = [every] if isinstance(every, str) else every
+            if not every or any(day.lower() not in WEEKDAYS for day in every):
+                raise ValueError(f"任务 {job['name']} 的 every 无法识别: {job.get('every')!r}")
+            job["every"] = [WEEKDAYS[day.lower()] for day in every]
+            datetime.strptime(job["at"], "%H:%M")
+        names.add(job["name"])
+        jobs.append(job)
+    return config["student_id"], password, jobs
+
+
+def next_window(job, after):
+    """
+    任务在 after 之后的下一个预约开放时间
+
+    返回:
+        tuple: (开放时间, 预约日期)，只运行一次的任务已经过去时返回 None
+    """
+    if "start_at" in job:
+        start_at = datetime.strptime(job["start_at"], "%Y-%m-%d %H:%M:%S")
+        return (start_at, job["date"]) if start_at > after else None
+    at = datetime.strptime(job["at"], "%H:%M").time()
+    for offset in range(8):
+        day = after.date() + timedelta(days=offset)
+        start_at = datetime.combine(day, at)
+        if day.weekday() in job["every"] and start_at > after:
+            return start_at, (day + timedelta(days=job["book_days_ahead"])).isoformat()
+    return None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+
+class JobState:
+    """
+    任务状态的持久化
+
+    每个任务记录最近一次处理的开放时间、结果和执行进程，守护进程重启后据此决定下一个开放时间：
+    已经处理过的开放时间不会再次执行，重启前正在执行的任务如果开放时间还在重试预算内会重新执行。
+
+    属性:
+        path (str): 状态文件路径
+        jobs (dict): 任务名称 -> {"window", "date", "status", "pid", "updated_at"}
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.jobs = json.load(f)
+        except (OSError, ValueError):
+            self.jobs = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def record(self, name, window, reserve_date, status, pid=None):
+        self.jobs[name] = {"window": window.isoformat(), "date": reserve_date, "status": status, "pid": pid,
+                           "updated_at": datetime.now().isoformat(timespec="seconds")}
+        self.save()
+
+    def handled_until(self, job, now):
+        """
+        返回 (已经处理过的最后一个开放时间, 需要继续等待的进程号)
+
+        重启前正在执行的任务：进程仍在运行时继续等待它结束；进程已经退出且还在重试预算内时重新执行，
+        超出预算时记为中断。
+        """
+        entry = self.jobs.get(job["name"])
+        if entry is None:
+            return None, None
+        window = datetime.fromisoformat(entry["window"])
+        if entry["status"] != "running":
+            return window, None
+        if pid_alive(entry["pid"]):
+            return window, entry["pid"]
+        if now < window + timedelta(seconds=job["deadline"]):
+            log(f"任务 {job['name']} 在上次退出时未完成，重新执行 {window:%Y-%m-%d %H:%M} 的预约")
+            return window - timedelta(seconds=1), None
+        self.record(job["name"], window, entry["date"], "interrupted")
+        return window, None
+
+
+class Daemon:
+    """
+    按任务配置定时预约的守护进程
+
+    守护进程本身只使用标准库，空闲时内存占用很小；每个预约在独立的子进程中执行，
+    子进程才导入预约引擎和 Selenium，预约结束后随子进程一起释放。
+
+    属性:
+        config_path (str): 任务配置文件
+        state (JobState): 任务状态
+        running (dict): 任务名称 -> (子进程, 开放时间, 预约日期)
+    """
+
+    def __init__(self, config_path, state=None):
+        self.config_path = config_path
+        self.state = state or JobState()
+        self.running = {}
+        self.adopted = {}  # 任务名称 -> 重启前启动、仍在运行的子进程号
+
+    def plan(self, jobs, now):
+        """
+        计算每个任务下一次需要准备的时间
+
+        返回:
+            list: [(准备时间, 开放时间, 预约日期, 任务)]，按准备时间排序
+        """
+        plans = []
+        for job in jobs:
+            if job["name"] in self.running or job["name"] in self.adopted:
+                continue
+            handled, pid = self.state.handled_until(job, now)
+            if pid is not None:
+                self.adopted[job["name"]] = pid
+                log(f"任务 {job['name']} 的预约进程 {pid} 仍在运行，等待它结束")
+                continue
+            # 开放时间已过但还在重试预算内的窗口仍然执行，错过的窗口直接跳过
+            after = now - timedelta(seconds=job["deadline"])
+            if handled is not None:
+                after = max(after, handled)
+            window = next_window(job, after)
+            if window is None:
+                continue
+            start_at, reserve_date = window
+            plans.append((start_at - timedelta(seconds=job["lead_time"]), start_at, reserve_date, job))
+        plans.sort(key=lambda plan: plan[0])
+        return plans
+
+    def launch(self, job, start_at, reserve_date):
+        """在子进程中执行一次预约"""
+        command = [sys.executable, os.path.abspath(__file__), "--config", os.path.abspath(self.config_path),
+                   "fire", job["name"], "--start-at", start_at.isoformat(), "--date", reserve_date]
+        process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.running[job["name"]] = (process, start_at, reserve_date)
+        self.state.record(job["name"], start_at, reserve_date, "running", process.pid)
+        log(f"任务 {job['name']} 开始准备 {start_at:%Y-%m-%d %H:%M} 开放的预约（{reserve_date}），进程 {process.pid}")
+
+    def reap(self):
+        """记录已经结束的子进程的结果"""
+        for name, (process, start_at, reserve_date) in list(self.running.items()):
+            code = process.poll()
+            if code is None:
+                continue
+            del self.running[name]
+            status = "success" if code == 0 else "failed"
+            self.state.record(name, start_at, reserve_date, status)
+            log(f"任务 {name} 的预约{'成功' if code == 0 else '失败'}（退出码 {code}）")
+        for name, pid in list(self.adopted.items()):
+            if not pid_alive(pid):
+                del self.adopted[name]
+                entry = self.state.jobs[name]
+                self.state.record(name, datetime.fromisoformat(entry["window"]), entry["date"], "unknown")
+                log(f"任务 {name} 重启前启动的预约进程已结束，结果未知")
+
+    def run(self):
+        """主循环：睡到最近一个任务的准备时间，启动子进程，记录结果，重新读取配置"""
+        log(f"守护进程已启动，配置文件 {self.config_path}，状态文件 {self.state.path}")
+        _, _, jobs = load_jobs(self.config_path)
+        try:
+            while True:
+                self.reap()
+                try:
+                    _, _, jobs = load_jobs(self.config_path)
+                except (OSError, ValueError, KeyError) as e:
+                    log(f"读取配置文件失败，继续使用上一次的配置: {e}")
+                now = datetime.now()
+                plans = self.plan(jobs, now)
+                for prepare_at, start_at, reserve_date, job in plans:
+                    if prepare_at <= now:
+                        self.launch(job, start_at, reserve_date)
+                pending = [plan for plan in plans if plan[3]["name"] not in self.running]
+                sleep = IDLE_CHECK_INTERVAL
+                if pending:
+                    sleep = min(sleep, (pending[0][0] - now).total_seconds())
+                if self.running or self.adopted:
+                    sleep = min(sleep, 1.0)
+                time.sleep(max(0.1, sleep))
+        finally:
+            for name, (process, start_at, reserve_date) in self.running.items():
+                log(f"停止任务 {name} 的预约进程 {process.pid}")
+                process.terminate()
+            for process, _, _ in self.running.values():
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            # 状态保持为 running，重启后仍在重试预算内时会重新执行
+            log("守护进程已退出")
+
+
+def fire(config_path, name, start_at, reserve_date):
+    """
+    在当前进程中执行一个任务的一次预约，由守护进程在子进程中调用
+
+    返回:
+        bool: 是否预约成功
+    """
+    student_id, password, jobs = load_jobs(config_path)
+    job = next((job for job in jobs if job["name"] == name), None)
+    if job is None:
+        raise ValueError(f"配置文件中没有任务 {name}")
+    options = dict(job["options"], deadline=job["deadline"])
+    if start_at is not None and start_at <= datetime.now():
+        start_at = None
+    if job["engine"] == "browser":
+        from main import automated_login
+        return automated_login(student_id, password, job["activity"], reserve_date, job["slots"], start_at=start_at,
+                               **options)
+    from async_engine import run_reservation
+    return run_reservation(student_id, password, job["activity"], reserve_date, job["slots"], start_at=start_at,
+                           **options)
+
+
+def show(config_path, state):
+    """打印每个任务的下一个开放时间和最近一次结果"""
+    _, _, jobs = load_jobs(config_path)
+    now = datetime.now()
+    for job in jobs:
+        entry = state.jobs.get(job["name"])
+        after = now - timedelta(seconds=job["deadline"])
+        if entry is not None:
+            after = max(after, datetime.fromisoformat(entry["window"]))
+        window = next_window(job, after)
+        upcoming = f"{window[0]:%Y-%m-%d %H:%M} 开放，预约 {window[1]}" if window else "没有后续开放时间"
+        last = f"{entry['window']} {entry['status']}" if entry else "从未执行"
+        print(f"{job['name']}: 下一次 {upcoming}；最近一次 {last}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面的定时预约守护进程")
+    parser.add_argument("--config", default="jobs.json", help="任务配置文件，格式见 load_jobs")
+    parser.add_argument("--state", default=STATE_PATH, help="任务状态文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("run", help="持续运行，按任务配置定时预约")
+    subparsers.add_parser("list", help="查看各任务的下一个开放时间和最近一次结果")
+    fire_parser = subparsers.add_parser("fire", help="立即执行一个任务的一次预约")
+    fire_parser.add_argument("job", help="任务名称")
+    fire_parser.add_argument("--start-at", help="预约开放时间（ISO 格式），不指定时立即提交")
+    fire_parser.add_argument("--date", help="预约日期，不指定时按任务配置的下一个开放时间计算")
+    args = parser.parse_args()
+
+    # systemd 等停止服务时发送 SIGTERM，按 Ctrl+C 处理：守护进程先结束子进程，子进程先关闭浏览器
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    if args.command == "run":
+        try:
+            Daemon(args.config, JobState(args.state)).run()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "list":
+        show(args.config, JobState(args.state))
+    else:
+        start_at = datetime.fromisoformat(args.start_at) if args.start_at else None
+        reserve_date = args.date
+        if reserve_date is None:
+            _, _, jobs = load_jobs(args.config)
+            job = next((job for job in jobs if job["name"] == args.job), None)
+            if job is None:
+                parser.error(f"配置文件中没有任务 {args.job}")
+            window = next_window(job, datetime.now())
+            if window is None:
+                parser.error(f"任务 {args.job} 没有后续开放时间，请用 --date 指定预约日期")
+            reserve_date = window[1]
+        raise SystemExit(0 if fire(args.config, args.job, start_at, reserve_date) else 1)
+
+
+if __name__ == "__main__":
+    main()
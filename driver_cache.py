@@ -0,0 +1,145 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".gym_reserve", "drivers.json")
+
+# Selenium Manager 使用的浏览器名称
+SELENIUM_BROWSER_NAMES = {"edge": "MicrosoftEdge", "chrome": "chrome"}
+
+VERSION_PATTERN = re.compile(r"\d+(?:\.\d+){2,}")
+
+
+def file_fingerprint(path):
+    """文件的大小和修改时间，浏览器升级后会变化"""
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def browser_version(browser_path):
+    """
+    读取浏览器的版本号
+
+    Windows 上 Edge 和 Chrome 的安装目录中有一个以版本号命名的子目录，直接读取目录名；
+    其他系统运行一次 "浏览器 --version"。
+
+    返回:
+        str: 版本号，无法读取时返回 None
+    """
+    if sys.platform == "win32":
+        try:
+            versions = [name for name in os.listdir(os.path.dirname(browser_path)) if VERSION_PATTERN.fullmatch(name)]
+        except OSError:
+            return None
+        return max(versions, key=lambda name: tuple(int(part) for part in name.split(".")), default=None)
+    try:
+        output = subprocess.run([browser_path, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_PATTERN.search(output)
+    return match.group(0) if match else None
+
+
+class DriverCache:
+    """
+    浏览器驱动路径的磁盘缓存
+
+    不指定驱动路径时，Selenium 每次启动浏览器都会运行一遍 Selenium Manager 查找浏览器和驱动，
+    这里把查到的驱动路径、浏览器路径和版本号保存到磁盘，之后直接通过 Service 传给 Selenium。
+    驱动文件不存在、浏览器文件的大小或修改时间变化（浏览器升级）时重新查找。
+
+    属性:
+        path (str): 缓存文件路径
+        hit (bool): 最近一次 resolve() 是否命中缓存
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.hit = False
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def get(self, browser):
+        """
+        读取仍然有效的缓存
+
+        参数:
+            browser (str): "edge" 或 "chrome"
+
+        返回:
+            dict: {"driver_path", "browser_path", "browser_version", ...}，没有缓存或已失效时返回 None
+        """
+        entry = self._load().get(browser)
+        if not entry:
+            return None
+        try:
+            if not os.path.isfile(entry["driver_path"]):
+                return None
+            if file_fingerprint(entry["browser_path"]) != entry["browser_fingerprint"]:
+                return None
+        except (OSError, KeyError, TypeError):
+            return None
+        return entry
+
+    def resolve(self, browser):
+        """
+        获取驱动和浏览器路径，缓存失效时运行 Selenium Manager 重新查找并写入缓存
+
+        参数:
+            browser (str): "edge" 或 "chrome"
+
+        返回:
+            dict: 见 get()
+        """
+        entry = self.get(browser)
+        self.hit = entry is not None
+        if entry is not None:
+            return entry
+
+        from selenium.webdriver.common.selenium_manager import SeleniumManager
+
+        start = time.monotonic()
+        paths = SeleniumManager().binary_paths(["--browser", SELENIUM_BROWSER_NAMES[browser]])
+        entry = {
+            "driver_path": paths["driver_path"],
+            "browser_path": paths["browser_path"],
+            "browser_version": browser_version(paths["browser_path"]),
+            "browser_fingerprint": file_fingerprint(paths["browser_path"]),
+            "resolved_at": time.time(),
+        }
+        print(f"查找浏览器驱动耗时 {time.monotonic() - start:.2f} 秒，"
+              f"浏览器版本 {entry['browser_version'] or '未知'}，驱动 {entry['driver_path']}")
+        entries = self._load()
+        entries[browser] = entry
+        try:
+            self._save(entries)
+        except OSError as e:
+            print(f"保存驱动路径缓存失败: {e}")
+        return entry
+
+    def invalidate(self, browser):
+        """删除某个浏览器的缓存，例如驱动与浏览器版本不匹配时"""
+        entries = self._load()
+        if entries.pop(browser, None) is not None:
+            try:
+                self._save(entries)
+            except OSError as e:
+                print(f"更新驱动路径缓存失败: {e}")
+
+
+DRIVER_CACHE = DriverCache()
@@ -0,0 +1,256 @@
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.edge.service import Service as EdgeService
+
+from driver_cache import DRIVER_CACHE
+from urls import cgyy_host
+
+# 浏览器配置：default 与原来的行为一致，fast 为无界面、提前返回、屏蔽静态资源的精简配置
+PROFILES = {
+    "default": {},
+    "fast": {
+        "headless": True,
+        "page_load_strategy": "eager",
+        "blocked_resources": ["image", "font", "stylesheet", "media"],
+        "window_size": (1024, 768),
+        "lean_renderer": True,
+    },
+}
+
+# CDP 的 Network.setBlockedURLs 只支持 URL 通配符，这里按扩展名对应各类资源
+BLOCKED_URL_PATTERNS = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "stylesheet": ["*.css"],
+    "media": ["*.mp4", "*.webm", "*.mp3", "*.ogg"],
+}
+
+
+def build_options(profile, browser="edge"):
+    """
+    根据浏览器配置生成启动选项
+
+    参数:
+        profile (dict): 浏览器配置，键见 PROFILES
+        browser (str): "edge" 或 "chrome"
+
+    返回:
+        浏览器启动选项
+    """
+    if browser == "chrome":
+        options = webdriver.ChromeOptions()
+    else:
+        options = webdriver.EdgeOptions()
+        options.use_chromium = True
+
+    if profile.get("headless"):
+        options.add_argument("--headless=new")
+    if profile.get("page_load_strategy"):
+        options.page_load_strategy = profile["page_load_strategy"]
+    if profile.get("window_size"):
+        width, height = profile["window_size"]
+        options.add_argument(f"--window-size={width},{height}")
+    if profile.get("lean_renderer"):
+        for argument in ("--disable-gpu", "--disable-extensions", "--disable-background-networking",
+                         "--disable-component-update", "--disable-sync", "--no-first-run",
+                         "--renderer-process-limit=2", "--disable-features=Translate,MediaRouter"):
+            options.add_argument(argument)
+    if "image" in profile.get("blocked_resources", []):
+        # 除了网络层屏蔽外，让渲染器直接不加载图片
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+
+def launch_browser(options, browser, driver_cache=DRIVER_CACHE):
+    """
+    启动浏览器，驱动路径从缓存读取并通过 Service 传入，不再每次运行 Selenium Manager
+
+    参数:
+        options: 浏览器启动选项
+        browser (str): "edge" 或 "chrome"
+        driver_cache (DriverCache): 驱动路径缓存，为 None 时由 Selenium 自行查找
+
+    返回:
+        WebDriver: 浏览器驱动
+    """
+    driver_class, service_class = (webdriver.Chrome, ChromeService) if browser == "chrome" \
+        else (webdriver.Edge, EdgeService)
+    if driver_cache is None:
+        return driver_class(options=options)
+
+    entry = driver_cache.resolve(browser)
+    options.binary_location = entry["browser_path"]
+    try:
+        return driver_class(service=service_class(executable_path=entry["driver_path"]), options=options)
+    except SessionNotCreatedException:
+        if not driver_cache.hit:
+            raise
+        # 浏览器升级后旧驱动可能不再兼容，重新查找一次
+        print("缓存的浏览器驱动与浏览器版本不匹配，重新查找驱动。")
+        driver_cache.invalidate(browser)
+        entry = driver_cache.resolve(browser)
+        options.binary_location = entry["browser_path"]
+        return driver_class(service=service_class(executable_path=entry["driver_path"]), options=options)
+
+
+def create_driver(profile="default", browser="edge", driver_cache=DRIVER_CACHE):
+    """
+    按配置启动一个新的浏览器驱动
+
+    参数:
+        profile (str | dict): 配置名称（见 PROFILES）或配置字典
+        browser (str): "edge" 或 "chrome"
+        driver_cache (DriverCache): 驱动路径缓存，为 None 时每次由 Selenium Manager 查找
+
+    返回:
+        WebDriver: 浏览器驱动
+    """
+    if isinstance(profile, str):
+        profile = PROFILES[profile]
+    options = build_options(profile, browser)
+    driver = launch_browser(options, browser, driver_cache)
+
+    blocked_urls = [pattern for resource in profile.get("blocked_resources", [])
+                    for pattern in BLOCKED_URL_PATTERNS.get(resource, [])]
+    blocked_urls += profile.get("blocked_urls", [])
+    if blocked_urls:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+        except WebDriverException as e:
+            print(f"设置资源屏蔽失败，将加载完整页面: {e}")
+    return driver
+
+
+def create_edge_driver():
+    """启动一个新的 Edge 浏览器驱动"""
+    return create_driver("default", "edge")
+
+
+class DriverPool:
+    """
+    浏览器驱动生命周期管理类
+
+    在多次重试之间复用同一个已登录的浏览器驱动，每次取用前做健康检查，
+    只有在浏览器真正损坏（窗口被关闭、会话失效）时才重新启动。
+
+    属性:
+        factory (callable): 创建新驱动的函数
+        session_domain (str): 用于判断登录状态的会话 Cookie 所属域名，默认为场馆预约系统的主机名
+        driver: 当前持有的驱动，没有时为 None
+        logged_in (bool): 当前驱动是否已完成登录流程
+        launch_cost (float): 最近一次启动浏览器的耗时（秒）
+        login_cost (float): 最近一次完整登录流程的耗时（秒）
+        saved_seconds (float): 通过复用驱动累计节省的时间（秒）
+        reused (bool): 最近一次 acquire() 是否复用了已有驱动
+        watchdog (ProcessWatchdog): 跟踪浏览器进程的看门狗，为 None 时不跟踪
+    """
+
+    def __init__(self, factory=create_edge_driver, session_domain=None, watchdog=None):
+        self.factory = factory
+        self.watchdog = watchdog
+        self.session_domain = session_domain or cgyy_host()
+        self.driver = None
+        self.logged_in = False
+        self.launch_cost = 0.0
+        self.login_cost = 0.0
+        self.saved_seconds = 0.0
+        self.rebuild_count = 0
+        self.reused = False
+
+    def acquire(self):
+        """
+        获取一个可用的驱动
+
+        如果当前驱动健康则直接复用，并打印本次节省的时间；否则关闭旧驱动并重新启动。
+
+        返回:
+            WebDriver: 可用的浏览器驱动
+        """
+        if self.driver is not None and self.watchdog is not None and self.watchdog.over_ceiling(self.driver):
+            # 在两次尝试之间重建，不会打断正在进行的提交
+            self.discard()
+            self.rebuild_count += 1
+
+        if self.driver is not None:
+            if self.is_alive():
+                if self.logged_in and not self.has_valid_session():
+                    print("会话 Cookie 已失效，将在当前浏览器中重新登录。")
+                    self.logged_in = False
+                saved = self.launch_cost + (self.login_cost if self.logged_in else 0.0)
+                self.saved_seconds += saved
+                print(f"复用已有浏览器，本次重试节省约 {saved:.2f} 秒（累计 {self.saved_seconds:.2f} 秒）")
+                self.reused = True
+                return self.driver
+            print("浏览器已失效，重新启动。")
+            self.discard()
+            self.rebuild_count += 1
+
+        start = time.monotonic()
+        self.driver = self.factory()
+        self.launch_cost = time.monotonic() - start
+        if self.watchdog is not None:
+            self.watchdog.track(self.driver)
+        self.logged_in = False
+        self.reused = False
+        print(f"浏览器启动耗时 {self.launch_cost:.2f} 秒")
+        return self.driver
+
+    def mark_logged_in(self, elapsed):
+        """
+        记录登录流程已完成
+
+        参数:
+            elapsed (float): 本次登录流程的耗时（秒）
+        """
+        self.logged_in = True
+        self.login_cost = elapsed
+
+    def is_alive(self):
+        """检查浏览器窗口是否仍然打开且可以响应命令"""
+        try:
+            return bool(self.driver.window_handles)
+        except WebDriverException:
+            return False
+
+    def has_valid_session(self):
+        """检查当前页面上是否还有未过期的会话 Cookie"""
+        try:
+            cookies = self.driver.get_cookies()
+        except WebDriverException:
+            return False
+        now = time.time()
+        for cookie in cookies:
+            if self.session_domain not in cookie.get('domain', ''):
+                continue
+            # Drupal 的会话 Cookie 以 SESS 或 SSESS 开头
+            if not cookie.get('name', '').startswith(('SESS', 'SSESS')):
+                continue
+            if 'expiry' in cookie and cookie['expiry'] <= now:
+                continue
+            return True
+        return False
+
+    def discard(self):
+        """关闭并丢弃当前驱动，quit() 失败或之后仍有浏览器进程未结束时由看门狗强制结束"""
+        if self.driver is not None:
+            graceful = True
+            try:
+                self.driver.quit()
+            except Exception as e:
+                graceful = False
+                print(f"关闭浏览器失败: {e}")
+            if self.watchdog is not None:
+                self.watchdog.release(self.driver, graceful)
+        self.driver = None
+        self.logged_in = False
+
+    def close(self):
+        """结束使用，关闭驱动并打印复用统计"""
+        self.discard()
+        if self.saved_seconds:
+            print(f"驱动复用共节省约 {self.saved_seconds:.2f} 秒，重建浏览器 {self.rebuild_count} 次")
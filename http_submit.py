@@ -0,0 +1,249 @@
+from urllib.parse import urlencode, urljoin, urlparse
+
+import urllib3
+from bs4 import BeautifulSoup
+
+import tracing
+from retry_policy import GOVERNOR, AuthExpiredError, ServerBusyError, retry_after_seconds
+from urls import ids_host
+
+# 预约表单中填写的电话号码
+PHONE_NUMBER = "17704675461"
+
+PHONE_FIELD_ID = "edit-field-tel-und-0-value"
+SUBMIT_BUTTON_ID = "edit-submit"
+
+
+class FormParseError(Exception):
+    """无法从页面中解析出预约表单，需要回退到浏览器提交"""
+    pass
+
+
+class SlotUnavailableError(Exception):
+    """
+    页面中没有预约表单，时间段已被约满/未开放/已经预约成功
+
+    属性:
+        state (str): 按页面提示判断的状态，见 page_state，例如 NOT_OPEN；无法判断时为 None
+    """
+
+    def __init__(self, message, state=None):
+        super().__init__(message)
+        self.state = state
+
+
+def parse_slot_form(html, page_url):
+    """
+    解析预约表单
+
+    参数:
+        html (str): 预约页面的 HTML
+        page_url (str): 预约页面地址，用于补全表单的 action
+
+    返回:
+        tuple: (表单提交地址, 表单字段字典, 电话号码字段名)
+
+    异常:
+        SlotUnavailableError: 页面上没有预约表单，state 为页面提示对应的状态
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    phone_input = soup.find("input", id=PHONE_FIELD_ID)
+    if phone_input is None:
+        # 延迟导入，page_state 从本模块导入表单字段的 id
+        from page_state import classify_html
+
+        state = classify_html(html, page_url)
+        raise SlotUnavailableError(state.message or "未找到电话号码输入框，请检查所选时间段是否已被约满/未开放/已经预约成功。",
+                                   state.state)
+
+    form = phone_input.find_parent("form")
+    if form is None:
+        raise FormParseError("电话号码输入框不在表单中")
+
+    fields = {}
+    for element in form.find_all(["input", "textarea", "select"]):
+        name = element.get("name")
+        if not name or element.get("type") in ("submit", "button", "image", "file"):
+            continue
+        if element.get("type") in ("checkbox", "radio") and not element.has_attr("checked"):
+            continue
+        fields[name] = element.get("value", "")
+
+    for required in ("form_build_id", "form_token", "form_id"):
+        if not fields.get(required):
+            raise FormParseError(f"表单缺少隐藏字段 {required}")
+
+    submit_button = form.find(id=SUBMIT_BUTTON_ID)
+    if submit_button is None or not submit_button.get("name"):
+        raise FormParseError("未找到提交按钮")
+    fields[submit_button["name"]] = submit_button.get("value", "")
+
+    phone_name = phone_input.get("name")
+    if not phone_name:
+        raise FormParseError("电话号码输入框缺少 name 属性")
+
+    action = urljoin(page_url, form.get("action") or page_url)
+    return action, fields, phone_name
+
+
+class HttpSubmitter:
+    """
+    不经过浏览器直接提交预约表单
+
+    从已登录的浏览器驱动中复制会话 Cookie，用连接池里的长连接获取表单并直接 POST。
+
+    属性:
+        http (urllib3.PoolManager): 复用连接的 HTTP 连接池
+        headers (dict): 每个请求携带的请求头（Cookie、User-Agent）
+    """
+
+    def __init__(self, timeout=10):
+        self.http = urllib3.PoolManager(maxsize=4, retries=False,
+                                        timeout=urllib3.Timeout(connect=timeout, read=timeout))
+        self.headers = {}
+
+    def load_cookies_from_driver(self, driver):
+        """
+        复制浏览器当前域名下的 Cookie 和 User-Agent
+
+        参数:
+            driver: 已登录且停留在场馆页面的浏览器驱动
+        """
+        cookies = driver.get_cookies()
+        self.headers["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        self.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+
+    def warm(self, url):
+        """
+        发一个 HEAD 请求，建立或刷新到站点的长连接
+
+        参数:
+            url (str): 站点地址
+        """
+        self.http.request("HEAD", url, headers=self.headers, redirect=False)
+
+    def fetch(self, url):
+        """
+        用当前会话获取页面 HTML
+
+        参数:
+            url (str): 页面地址
+
+        返回:
+            str: 页面 HTML
+        """
+        GOVERNOR.before_request()
+        response = self.http.request("GET", url, headers=self.headers, redirect=False)
+        GOVERNOR.record(response.status, retry_after_seconds(response.headers.get("Retry-After")))
+        if response.status == 429 or response.status >= 500:
+            raise ServerBusyError(response.status)
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.headers.get("Location", "")
+            raise FormParseError(f"页面被重定向到 {urlparse(location).netloc or location}，会话可能已失效")
+        if response.status != 200:
+            raise FormParseError(f"获取页面失败，状态码 {response.status}")
+        return response.data.decode("utf-8", errors="replace")
+
+    def fetch_conditional(self, url, validators=None):
+        """
+        用条件请求获取页面：带上一次响应的 ETag/Last-Modified，服务器支持时页面没有变化只返回 304
+
+        参数:
+            url (str): 页面地址
+            validators (dict): 上一次调用返回的条件请求头，第一次请求为 None
+
+        返回:
+            tuple: (页面 HTML，没有变化时为 None, 下一次请求使用的条件请求头, 本次传输的字节数)
+
+        异常:
+            AuthExpiredError: 被重定向到统一身份认证，登录会话已失效
+        """
+        validators = validators or {}
+        GOVERNOR.before_request()
+        response = self.http.request("GET", url, headers=dict(self.headers, **validators), redirect=False)
+        GOVERNOR.record(response.status, retry_after_seconds(response.headers.get("Retry-After")))
+        # 响应头按 "名称: 值\r\n" 估算，加上状态行和空行
+        size = len(response.data) + sum(len(name) + len(value) + 4 for name, value in response.headers.items()) + 19
+        if response.status == 304:
+            return None, validators, size
+        if response.status == 429 or response.status >= 500:
+            raise ServerBusyError(response.status)
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.headers.get("Location", "")
+            if urlparse(location).hostname == ids_host():
+                raise AuthExpiredError("页面被重定向到统一身份认证，登录会话已失效")
+            raise FormParseError(f"页面被重定向到 {urlparse(location).netloc or location}")
+        if response.status != 200:
+            raise FormParseError(f"获取页面失败，状态码 {response.status}")
+        validators = {}
+        if response.headers.get("ETag"):
+            validators["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+        return response.data.decode("utf-8", errors="replace"), validators, size
+
+    def submit(self, url, phone_number):
+        """
+        获取预约表单并直接提交
+
+        参数:
+            url (str): 时间段预约页面地址
+            phone_number (str): 电话号码
+
+        返回:
+            SubmitResult: 根据响应判断的提交结果
+        """
+        return self.submit_form(url, self.fetch_form(url), phone_number)
+
+    def fetch_form(self, url):
+        """获取并解析预约表单，返回 (表单提交地址, 表单字段字典, 电话号码字段名)"""
+        return parse_slot_form(self.fetch(url), url)
+
+    def submit_form(self, url, form, phone_number, before_send=None):
+        """
+        提交已经获取到的预约表单
+
+        从这里开始请求可能已经发到服务器，调用方不能再把出错当作没有提交。
+
+        参数:
+            url (str): 时间段预约页面地址
+            form (tuple): fetch_form 的返回值
+            phone_number (str): 电话号码
+            before_send (callable): 发出提交请求前调用，例如 Trigger.mark_submit
+
+        返回:
+            SubmitResult: 根据响应判断的提交结果
+        """
+        # 延迟导入，page_state 从本模块导入表单字段的 id
+        from page_state import redirect_target, verify_submit_response
+
+        action, fields, phone_name = form
+        fields = dict(fields)
+        fields[phone_name] = phone_number
+
+        headers = dict(self.headers)
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+        headers["Referer"] = url
+        GOVERNOR.before_request()
+        if before_send is not None:
+            before_send()
+        response = self.http.request("POST", action, body=urlencode(fields), headers=headers, redirect=False)
+        GOVERNOR.record(response.status, retry_after_seconds(response.headers.get("Retry-After")))
+        if response.status == 429 or response.status >= 500:
+            raise ServerBusyError(response.status)
+        if response.status not in (200, 301, 302, 303):
+            raise FormParseError(f"提交预约表单失败，状态码 {response.status}")
+        with tracing.span("verify_submit") as span:
+            location = response.headers.get("Location", "")
+            target = redirect_target(response.status, location, url)
+            target_html = None
+            if target is not None:
+                # 跳转后的页面才有提示消息，读一次；读不到时结果为 UNKNOWN，由调用方核对
+                try:
+                    target_html = self.fetch(target)
+                except (FormParseError, ServerBusyError, AuthExpiredError, urllib3.exceptions.HTTPError) as e:
+                    print(f"读取提交后跳转的页面失败: {e}")
+            result = verify_submit_response(response.status, location, response.data.decode("utf-8", errors="replace"),
+                                            url, target_html)
+            span.attrs.update(url=url, outcome=result.outcome, reason=result.reason)
+        return result
@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+# 等待条件的轮询间隔（秒），WebDriverWait 默认的 0.5 秒对抢时间段来说太慢
+POLL_FREQUENCY = 0.05
+
+# 一次 JS 调用填写多个输入框，并触发 input/change 事件，让页面上的脚本感知到新值
+FILL_FIELDS_SCRIPT = """
+for (const [element, value] of arguments[0]) {
+    const prototype = element instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(prototype, 'value').set.call(element, value);
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+}
+"""
+
+
+def wait_for(driver, condition, timeout, poll_frequency=None):
+    """
+    等待条件成立并返回条件的结果
+
+    参数:
+        driver: 浏览器驱动
+        condition (callable): expected_conditions 中的条件
+        timeout (float): 超时时间（秒）
+        poll_frequency (float): 轮询间隔（秒），默认为 POLL_FREQUENCY
+    """
+    return WebDriverWait(driver, timeout, poll_frequency=poll_frequency or POLL_FREQUENCY).until(condition)
+
+
+def fill_fields(driver, values):
+    """
+    通过一次 JS 调用直接写入多个输入框的值，代替逐字符的 send_keys
+
+    参数:
+        driver: 浏览器驱动
+        values (list): [(元素, 值), ...]
+    """
+    driver.execute_script(FILL_FIELDS_SCRIPT, [[element, value] for element, value in values])
+
+
+class StepTimer:
+    """
+    分步计时器
+
+    记录每个交互步骤的耗时，以及相对于原来固定 sleep 省去的等待时间，结束时打印报告。
+
+    属性:
+        name (str): 计时器名称，出现在报告标题中
+        steps (list): [(步骤名称, 耗时秒数), ...]
+        removed_sleep (float): 省去的固定等待时间（秒）
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = []
+        self.removed_sleep = 0.0
+
+    @contextmanager
+    def step(self, name, removed_sleep=0.0):
+        """
+        记录一个步骤的耗时
+
+        参数:
+            name (str): 步骤名称
+            removed_sleep (float): 这个步骤省去的固定等待时间（秒）
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.monotonic() - start))
+            self.removed_sleep += removed_sleep
+
+    def report(self):
+        """打印各步骤耗时报告"""
+        if not self.steps:
+            return
+        print(f"[{self.name}] 各步骤耗时:")
+        for name, elapsed in self.steps:
+            print(f"    {name}: {elapsed * 1000:.0f} 毫秒")
+        total = sum(elapsed for _, elapsed in self.steps)
+        print(f"    合计 {total * 1000:.0f} 毫秒，省去固定等待 {self.removed_sleep:.1f} 秒")
@@ -0,0 +1,149 @@
+import argparse
+import json
+from datetime import datetime
+from itertools import groupby
+
+from urls import normalize_activity
+
+# 任务状态
+PENDING = "pending"  # 排队中
+WAITING = "waiting"  # 等待开放时间
+RUNNING = "running"  # 正在预约
+SUCCESS = "success"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCESS, FAILED, CANCELLED)
+
+STATUS_LABELS = {PENDING: "排队中", WAITING: "等待开放", RUNNING: "预约中", SUCCESS: "成功", FAILED: "失败",
+                 CANCELLED: "已取消"}
+
+ACTIVITY_LABELS = {"fitness": "健身", "swimming": "游泳"}
+
+
+class ReservationJob:
+    """
+    预约队列中的一个任务：一个预约日期、一种活动和按优先级排列的时间段
+
+    队列中的任务共用一个登录会话，按开放时间依次执行，开放时间相同时按优先级执行，见 trigger_groups。
+    任务的状态和结果由预约引擎直接写入。
+
+    属性:
+        activity (str): "fitness" 或 "swimming"
+        reserve_date (str): 预约日期，格式为 yyyy-MM-dd
+        slots (list): 按优先级排列的时间段，例如 ["18:00-19:30"]
+        start_at (datetime): 预约开放时间，为 None 时队列开始后立即预约
+        priority (int): 优先级，越小越优先，通常是加入队列的顺序
+        status (str): 任务状态，见 STATUS_LABELS
+        message (str): 状态说明或结果
+        booked (str): 预约成功的时间段
+    """
+
+    def __init__(self, activity, reserve_date, slots, start_at=None, priority=0):
+        self.activity = normalize_activity(activity)
+        self.reserve_date = reserve_date
+        self.slots = list(slots)
+        self.start_at = start_at
+        self.priority = priority
+        self.status = PENDING
+        self.message = ""
+        self.booked = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def update(self, status, message=""):
+        """更新任务状态并打印"""
+        self.status = status
+        self.message = message
+        print(f"[{self.describe()}] {STATUS_LABELS[status]}" + (f": {message}" if message else ""))
+
+    def describe(self):
+        """任务的简短说明，例如 "2024-10-12 健身 18:00-19:30/19:30-21:00" """
+        return f"{self.reserve_date} {ACTIVITY_LABELS[self.activity]} {'/'.join(self.slots)}"
+
+    def to_dict(self):
+        """转换为可以写入 JSON 的字典，只包含任务的配置"""
+        return {"activity": self.activity, "date": self.reserve_date, "slots": self.slots,
+                "start_at": self.start_at.isoformat(timespec="seconds") if self.start_at else None,
+                "priority": self.priority}
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 to_dict 的结果创建任务"""
+        start_at = datetime.fromisoformat(data["start_at"]) if data.get("start_at") else None
+        return cls(data["activity"], data["date"], data["slots"], start_at, data.get("priority", 0))
+
+    def snapshot(self):
+        """任务的配置和当前状态，用于跨线程通知界面"""
+        return dict(self.to_dict(), status=self.status, message=self.message, booked=self.booked)
+
+
+def trigger_groups(jobs):
+    """
+    按开放时间把任务分组
+
+    不指定开放时间的任务在最前面；每组内按优先级排列。
+
+    返回:
+        list: [[任务, ...], ...]，按开放时间排序
+    """
+    def trigger_key(job):
+        return (job.start_at is not None, job.start_at or datetime.min)
+
+    ordered = sorted(jobs, key=lambda job: (trigger_key(job), job.priority))
+    return [list(group) for _, group in groupby(ordered, key=trigger_key)]
+
+
+def load_queue(path):
+    """
+    读取队列文件
+
+    队列文件是一个 JSON 列表，每一项为 ReservationJob.to_dict 的格式，例如:
+
+        [
+          {"activity": "swimming", "date": "2024-10-15", "slots": ["09:30-11:00"],
+           "start_at": "2024-10-08 08:00:00"},
+          {"activity": "fitness", "date": "2024-10-17", "slots": ["18:00-19:30", "19:30-21:00"],
+           "start_at": "2024-10-10 08:00:00"}
+        ]
+
+    没有 priority 时按文件中的顺序排列优先级。
+
+    返回:
+        list: ReservationJob 列表
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [ReservationJob.from_dict(dict({"priority": index}, **entry)) for index, entry in enumerate(entries)]
+
+
+def print_summary(jobs):
+    """打印每个任务的最终状态"""
+    for job in sorted(jobs, key=lambda job: job.priority):
+        print(f"{job.describe()}: {STATUS_LABELS[job.status]}" + (f"（{job.message}）" if job.message else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用一个登录会话依次执行多个预约任务")
+    parser.add_argument("student_id", help="学号")
+    parser.add_argument("queue", help="队列文件，格式见 load_queue")
+    parser.add_argument("--password", help="密码，没有可用的登录会话时用于浏览器登录")
+    parser.add_argument("--lead-time", type=float, default=120, help="在开放时间前多少秒开始准备")
+    parser.add_argument("--fire-offset", type=float, default=0.0, help="提前触发的秒数")
+    parser.add_argument("--deadline", type=float, default=60, help="每个开放时间的重试时间预算（秒）")
+    args = parser.parse_args()
+
+    # 延迟导入，只查看队列文件格式错误时不必加载预约引擎
+    from async_engine import run_queue
+
+    jobs = load_queue(args.queue)
+    success = run_queue(args.student_id, args.password, jobs, lead_time=args.lead_time, fire_offset=args.fire_offset,
+                        deadline=args.deadline)
+    print_summary(jobs)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
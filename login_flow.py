@@ -0,0 +1,57 @@
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+from urls import cgyy_host, ids_host
+
+# 登录状态
+LOGGED_IN = "logged_in"  # 已有场馆预约系统的会话 Cookie
+CAS_SSO = "cas_sso"  # 已有统一身份认证的登录凭证，访问登录页会直接跳回场馆预约系统
+ANONYMOUS = "anonymous"  # 需要输入账号密码
+
+CAS_TGC_COOKIE = "CASTGC"
+
+
+def _all_cookies(driver):
+    """读取浏览器中所有站点的 Cookie，不需要导航；不支持 CDP 时只能读取当前页面的 Cookie"""
+    try:
+        return driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+    except (WebDriverException, AttributeError):
+        return driver.get_cookies()
+
+
+def is_cgyy_session_cookie(cookie):
+    """是否为场馆预约系统（Drupal）的会话 Cookie"""
+    return (cookie.get("domain", "").lstrip(".") == cgyy_host()
+            and cookie.get("name", "").startswith(("SESS", "SSESS")))
+
+
+def forget_cgyy_session(driver):
+    """删除浏览器中失效的场馆预约系统会话 Cookie，保留统一身份认证的登录凭证"""
+    for cookie in _all_cookies(driver):
+        if is_cgyy_session_cookie(cookie):
+            try:
+                driver.execute_cdp_cmd("Network.deleteCookies", {"name": cookie["name"], "domain": cookie["domain"]})
+            except WebDriverException:
+                driver.delete_cookie(cookie["name"])
+
+
+def detect_auth_state(driver):
+    """
+    根据浏览器中现有的 Cookie 判断登录状态
+
+    返回:
+        str: LOGGED_IN、CAS_SSO 或 ANONYMOUS
+    """
+    state = ANONYMOUS
+    for cookie in _all_cookies(driver):
+        if is_cgyy_session_cookie(cookie):
+            return LOGGED_IN
+        if cookie.get("domain", "").lstrip(".") == ids_host() and cookie.get("name") == CAS_TGC_COOKIE:
+            state = CAS_SSO
+    return state
+
+
+def on_cgyy(driver):
+    """当前页面是否已经回到场馆预约系统"""
+    return urlparse(driver.current_url).hostname == cgyy_host()
@@ -1,58 +1,55 @@
+import os
 import time
-from typing import Union
+from urllib.parse import urlparse
 
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
-from selenium.webdriver.common.by import By
+import urllib3
+from selenium.common.exceptions import NoSuchElementException, NoSuchWindowException, TimeoutException, WebDriverException
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchWindowException
 
-
-def attempt_login(driver, url, username, password, timeout=30):
+import interaction
+import tracing
+from attempt_history import HISTORY_PATH, HistoryStore, attach as attach_history
+from availability import order_by_availability, scan_open_slots
+from driver_pool import DriverPool, create_driver
+from http_submit import PHONE_NUMBER, FormParseError, HttpSubmitter, SlotUnavailableError
+from interaction import StepTimer, wait_for
+from login_flow import LOGGED_IN, detect_auth_state, forget_cgyy_session, on_cgyy
+from page_state import (BOOKED, CONFIRMED, ERROR_PAGE, FORM_OPEN, LOGGED_OUT, NOT_OPEN, UNKNOWN, VERIFY_TIMEOUT,
+                        SubmitResult, classify_html, recheck_submit)
+from pages import CasLoginPage, HomePage, RoomPage, SlotFormPage
+from preload import TabPreloader, report_saving
+from prewarm import dns_cache, navigation_timing, preflight, warm_connections
+from process_watchdog import ProcessWatchdog
+from retry_policy import (FATAL, GOVERNOR, AllSlotsFullError, AuthExpiredError, Backoff, BrowserClosedException,
+                          ReservationCancelled, RetryPolicy, ServerBusyError, SlotNotOpenError, cancel_scope,
+                          error_page_status, interruptible_sleep)
+from scheduler import Trigger, estimate_server_offset
+from session_store import SessionStore
+from slot_catalog import CATALOG
+from slot_watch import SlotWatcher
+from tracing import current_span, traced
+from urls import (ROOMS, cas_username_login_url, cas_weixin_url, cgyy_host, home_url, ids_host, normalize_activity,
+                  room_url, slot_form_url)
+
+@traced("attempt_login")
+def attempt_login(driver, url, username, password, timeout=30, timer=None):
+    timer = timer or StepTimer("场馆登录")
+    page = HomePage(driver)
     try:
         # 访问登录页面
-        driver.get(url)
-
-        # 首先等待 body 元素加载完成
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.TAG_NAME, 'body'))
-        )
+        with timer.step("打开场馆首页"):
+            driver.get(url)
 
-        # 检查是否已经登录
-        try:
-            expected_text = "本系统仅供在校师生使用，不得在体育场馆进行其他无关的活动。"
-            WebDriverWait(driver, 2).until(
-                EC.text_to_be_present_in_element((By.XPATH, '//*[@id="block-block-1"]/p[1]'), expected_text)
-            )
+        # 等待页面出现登录后的提示文本或登录表单，哪个先出现就按哪个处理
+        with timer.step("检查登录状态"):
+            result = page.wait_ready(timeout)
+        if result is True:
             print("已经处于登录状态，检测到预期文本内容。")
             return True
-        except TimeoutException:
-            # 如果没有检测到预期文本，则继续登录流程
-            pass
-
-        # 等待并填写用户名
-        username_input = WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.XPATH, '//*[@id="user_name"]'))
-        )
-        username_input.send_keys(username)
-
-        time.sleep(0.5)
-
-        # 填写密码
-        password_input = driver.find_element(By.XPATH, '//*[@id="form"]/div[3]/div/input')
-        password_input.send_keys(password)
-
-        time.sleep(0.5)
 
-        # 点击登录按钮
-        login_button = driver.find_element(By.XPATH, '//*[@id="login"]')
-        login_button.click()
-
-        # 等待特定文本内容出现，表示页面加载完成
-        WebDriverWait(driver, timeout).until(
-            EC.text_to_be_present_in_element((By.XPATH, '//*[@id="block-block-1"]/p[1]'), expected_text)
-        )
+        # 填写用户名和密码，点击登录并等待特定文本内容出现
+        with timer.step("填写账号密码并登录", removed_sleep=1.0):
+            page.login(result, username, password, timeout)
 
         print("登录成功，已检测到预期文本内容。")
         return True
@@ -61,22 +58,35 @@ def attempt_login(driver, url, username, password, timeout=30):
         return False
 
 
-class BrowserClosedException(Exception):
-    """自定义异常，表示浏览器已被关闭"""
-    pass
-
-
+@traced("navigate_with_retry")
 def navigate_with_retry(driver, url, wait_element, max_retries=3, retry_delay=5):
     retry_count = 0
+    backoff = Backoff(cap=retry_delay)
+    current_span().attrs["url"] = url
+    expect_cgyy = urlparse(url).hostname == cgyy_host()
+
+    def redirected_to_cas(driver):
+        return expect_cgyy and urlparse(driver.current_url).hostname == ids_host()
+
     while True:
         try:
             retry_count += 1
+            current_span().retries = retry_count - 1
             print(f"尝试导航到页面 {url} (第 {retry_count} 次)")
 
+            GOVERNOR.before_request()
             driver.get(url)
-            element_present = WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located(wait_element)
-            )
+            element_present = wait_for(driver, EC.any_of(
+                EC.presence_of_element_located(wait_element),
+                redirected_to_cas,
+                error_page_status
+            ), 30)
+            if redirected_to_cas(driver):
+                raise AuthExpiredError("页面被重定向到统一身份认证，登录会话已失效")
+            status = error_page_status(driver)
+            GOVERNOR.record(status or 200)
+            if status:
+                raise ServerBusyError(status)
             if element_present:
                 print(f"已成功打开页面: {url}")
                 return True
@@ -87,6 +97,8 @@ def navigate_with_retry(driver, url, wait_element, max_retries=3, retry_delay=5)
         except NoSuchWindowException:
             print("浏览器窗口已被关闭。")
             raise BrowserClosedException("浏览器窗口已被关闭")
+        except AuthExpiredError:
+            raise
         except TimeoutException:
             print(f"页面加载超时 (尝试 {retry_count}/{max_retries})")
         except Exception as e:
@@ -96,29 +108,18 @@ def navigate_with_retry(driver, url, wait_element, max_retries=3, retry_delay=5)
             print(f"达到最大重试次数 ({max_retries})。操作失败。")
             return False
 
-        print(f"等待 {retry_delay} 秒后重试...")
-        time.sleep(retry_delay)
+        delay = backoff.next()
+        print(f"等待 {delay:.2f} 秒后重试...")
+        interruptible_sleep(delay)
 
 
-def perform_login(driver, username, password):
+@traced("perform_login")
+def perform_login(driver, username, password, timer=None):
+    timer = timer or StepTimer("统一身份认证登录")
     try:
-        # 定位并填写用户名
-        username_field = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, '//*[@id="username"]'))
-        )
-        username_field.clear()
-        username_field.send_keys(username)
-        time.sleep(0.5)
-
-        # 定位并填写密码
-        password_field = driver.find_element(By.XPATH, '//*[@id="password"]')
-        password_field.clear()
-        password_field.send_keys(password)
-        time.sleep(0.5)
-
-        # 点击登录按钮
-        login_button = driver.find_element(By.XPATH, '//*[@id="login_submit"]')
-        login_button.click()
+        # 等待登录表单，填写用户名和密码并点击登录按钮
+        with timer.step("填写账号密码并登录", removed_sleep=1.0):
+            CasLoginPage(driver).login(username, password)
 
         print("登录操作完成")
         return True
@@ -136,160 +137,703 @@ def perform_login(driver, username, password):
         return False
 
 
-def automated_login(student_id, password, fitness_or_swimming, reserve_date, reserve_time: list,
-                    max_retries=(2 << 63) - 1,
-                    retry_delay=3):
-    url = "https://cgyy.xmu.edu.cn/"  # 请替换为实际的登录页面URL
-    username = student_id
+@traced("fast_login")
+def fast_login(driver, username, password, timeout=30, timer=None):
+    """
+    用最少的页面加载完成登录
+
+    不再经过场馆首页和企业微信登录页，先根据 Cookie 判断登录状态，再直接打开统一身份认证的
+    账号密码登录页面，service 参数指向场馆预约系统的回调地址。
+    已有统一身份认证凭证时这一次导航就会跳回场馆预约系统。
+
+    参数:
+        driver: 浏览器驱动
+        username (str): 学号
+        password (str): 密码
+        timeout (float): 等待页面的超时时间（秒）
+        timer (StepTimer): 分步计时器
+
+    返回:
+        bool: 是否已经登录到场馆预约系统
+    """
+    timer = timer or StepTimer("快速登录")
+    span = current_span()
+    state = detect_auth_state(driver)
+    span.attrs["auth_state"] = state
+    span.attrs["navigations"] = 0
+    if state == LOGGED_IN:
+        print("已有场馆预约系统的会话，跳过登录")
+        return True
+
+    try:
+        with timer.step("打开统一身份认证登录页"):
+            driver.get(cas_username_login_url())
+            span.attrs["navigations"] += 1
+            wait_for(driver, EC.any_of(
+                on_cgyy,
+                EC.presence_of_element_located(CasLoginPage.USERNAME)
+            ), timeout)
+        if on_cgyy(driver):
+            print("统一身份认证已登录，直接跳回场馆预约系统")
+            return True
+
+        if not perform_login(driver, username, password, timer=timer):
+            return False
+        with timer.step("等待跳回场馆预约系统"):
+            wait_for(driver, on_cgyy, timeout)
+        print("厦大账号登录操作成功完成")
+        return True
+    except NoSuchWindowException:
+        raise BrowserClosedException("浏览器窗口已被关闭")
+    except TimeoutException:
+        print("快速登录超时，将使用完整登录流程")
+        return False
+
+
+@traced("login_chain")
+def login_chain(driver, username, password, retry_delay=3, timer=None):
+    """
+    完成从场馆首页到厦大统一身份认证的完整登录流程
+
+    参数:
+        driver: 浏览器驱动
+        username (str): 学号
+        password (str): 密码
+        retry_delay (int): 页面导航失败时的重试间隔（秒）
+        timer (StepTimer): 分步计时器
+    """
+    url = home_url()
+    current_span().attrs["navigations"] = 3
+
+    if not attempt_login(driver, url, username, password, timer=timer):
+        raise Exception("登录失败")
+
+    print("登录成功！")
+
+    weixin_url = cas_weixin_url()
+    username_password_url = cas_username_login_url()
+
+    if not navigate_with_retry(driver, weixin_url, CasLoginPage.WEIXIN_TAB, 3, retry_delay):
+        raise Exception("导航到厦大账号企业微信登录页面失败")
+    print("成功导航到厦大账号企业微信登录页面")
+
+    if not navigate_with_retry(driver, username_password_url, CasLoginPage.USERNAME, 3, retry_delay):
+        raise Exception("导航到厦大账号账密登录页面失败")
+    print("成功导航到厦大账号账密登录页面")
+
+    if not perform_login(driver, username, password, timer=timer):
+        raise Exception("厦大账号登录操作失败")
+    print("厦大账号登录操作成功完成")
+
+
+@traced("open_room_page")
+def open_room_page(driver, fitness_or_swimming, retry_delay=3):
+    """
+    打开健身房或游泳馆的预约总览页面
+
+    参数:
+        driver: 浏览器驱动
+        fitness_or_swimming (str): "fitness" 或 "swimming"
+        retry_delay (int): 页面导航失败时的重试间隔（秒）
+    """
+    if fitness_or_swimming not in ROOMS:
+        raise ValueError("fitness_or_swimming变量只能选择预约健身房(fitness)或预约游泳馆(swimming)")
+    room, room_name = CATALOG.room(fitness_or_swimming)
+    if not navigate_with_retry(driver, room_url(room), RoomPage.TITLE, 3, retry_delay):
+        raise Exception(f"导航到{room_name}预约页面失败")
+
+
+@traced("restore_session")
+def restore_session(driver, session_store, username, fitness_or_swimming, timeout=10):
+    """
+    恢复保存的登录会话，并用一次页面导航验证它是否仍然有效
+
+    会话有效时浏览器会停留在预约总览页面；被重定向到统一身份认证说明会话已过期，删除保存的会话。
+
+    参数:
+        driver: 新启动的浏览器驱动
+        session_store (SessionStore): 会话存储
+        username (str): 学号
+        fitness_or_swimming (str): "fitness" 或 "swimming"
+        timeout (float): 等待页面的超时时间（秒）
+
+    返回:
+        bool: 会话是否有效
+    """
+    if not session_store.restore(driver, username):
+        return False
+    room, room_name = CATALOG.room(fitness_or_swimming)
+    driver.get(room_url(room))
+    try:
+        wait_for(driver, EC.any_of(
+            EC.presence_of_element_located(RoomPage.TITLE),
+            EC.presence_of_element_located(CasLoginPage.USERNAME),
+            EC.presence_of_element_located(CasLoginPage.WEIXIN_TAB)
+        ), timeout)
+    except TimeoutException:
+        return False
+    if urlparse(driver.current_url).hostname == cgyy_host() and RoomPage(driver).is_loaded():
+        print(f"保存的登录会话有效，已直接打开{room_name}预约页面")
+        return True
+    print("保存的登录会话已过期，将重新登录")
+    session_store.clear(username)
+    forget_cgyy_session(driver)
+    return False
 
-    time_to_index = {
-        "swimming": {
-            "09:30-11:00": 5,
-            "12:00-14:00": 4,
-            "14:30-16:00": 1,
-            "16:30-18:00": 2,
-            "18:30-20:30": 3,
-        },
-        "fitness": {
-            "10:30-12:00": 16,
-            "12:00-13:30": 10,
-            "13:30-15:00": 11,
-            "15:00-16:30": 12,
-            "16:30-18:00": 13,
-            "18:00-19:30": 14,
-            "19:30-21:00": 15,
-        }
-    }
-
-    if fitness_or_swimming == "游泳":
-        fitness_or_swimming = "swimming"
-    elif fitness_or_swimming == "健身":
-        fitness_or_swimming = "fitness"
-
-    reserve_time = [time_to_index[fitness_or_swimming][reserve_time[i]] for i in range(len(reserve_time))]
-
-    for attempt in range(max_retries):
-        print(f"执行第 {attempt + 1} 次尝试")
-        driver = None
+
+def login_and_save_session(student_id, password, browser_profile="fast", browser="edge", retry_delay=3,
+                           session_store=None):
+    """
+    只用浏览器登录一次并加密保存会话，登录后立即关闭浏览器
+
+    供不启动浏览器的异步引擎使用，例如预约队列中的所有任务共用这一次登录。
+
+    参数:
+        student_id (str): 学号
+        password (str): 密码
+        browser_profile (str | dict): 浏览器配置
+        browser (str): 使用的浏览器，"edge" 或 "chrome"
+        retry_delay (int): 页面导航失败时的重试间隔（秒）
+        session_store (SessionStore): 保存会话的存储，默认为 SessionStore()
+
+    异常:
+        Exception: 登录失败
+    """
+    session_store = session_store or SessionStore()
+    with tracing.span("login_session") as span:
+        driver = create_driver(browser_profile, browser)
         try:
-            edge_options = webdriver.EdgeOptions()
-            edge_options.use_chromium = True
-            driver = webdriver.Edge(options=edge_options)
-
-            if not attempt_login(driver, url, username, password):
-                raise Exception("登录失败")
-
-            print("登录成功！")
-
-            weixin_url = "http://ids.xmu.edu.cn/authserver/login?service=http://cgyy.xmu.edu.cn/idcallbac"
-            username_password_url = "https://ids.xmu.edu.cn/authserver/login?type=userNameLogin&service=http%3A%2F%2Fcgyy.xmu.edu.cn%2Fidcallback"
-            reserve_fitness_url = "https://cgyy.xmu.edu.cn/room/1"
-            reserve_swimming_url = "https://cgyy.xmu.edu.cn/room/2"
-
-            if not navigate_with_retry(driver, weixin_url, (By.XPATH, '//*[@id="userNameLogin_a"]'), 3, retry_delay):
-                raise Exception("导航到厦大账号企业微信登录页面失败")
-            print("成功导航到厦大账号企业微信登录页面")
-
-            if not navigate_with_retry(driver, username_password_url, (By.XPATH, '//*[@id="username"]'), 3,
-                                       retry_delay):
-                raise Exception("导航到厦大账号账密登录页面失败")
-            print("成功导航到厦大账号账密登录页面")
-
-            if not perform_login(driver, username, password):
-                raise Exception("厦大账号登录操作失败")
-            print("厦大账号登录操作成功完成")
-
-            if fitness_or_swimming == "fitness":
-                if not navigate_with_retry(driver, reserve_fitness_url, (By.XPATH, '//*[@id="page-title"]'), 3,
-                                           retry_delay):
-                    raise Exception("导航到健身房预约页面失败")
-            elif fitness_or_swimming == "swimming":
-                if not navigate_with_retry(driver, reserve_swimming_url, (By.XPATH, '//*[@id="page-title"]'), 3,
-                                           retry_delay):
-                    raise Exception("导航到游泳馆预约页面失败")
-            else:
-                raise ValueError("fitness_or_swimming变量只能选择预约健身房(fitness)或预约游泳馆(swimming)")
+            if not fast_login(driver, student_id, password):
+                login_chain(driver, student_id, password, retry_delay)
+            session_store.save(driver, student_id)
+            span.attrs["saved"] = True
+        finally:
+            driver.quit()
 
-            reserve_done = False
 
-            # 在这里添加预约操作的代码
-            if fitness_or_swimming == "swimming":
-                for current_reserve_time in reserve_time:
-                    time_period_url = f"https://cgyy.xmu.edu.cn/room_apl/2/{reserve_date}/{current_reserve_time}/cg"
-                    if not navigate_with_retry(driver, time_period_url, (By.XPATH, '/html/body'), 1, retry_delay):
-                        raise Exception("导航到游泳馆预约填写电话界面失败")
+@traced("open_slot_form")
+def open_slot_form(driver, url, timeout=30):
+    """
+    打开时间段的预约表单页面，等待页面加载到可以用一次 DOM 查询判断状态
 
-                    try:
-                        print(f"尝试预约游泳馆的{current_reserve_time}时间段")
-                        input_phone_and_submit(driver)
-                    except NoSuchElementException as e:
-                        print(f"{current_reserve_time}:{str(e)}")
-                        continue
-
-                    print(f"预约游泳馆的{current_reserve_time}时间段成功！")
-                    reserve_done = True
-                    break
-            else:
-                for current_reserve_time in reserve_time:
-                    time_period_url = f"https://cgyy.xmu.edu.cn/room_apl/1/{reserve_date}/{current_reserve_time}/cg"
-                    if not navigate_with_retry(driver, time_period_url, (By.XPATH, '/html/body'), 1, retry_delay):
-                        raise Exception("导航到健身房预约填写电话界面失败")
+    参数:
+        driver: 浏览器驱动
+        url (str): 预约表单地址
+        timeout (float): 等待页面加载的超时时间（秒）
 
+    返回:
+        PageState: 页面状态
+
+    异常:
+        TimeoutException: 超时仍无法判断页面状态
+    """
+    span = current_span()
+    span.attrs["url"] = url
+    GOVERNOR.before_request()
+    try:
+        driver.get(url)
+        state = SlotFormPage(driver).wait_state(timeout)
+    except NoSuchWindowException:
+        raise BrowserClosedException("浏览器窗口已被关闭")
+    GOVERNOR.record(state.status or 200)
+    span.attrs.update(state=state.state, message=state.message)
+    return state
+
+
+def check_slot_state(state, slot, not_open):
+    """
+    检查预约表单页面的状态：会话失效和错误页抛出异常，尚未开放的时间段记入 not_open
+
+    调用者在状态为 FORM_OPEN 时填写表单，为 BOOKED 时视为预约成功，其余状态尝试下一个时间段。
+
+    参数:
+        state (PageState): 页面状态
+        slot (int): 时间段编号
+        not_open (list): 尚未开放的时间段编号
+
+    异常:
+        AuthExpiredError: 被重定向到登录页面
+        ServerBusyError: 服务器返回了 429/5xx 错误页
+    """
+    if state.state == LOGGED_OUT:
+        raise AuthExpiredError("预约表单页面被重定向到登录页面，登录会话已失效")
+    if state.state == ERROR_PAGE:
+        raise ServerBusyError(state.status)
+    if state.state == BOOKED:
+        print(f"{slot}:已经预约过该时间段")
+    elif state.state != FORM_OPEN:
+        if state.state == NOT_OPEN:
+            not_open.append(slot)
+        print(f"{slot}:{state.message or '页面上没有预约表单'}")
+
+
+@traced("verify_submit")
+def verify_submit(driver, url, slot, timer, timeout=VERIFY_TIMEOUT):
+    """
+    等待提交后的结果页面，确认服务器是否接受了预约；结果不明确时重新打开预约表单页面核对
+
+    参数:
+        driver: 刚点击了提交按钮的浏览器驱动
+        url (str): 预约表单地址
+        slot (int): 时间段编号
+        timer (StepTimer): 分步计时器
+        timeout (float): 等待结果页面的超时时间（秒）
+
+    返回:
+        SubmitResult: CONFIRMED 或 REJECTED
+    """
+    span = current_span()
+    span.attrs["slot"] = slot
+    with timer.step("确认提交结果"):
+        result = SlotFormPage(driver).verify_submit(timeout)
+        if result.outcome == UNKNOWN:
+            print(f"{slot}:无法确认提交结果（{result.reason}），重新打开预约表单页面核对")
+            state = open_slot_form(driver, url)
+            check_slot_state(state, slot, [])
+            result = recheck_submit(result, state)
+    span.attrs.update(outcome=result.outcome, reason=result.reason)
+    return result
+
+
+@traced("submit_preloaded")
+def submit_preloaded(preloader, room_name, trigger=None, timer=None, not_open=None):
+    """
+    按优先顺序在预加载的标签页中直接填写提交
+
+    参数:
+        preloader (TabPreloader): 已打开各时间段标签页的预加载器
+        room_name (str): 场馆名称
+        trigger (Trigger): 定时执行的触发点，用于记录实际首次提交时间
+        timer (StepTimer): 分步计时器
+        not_open (list): 不为 None 时追加尚未开放的时间段编号
+
+    返回:
+        int: 预约成功（或已经预约过）的时间段编号，全部失败时返回 None
+    """
+    timer = timer or StepTimer("预加载提交")
+    start = time.monotonic()
+    waited = 0.0
+    tried = []
+    not_open = [] if not_open is None else not_open
+    for slot in preloader.slots:
+        tried.append(slot)
+        wait_start = time.monotonic()
+        with timer.step(f"等待标签页 {slot}"), tracing.span("activate_tab", slot=slot) as tab_span:
+            tab_span.attrs["refreshed"] = preloader.refresh_if_missing(slot)
+            state = preloader.activate(slot)
+            if state is not None:
+                tab_span.attrs.update(state=state.state, message=state.message)
+        waited += time.monotonic() - wait_start
+        if state is None:
+            print(f"{slot}:预加载的页面加载超时")
+            continue
+        check_slot_state(state, slot, not_open)
+        if state.state == BOOKED:
+            return slot
+        if state.state != FORM_OPEN:
+            continue
+
+        try:
+            print(f"尝试在预加载的标签页中预约{room_name}的{slot}时间段")
+            input_phone_and_submit(preloader.driver, timer=timer,
+                                   before_send=trigger.mark_submit if trigger is not None else None)
+        except NoSuchElementException as e:
+            print(f"{slot}:{str(e)}")
+            continue
+
+        elapsed = time.monotonic() - start
+        result = verify_submit(preloader.driver, slot_form_url(preloader.room, preloader.reserve_date, slot), slot,
+                               timer)
+        if result.outcome != CONFIRMED:
+            print(f"{slot}:预约被拒绝: {result.reason}")
+            continue
+        sequential, saved = report_saving(elapsed, waited, tried, preloader.load_times)
+        span = current_span()
+        span.attrs.update(slot=slot, time_to_submit=round(elapsed, 6))
+        if saved is not None:
+            span.attrs.update(sequential_estimate=round(sequential, 6), saved=round(saved, 6))
+            print(f"预加载提交耗时 {elapsed * 1000:.0f} 毫秒，逐个加载页面预计 {sequential * 1000:.0f} 毫秒，"
+                  f"节省 {saved * 1000:.0f} 毫秒")
+        else:
+            print(f"预加载提交耗时 {elapsed * 1000:.0f} 毫秒")
+        return slot
+    return None
+
+
+@traced("submit_preferences")
+def submit_preferences(driver, fitness_or_swimming, reserve_date, reserve_time, retry_delay=3, trigger=None,
+                       submitter=None, timer=None, scan_availability=True, preloader=None):
+    """
+    按优先顺序依次尝试预约各个时间段
+
+    参数:
+        driver: 浏览器驱动
+        fitness_or_swimming (str): "fitness" 或 "swimming"
+        reserve_date (str): 预约日期，格式为 yyyy-MM-dd
+        reserve_time (list): 按优先级排列的时间段编号
+        retry_delay (int): 页面导航失败时的重试间隔（秒）
+        trigger (Trigger): 定时执行的触发点，用于记录实际首次提交时间
+        submitter (HttpSubmitter): 不为 None 时优先用 HTTP 直接提交，解析失败再回退到浏览器
+        timer (StepTimer): 分步计时器
+        scan_availability (bool): 是否先请求一次总览页面，只尝试仍可预约的时间段
+        preloader (TabPreloader): 不为 None 时先在预加载的标签页中提交，不再扫描总览页面
+
+    返回:
+        bool: 是否有时间段预约成功
+
+    异常:
+        SlotNotOpenError: 没有预约成功，但有时间段尚未开放，应立即重试
+    """
+    room, room_name = CATALOG.room(fitness_or_swimming)
+    timer = timer or StepTimer("提交预约")
+    not_open = []
+
+    if preloader is not None:
+        submitted = None
+        try:
+            submitted = submit_preloaded(preloader, room_name, trigger, timer, not_open)
+        finally:
+            preloader.close(keep=submitted)
+        if submitted is not None:
+            print(f"预约{room_name}的{submitted}时间段成功！")
+            return True
+        # 超出标签页数量的时间段继续逐个尝试
+        reserve_time = [slot for slot in reserve_time if slot not in preloader.slots]
+        if not reserve_time:
+            return check_not_open(not_open)
+    elif scan_availability:
+        open_slots = None
+        with timer.step("扫描可预约时间段"), tracing.span("scan_availability") as scan_span:
+            try:
+                open_slots = scan_open_slots(driver, room, reserve_date, submitter)
+            except (FormParseError, urllib3.exceptions.HTTPError, WebDriverException) as e:
+                print(f"扫描可预约时间段失败，将按顺序逐个尝试: {e}")
+            scan_span.attrs["open_slots"] = sorted(open_slots) if open_slots is not None else None
+        if open_slots is None:
+            print("无法从总览页面判断可预约的时间段，将按顺序逐个尝试")
+        else:
+            print(f"{room_name}在 {reserve_date} 可预约的时间段编号: {sorted(open_slots)}")
+        reserve_time = order_by_availability(reserve_time, open_slots)
+        if not reserve_time:
+            print("所选时间段均已约满或未开放。")
+            return False
+
+    for current_reserve_time in reserve_time:
+        time_period_url = slot_form_url(room, reserve_date, current_reserve_time)
+
+        if submitter is not None:
+            print(f"尝试通过 HTTP 直接预约{room_name}的{current_reserve_time}时间段")
+            submit_start = time.monotonic()
+            # 只有提交前获取表单出错才回退到浏览器提交；提交请求发出后出错时预约可能已经保存，只能核对
+            try:
+                form = submitter.fetch_form(time_period_url)
+            except SlotUnavailableError as e:
+                if e.state == BOOKED:
+                    print(f"{current_reserve_time}:已经预约过该时间段")
+                    return True
+                if e.state == NOT_OPEN:
+                    not_open.append(current_reserve_time)
+                print(f"{current_reserve_time}:{str(e)}")
+                continue
+            except (FormParseError, urllib3.exceptions.HTTPError) as e:
+                print(f"HTTP 获取预约表单失败，回退到浏览器提交: {e}")
+            else:
+                with tracing.span("http_submit", slot=current_reserve_time) as submit_span:
                     try:
-                        print(f"尝试预约健身房的{current_reserve_time}时间段")
-                        input_phone_and_submit(driver)
-                    except NoSuchElementException as e:
-                        print(f"{current_reserve_time}:{str(e)}")
-                        continue
-
-                    print(f"预约健身房的{current_reserve_time}时间段成功！")
-                    reserve_done = True
-                    break
-
-            if reserve_done:
-                print("所有操作成功完成！")
+                        result = submitter.submit_form(time_period_url, form, PHONE_NUMBER,
+                                                       trigger.mark_submit if trigger is not None else None)
+                    except (FormParseError, urllib3.exceptions.HTTPError) as e:
+                        result = SubmitResult(UNKNOWN, f"提交请求出错: {e}")
+                    if result.outcome == UNKNOWN:
+                        print(f"{current_reserve_time}:无法确认提交结果（{result.reason}），重新获取预约表单页面核对")
+                        try:
+                            result = recheck_submit(result, classify_html(submitter.fetch(time_period_url),
+                                                                          time_period_url))
+                        except (FormParseError, urllib3.exceptions.HTTPError) as e:
+                            result = SubmitResult(UNKNOWN, f"{result.reason}；重新获取预约表单核对也失败: {e}")
+                    submit_span.attrs["outcome"] = result.outcome
+                print(f"HTTP 提交耗时 {(time.monotonic() - submit_start) * 1000:.0f} 毫秒")
+                if result.outcome == UNKNOWN:
+                    # 不再提交，只用浏览器重新打开预约表单判断是否已经预约成功
+                    print(f"{current_reserve_time}:无法确认是否预约成功（{result.reason}），用浏览器重新打开预约表单核对")
+                    state = open_slot_form(driver, time_period_url)
+                    check_slot_state(state, current_reserve_time, [])
+                    result = recheck_submit(result, state)
+                if result.outcome != CONFIRMED:
+                    print(f"{current_reserve_time}:预约被拒绝: {result.reason}")
+                    continue
+                print(f"预约{room_name}的{current_reserve_time}时间段成功！")
                 return True
-            else:
-                print("所有时间段预约均失败。")
 
-        except Exception as e:
-            print(f"执行过程中出现错误: {e}")
-            if isinstance(e, NoSuchWindowException) or isinstance(e, BrowserClosedException):
-                print("浏览器被手动关闭，程序终止")
-                return False
-
-            if attempt < max_retries - 1:
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
-            else:
-                print("达到最大重试次数。操作失败。")
+        with timer.step(f"打开预约表单 {current_reserve_time}"):
+            state = open_slot_form(driver, time_period_url)
+        check_slot_state(state, current_reserve_time, not_open)
+        if state.state == BOOKED:
+            return True
+        if state.state != FORM_OPEN:
+            continue
+        timing = navigation_timing(driver)
+        if timing is not None:
+            print(f"预约表单页面建立连接耗时: DNS {timing['dns'] * 1000:.0f} 毫秒，TCP {timing['tcp'] * 1000:.0f} 毫秒，"
+                  f"TLS {timing['tls'] * 1000:.0f} 毫秒（都为 0 表示复用了已有连接）")
 
-        finally:
-            if driver:
-                try:
-                    driver.quit()
-                except Exception:
-                    pass  # 忽略关闭驱动程序时可能出现的错误
+        try:
+            print(f"尝试预约{room_name}的{current_reserve_time}时间段")
+            input_phone_and_submit(driver, timer=timer, before_send=trigger.mark_submit if trigger is not None else None)
+        except NoSuchElementException as e:
+            print(f"{current_reserve_time}:{str(e)}")
+            continue
+
+        result = verify_submit(driver, time_period_url, current_reserve_time, timer)
+        if result.outcome != CONFIRMED:
+            print(f"{current_reserve_time}:预约被拒绝: {result.reason}")
+            continue
+        print(f"预约{room_name}的{current_reserve_time}时间段成功！")
+        return True
+    return check_not_open(not_open)
 
+
+def check_not_open(not_open):
+    """没有预约成功时调用：有时间段尚未开放则抛出 SlotNotOpenError，否则返回 False"""
+    if not_open:
+        raise SlotNotOpenError(not_open)
     return False
 
 
-def input_phone_and_submit(driver, phone_number="17704675461"):
-    try:
-        # 查找电话号码输入框
-        input_element = driver.find_element(By.XPATH, '//*[@id="edit-field-tel-und-0-value"]')
+def automated_login(student_id, password, fitness_or_swimming, reserve_date, reserve_time: list,
+                    max_retries=(2 << 63) - 1,
+                    retry_delay=3,
+                    start_at=None,
+                    use_http_submit=False,
+                    browser_profile="default",
+                    browser="edge",
+                    poll_frequency=None,
+                    sync_server_clock=True,
+                    fire_offset=0.0,
+                    scan_availability=True,
+                    trace_dir="traces",
+                    remember_session=True,
+                    deadline=600,
+                    preload_tabs=False,
+                    memory_limit_mb=1536,
+                    watch=False,
+                    history_path=HISTORY_PATH,
+                    cancel=None,
+                    phase_listener=None):
+    """
+    自动登录并预约
+
+    如果指定了 start_at，则先完成准备阶段（启动浏览器、登录、打开预约页面并保持会话），
+    到达开始时间后才进入触发阶段，只做时间段页面跳转和提交。
+
+    参数:
+        student_id (str): 学号
+        password (str): 密码
+        fitness_or_swimming (str): 预约类型，"健身"/"游泳" 或 "fitness"/"swimming"
+        reserve_date (str): 预约日期，格式为 yyyy-MM-dd
+        reserve_time (list): 按优先级排列的时间段，例如 ["18:00-19:30"]
+        max_retries (int): 最大尝试次数
+        retry_delay (float): 重试退避的最长等待时间（秒）
+        start_at (datetime): 预约开放时间，为 None 时立即提交
+        use_http_submit (bool): 是否跳过浏览器，直接用 HTTP 请求提交预约表单
+        browser_profile (str | dict): 浏览器配置，"default" 或 "fast"（无界面、屏蔽静态资源）
+        browser (str): 使用的浏览器，"edge" 或 "chrome"
+        poll_frequency (float): 等待页面元素时的轮询间隔（秒），默认为 interaction.POLL_FREQUENCY
+        sync_server_clock (bool): 定时执行时是否按服务器时钟触发
+        fire_offset (float): 定时执行时在半个往返时间之外再提前触发的秒数
+        scan_availability (bool): 提交前是否先扫描总览页面，直接跳到优先级最高的可预约时间段
+        trace_dir (str): 分阶段追踪文件的目录，为 None 时不写文件
+        remember_session (bool): 是否加密保存登录会话，下次启动时跳过登录流程
+        deadline (float): 重试的时间预算（秒），定时执行时从预约开放时开始计算，为 None 时不限时
+        preload_tabs (bool): 是否在开放前用多个标签页同时打开各时间段的表单（不使用 HTTP 提交时有效）
+        memory_limit_mb (float): 浏览器进程树的内存上限（MB），超过后在下一次尝试前重建浏览器，为 None 时不限制
+        watch (bool): 所选时间段都已约满时是否保持登录会话监控总览页面，有人取消就立即提交，直到时间段开始
+        history_path (str): 预约历史数据库，记录每次观察和提交的结果，为 None 时不记录
+        cancel (CancelToken): 用于从其他线程取消预约，取消时关闭浏览器并返回 False
+        phase_listener (callable): 阶段开始和结束时的回调 phase_listener(事件, 阶段)，见 Tracer.add_listener
+    """
+    username = student_id
 
-        # 输入电话号码
-        input_element.clear()  # 清除可能存在的旧值
-        input_element.send_keys(phone_number)
+    fitness_or_swimming = normalize_activity(fitness_or_swimming)
+    reserve_periods = list(reserve_time)
+    reserve_time = CATALOG.indexes(fitness_or_swimming, reserve_periods)
+
+    trigger = None
+    if start_at is not None:
+        clock_source = (lambda: estimate_server_offset(home_url())) if sync_server_clock else None
+        trigger = Trigger(start_at, clock_source=clock_source, fire_offset=fire_offset)
+    if poll_frequency is not None:
+        interaction.POLL_FREQUENCY = poll_frequency
+
+    session_store = SessionStore() if remember_session else None
+    policy = RetryPolicy(budget=deadline, max_attempts=max_retries, backoff=Backoff(cap=retry_delay))
+    if trigger is not None:
+        # 预算从预约开放时开始计算，提前准备期间出错重试不会把预算用完；到达开放时间后再精确地重新开始一次
+        policy.start(trigger.remaining())
+
+    tracer = tracing.start_run(trace_dir)
+    if phase_listener is not None:
+        tracer.add_listener(phase_listener)
+    if history_path is not None:
+        attach_history(tracer, "browser", HistoryStore(history_path))
+    metrics_path = os.path.join(trace_dir, f"metrics-{tracer.run_id}.jsonl") if trace_dir is not None else None
+    watchdog = ProcessWatchdog(rss_ceiling=memory_limit_mb * 2 ** 20 if memory_limit_mb is not None else None,
+                               metrics_path=metrics_path).start()
+    pool = DriverPool(factory=lambda: create_driver(browser_profile, browser), watchdog=watchdog)
+    if cancel is not None:
+        # 取消时立即关闭浏览器，正在进行的页面等待会马上失败
+        cancel.on_cancel(pool.discard)
+    try:
+        with cancel_scope(cancel), dns_cache(), tracing.span("run", activity=fitness_or_swimming,
+                                                             date=reserve_date, slots=reserve_time) as run_span:
+            try:
+                while policy.next_attempt():
+                    attempt = policy.attempts
+                    print(f"执行第 {attempt} 次尝试（剩余时间预算 {policy.remaining():.0f} 秒）")
+                    timer = StepTimer(f"第 {attempt} 次尝试")
+                    try:
+                        if cancel is not None:
+                            cancel.check()
+                        with tracing.span("attempt", attempt=attempt):
+                            with tracing.span("browser_acquire") as acquire_span:
+                                driver = pool.acquire()
+                                acquire_span.attrs["reused"] = pool.reused
+                            if cancel is not None:
+                                # 取消可能发生在启动浏览器期间
+                                cancel.check()
+
+                            room_page_ready = False
+                            if not pool.logged_in:
+                                login_start = time.monotonic()
+                                if (session_store is not None and not pool.reused
+                                        and restore_session(driver, session_store, username, fitness_or_swimming)):
+                                    room_page_ready = True
+                                else:
+                                    if not fast_login(driver, username, password, timer=timer):
+                                        login_chain(driver, username, password, retry_delay, timer)
+                                    # 快速登录和完整登录流程成功后都保存会话
+                                    if session_store is not None:
+                                        try:
+                                            session_store.save(driver, username)
+                                        except (WebDriverException, OSError) as e:
+                                            print(f"保存登录会话失败: {e}")
+                                pool.mark_logged_in(time.monotonic() - login_start)
+
+                            if not room_page_ready:
+                                open_room_page(driver, fitness_or_swimming, retry_delay)
+                            if CATALOG.is_stale(fitness_or_swimming):
+                                # 总览页面已经打开，顺便核对时间段编号，不额外请求
+                                with tracing.span("catalog_check") as catalog_span:
+                                    catalog_span.attrs["changed"] = CATALOG.update(
+                                        CATALOG.room(fitness_or_swimming)[0], driver.page_source)
+                                if catalog_span.attrs["changed"]:
+                                    reserve_time = CATALOG.indexes(fitness_or_swimming, reserve_periods)
+                                    run_span.attrs["slots"] = reserve_time
+
+                            preloader = None
+                            if preload_tabs and not use_http_submit:
+                                preloader = TabPreloader(driver, CATALOG.room(fitness_or_swimming)[0], reserve_date,
+                                                         reserve_time)
+                                with tracing.span("preload_tabs", slots=preloader.slots):
+                                    preloader.open()
+
+                            # 在等待之前建立 HTTP 客户端，让它的长连接也能提前预热
+                            submitter = None
+                            if use_http_submit:
+                                submitter = HttpSubmitter()
+                                submitter.load_cookies_from_driver(driver)
+
+                            if trigger is not None and not trigger.fired:
+                                with tracing.span("preflight") as preflight_span:
+                                    costs = preflight([home_url(), cas_username_login_url()], submitter, driver)
+                                    preflight_span.attrs["handshakes"] = [cost._asdict() for cost in costs]
+                                print("准备阶段完成，等待预约开放...")
+                                with tracing.span("wait_trigger", start_at=start_at.isoformat()) as wait_span:
+                                    trigger.wait(keepalive=driver.refresh,
+                                                 warmup=lambda: warm_connections(home_url(), submitter, driver))
+                                    wait_span.attrs["clock_offset"] = trigger.clock.offset
+                                policy.start()
+
+                            if submit_preferences(driver, fitness_or_swimming, reserve_date, reserve_time, retry_delay,
+                                                  trigger, submitter, timer, scan_availability, preloader):
+                                policy.on_success()
+                                print("所有操作成功完成！")
+                                return True
+                            else:
+                                print("所有时间段预约均失败。")
+                                if watch:
+                                    if submitter is None:
+                                        watch_submitter = HttpSubmitter()
+                                        watch_submitter.load_cookies_from_driver(driver)
+                                    else:
+                                        watch_submitter = submitter
+                                    watcher = SlotWatcher(watch_submitter, CATALOG.room(fitness_or_swimming)[0],
+                                                          reserve_date, reserve_time, reserve_periods)
+                                    with tracing.span("watch") as watch_span:
+                                        try:
+                                            success = watcher.run(lambda slots: submit_preferences(
+                                                driver, fitness_or_swimming, reserve_date, slots, retry_delay,
+                                                None, submitter, timer, scan_availability=False))
+                                        finally:
+                                            watch_span.attrs.update(watcher.stats())
+                                    if success:
+                                        policy.on_success()
+                                        print("所有操作成功完成！")
+                                        return True
+                                    break
+                                raise AllSlotsFullError("所选时间段均已约满或未开放")
+
+                    except Exception as e:
+                        if cancel is not None and cancel.cancelled:
+                            raise ReservationCancelled("预约已取消") from e
+                        kind, delay = policy.on_error(e)
+                        print(f"执行过程中出现错误（{kind}）: {e}")
+                        if isinstance(e, NoSuchWindowException) or isinstance(e, BrowserClosedException):
+                            print("浏览器被手动关闭，程序终止")
+                            run_span.outcome = "browser_closed"
+                            return False
+                        if kind == FATAL:
+                            print("无法恢复的错误，程序终止")
+                            run_span.outcome = "fatal"
+                            return False
+                        if delay is None:
+                            print("所选时间段持续约满或时间预算已用完，停止重试。")
+                            break
+
+                        if policy.needs_login:
+                            print("登录会话已失效，重新登录后立即重试")
+                            pool.logged_in = False
+                            try:
+                                forget_cgyy_session(pool.driver)
+                            except WebDriverException:
+                                pool.discard()
+                        print(f"等待 {delay:.2f} 秒后重试...")
+                        interruptible_sleep(delay)
+
+                    finally:
+                        timer.report()
+
+                run_span.outcome = "failed"
+            except ReservationCancelled:
+                print("预约已取消")
+                run_span.outcome = "cancelled"
+            finally:
+                watchdog.sample()
+                run_span.attrs.update(watchdog.stats())
+
+    finally:
+        pool.close()
+        watchdog.close()
+        tracing.get_tracer().close()
 
-        # 等待0.5秒
-        time.sleep(0.5)
+    return False
 
-        # 查找并点击提交按钮
-        submit_button = driver.find_element(By.XPATH, '//*[@id="edit-submit"]')
-        submit_button.click()
 
+@traced("input_phone_and_submit")
+def input_phone_and_submit(driver, phone_number=PHONE_NUMBER, timer=None, before_send=None):
+    timer = timer or StepTimer("提交预约")
+    try:
+        SlotFormPage(driver).fill_and_submit(phone_number, timer, before_send)
         return True  # 操作成功完成，返回False表示不需要进一步处理
 
     except NoSuchElementException:
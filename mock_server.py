@@ -0,0 +1,473 @@
+import argparse
+import hashlib
+import html
+import random
+import secrets
+import threading
+import time
+from datetime import date, timedelta
+from email.utils import formatdate
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+# 模拟服务器上的时间段，与真实系统的编号一致
+SLOTS = {
+    1: {16: "10:30-12:00", 10: "12:00-13:30", 11: "13:30-15:00", 12: "15:00-16:30", 13: "16:30-18:00",
+        14: "18:00-19:30", 15: "19:30-21:00"},
+    2: {5: "09:30-11:00", 4: "12:00-14:00", 1: "14:30-16:00", 2: "16:30-18:00", 3: "18:30-20:30"},
+}
+ROOM_TITLES = {1: "健身房", 2: "游泳馆"}
+NOTICE = "本系统仅供在校师生使用，不得在体育场馆进行其他无关的活动。"
+SESSION_COOKIE = "SESSmock"
+TGC_COOKIE = "CASTGC"
+
+
+class MockConfig:
+    """
+    模拟服务器的行为配置
+
+    属性:
+        latency (float): 每个请求的固定延迟（秒）
+        jitter (float): 在固定延迟之上叠加的随机延迟上限（秒）
+        error_rate (float): 随机返回 503 的概率
+        full_slots (set): 已约满的时间段，元素为 (场馆编号, 时间段编号)
+        capacity (int): 每个时间段可预约的人数
+        clock_skew (float): 服务器时钟比本机快多少秒，体现在 Date 头里
+        opens_at (float): 预约开放的服务器时间戳，为 None 时始终开放
+        username (str): 允许登录的账号，为 None 时接受任意账号
+        password (str): 允许登录的密码
+        days (int): 总览页面显示未来多少天
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, full_slots=(), capacity=1, clock_skew=0.0,
+                 opens_at=None, username=None, password=None, days=7):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.full_slots = set(full_slots)
+        self.capacity = capacity
+        self.clock_skew = clock_skew
+        self.opens_at = opens_at
+        self.username = username
+        self.password = password
+        self.days = days
+
+
+class MockState:
+    """模拟服务器的会话、票据和预约记录"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.visitors = set()
+        self.sessions = {}  # 会话 ID -> 账号
+        self.tgcs = {}  # CAS 登录凭证 -> 账号
+        self.tickets = {}  # 一次性服务票据 -> 账号
+        self.forms = {}  # form_build_id -> (会话 ID, form_token)
+        self.bookings = {}  # (场馆, 日期, 时间段) -> [账号, ...]
+        self.flash = {}  # 会话 ID -> [(消息类型, 消息), ...]
+        self.request_log = []  # [(单调时间, 站点, 方法, 路径, 状态码), ...]
+        self.connections = 0  # 接受的 TCP 连接数，用于衡量长连接复用
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """按 Host 头区分场馆预约系统（127.0.0.1）和统一身份认证（localhost）"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockCgyy/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def date_time_string(self, timestamp=None):
+        return formatdate((timestamp or time.time()) + self.server.config.clock_skew, usegmt=True)
+
+    # ---- 请求分发 ----
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        config = self.server.config
+        self.parsed = urlparse(self.path)
+        self.query = parse_qs(self.parsed.query)
+        self.cookies = SimpleCookie(self.headers.get("Cookie", ""))
+        self.site = "ids" if self.headers.get("Host", "").startswith("localhost") else "cgyy"
+        self.form = {}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            self.form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+
+        time.sleep(config.latency + random.uniform(0, config.jitter))
+        self.status = 200
+        if method != "HEAD" and random.random() < config.error_rate:
+            self._send_html(503, "<h1>503 Service Unavailable</h1>", "503 Service Unavailable")
+        elif method == "HEAD":
+            self._send(200, b"", {})
+        elif self.site == "ids":
+            self._route_ids(method)
+        else:
+            self._route_cgyy(method)
+
+        with self.server.state.lock:
+            self.server.state.request_log.append((time.monotonic(), self.site, method, self.parsed.path, self.status))
+
+    def _route_ids(self, method):
+        if self.parsed.path != "/authserver/login":
+            self._send_html(404, "<h1>404 Not Found</h1>")
+        elif method == "POST":
+            self._cas_submit()
+        else:
+            self._cas_login_page()
+
+    def _route_cgyy(self, method):
+        parts = self.parsed.path.strip("/").split("/")
+        if self.parsed.path == "/":
+            self._home()
+        elif self.parsed.path == "/user/login" and method == "POST":
+            self._cgyy_login()
+        elif self.parsed.path == "/idcallback":
+            self._idcallback()
+        elif len(parts) == 2 and parts[0] == "room" and parts[1] in ("1", "2"):
+            self._room(int(parts[1]))
+        elif len(parts) == 5 and parts[0] == "room_apl" and parts[1] in ("1", "2") and parts[4] == "cg":
+            if method == "POST":
+                self._slot_submit(int(parts[1]), parts[2], int(parts[3]))
+            else:
+                self._slot_form(int(parts[1]), parts[2], int(parts[3]))
+        else:
+            self._send_html(404, "<h1>404 Not Found</h1>")
+
+    # ---- 响应工具 ----
+
+    def _send(self, status, body, headers):
+        self.status = status
+        self.send_response(status)
+        for name, value in headers.items():
+            if name == "Set-Cookie":
+                for cookie in value:
+                    self.send_header("Set-Cookie", cookie)
+            else:
+                self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_html(self, status, body, title="", set_cookies=(), conditional=False):
+        page = (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+                f"<link rel=\"stylesheet\" href=\"/style.css\"></head><body>{body}</body></html>").encode("utf-8")
+        headers = {"Content-Type": "text/html; charset=utf-8", "Set-Cookie": list(set_cookies)}
+        if conditional:
+            # 按页面内容生成 ETag，请求带着相同的 If-None-Match 时只返回 304
+            etag = f"\"{hashlib.sha1(page).hexdigest()[:16]}\""
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", {"ETag": etag})
+                return
+            headers["ETag"] = etag
+        self._send(status, page, headers)
+
+    def _redirect(self, location, set_cookies=()):
+        self._send(302, b"", {"Location": location, "Set-Cookie": list(set_cookies)})
+
+    def _cookie(self, name):
+        morsel = self.cookies.get(name)
+        return morsel.value if morsel else None
+
+    def _session(self):
+        session_id = self._cookie(SESSION_COOKIE)
+        with self.server.state.lock:
+            return session_id if session_id in self.server.state.sessions else None
+
+    def _require_session(self):
+        session_id = self._session()
+        if session_id is None:
+            service = quote(f"{self.server.cgyy_base_url}/idcallback", safe="")
+            self._redirect(f"{self.server.ids_base_url}/authserver/login?service={service}")
+        return session_id
+
+    def _messages(self, session_id):
+        with self.server.state.lock:
+            messages = self.server.state.flash.pop(session_id, [])
+        return "".join(f"<div class=\"messages {kind}\"><h2 class=\"element-invisible\">消息</h2>{html.escape(text)}</div>"
+                       for kind, text in messages)
+
+    # ---- 统一身份认证 ----
+
+    def _cas_login_page(self, error=""):
+        state = self.server.state
+        service = self.query.get("service", [""])[0]
+        with state.lock:
+            account = state.tgcs.get(self._cookie(TGC_COOKIE))
+        if account is not None and service:
+            self._issue_ticket(account, service)
+            return
+        if self.query.get("type", [""])[0] != "userNameLogin":
+            link = f"/authserver/login?type=userNameLogin&service={quote(service, safe='')}"
+            self._send_html(200, f"<div class=\"qr\"><img src=\"/qr.png\"></div>"
+                                 f"<a id=\"userNameLogin_a\" href=\"{html.escape(link)}\">账号登录</a>", "统一身份认证")
+            return
+        self._send_html(200, f"<span id=\"showErrorTip\">{html.escape(error)}</span>"
+                             f"<form id=\"pwdFromId\" method=\"post\" action=\"{html.escape(self.path)}\">"
+                             "<input id=\"username\" name=\"username\">"
+                             "<input id=\"password\" name=\"password\" type=\"password\">"
+                             "<button id=\"login_submit\" type=\"submit\">登录</button></form>", "统一身份认证")
+
+    def _cas_submit(self):
+        config = self.server.config
+        username, password = self.form.get("username", ""), self.form.get("password", "")
+        if not username or (config.username is not None and (username, password) != (config.username, config.password)):
+            self._cas_login_page("用户名或密码有误")
+            return
+        tgc = secrets.token_hex(8)
+        with self.server.state.lock:
+            self.server.state.tgcs[tgc] = username
+        service = self.query.get("service", [""])[0]
+        self._issue_ticket(username, service, [f"{TGC_COOKIE}={tgc}; Path=/authserver; HttpOnly"])
+
+    def _issue_ticket(self, account, service, set_cookies=()):
+        ticket = f"ST-{secrets.token_hex(6)}"
+        with self.server.state.lock:
+            self.server.state.tickets[ticket] = account
+        separator = "&" if "?" in service else "?"
+        self._redirect(f"{service}{separator}ticket={ticket}", set_cookies)
+
+    # ---- 场馆预约系统 ----
+
+    def _home(self):
+        visitor = self._cookie("visitor")
+        with self.server.state.lock:
+            visitor = visitor in self.server.state.visitors
+        if self._session() is not None or visitor:
+            self._send_html(200, f"<div id=\"block-block-1\"><p>{NOTICE}</p></div>", "场馆预约")
+            return
+        self._send_html(200, "<form id=\"form\" method=\"post\" action=\"/user/login\">"
+                             "<div><label>账号</label></div>"
+                             "<div><input id=\"user_name\" name=\"user_name\"></div>"
+                             "<div><div><input name=\"password\" type=\"password\"></div></div>"
+                             "<button id=\"login\" type=\"submit\">登录</button></form>", "场馆预约")
+
+    def _cgyy_login(self):
+        visitor = secrets.token_hex(8)
+        with self.server.state.lock:
+            self.server.state.visitors.add(visitor)
+        self._redirect("/", [f"visitor={visitor}; Path=/"])
+
+    def _idcallback(self):
+        ticket = self.query.get("ticket", [""])[0]
+        with self.server.state.lock:
+            account = self.server.state.tickets.pop(ticket, None)
+            if account is not None:
+                session_id = secrets.token_hex(12)
+                self.server.state.sessions[session_id] = account
+        if account is None:
+            self._send_html(403, "<h1>票据无效</h1>")
+            return
+        self._redirect("/", [f"{SESSION_COOKIE}={session_id}; Path=/; HttpOnly"])
+
+    def _slot_state(self, room, reserve_date, index, account):
+        """返回时间段状态：open / full / not_open / booked / missing"""
+        config = self.server.config
+        if index not in SLOTS[room]:
+            return "missing"
+        if config.opens_at is not None and time.time() + config.clock_skew < config.opens_at:
+            return "not_open"
+        with self.server.state.lock:
+            booked = self.server.state.bookings.get((room, reserve_date, index), [])
+        if account in booked:
+            return "booked"
+        if (room, index) in config.full_slots or len(booked) >= config.capacity:
+            return "full"
+        return "open"
+
+    def _room(self, room):
+        session_id = self._require_session()
+        if session_id is None:
+            return
+        account = self.server.state.sessions[session_id]
+        today = date.fromtimestamp(time.time() + self.server.config.clock_skew)
+        rows = []
+        for offset in range(self.server.config.days):
+            reserve_date = (today + timedelta(days=offset)).isoformat()
+            cells = []
+            for index, period in sorted(SLOTS[room].items(), key=lambda item: item[1]):
+                state = self._slot_state(room, reserve_date, index, account)
+                if state == "open":
+                    cells.append(f"<td>{period} <a href=\"/room_apl/{room}/{reserve_date}/{index}/cg\">预约</a></td>")
+                else:
+                    label = {"full": "已约满", "not_open": "未开放", "booked": "已预约"}[state]
+                    cells.append(f"<td>{period} {label}</td>")
+            rows.append(f"<tr><th>{reserve_date}</th>{''.join(cells)}</tr>")
+        self._send_html(200, f"{self._messages(session_id)}<h1 id=\"page-title\">{ROOM_TITLES[room]}</h1>"
+                             f"<table class=\"room-table\">{''.join(rows)}</table>", ROOM_TITLES[room],
+                        conditional=True)
+
+    def _slot_form(self, room, reserve_date, index, error=""):
+        session_id = self._require_session()
+        if session_id is None:
+            return
+        account = self.server.state.sessions[session_id]
+        state = self._slot_state(room, reserve_date, index, account)
+        title = f"{ROOM_TITLES[room]} {reserve_date} {SLOTS[room].get(index, '')}"
+        if error:
+            error = f"<div class=\"messages error\"><h2 class=\"element-invisible\">错误消息</h2>{html.escape(error)}</div>"
+        if state != "open":
+            message = {"full": ("error", "该时间段已约满。"), "not_open": ("warning", "该时间段尚未开放预约。"),
+                       "booked": ("status", "您已经预约了该时间段。"), "missing": ("error", "时间段不存在。")}[state]
+            self._send_html(200, f"{error}<div class=\"messages {message[0]}\">{message[1]}</div>"
+                                 f"<h1 id=\"page-title\">{title}</h1>", title)
+            return
+        form_build_id = f"form-{secrets.token_urlsafe(16)}"
+        form_token = secrets.token_urlsafe(16)
+        with self.server.state.lock:
+            self.server.state.forms[form_build_id] = (session_id, form_token)
+        self._send_html(200, f"{error}<h1 id=\"page-title\">{title}</h1>"
+                             f"<form action=\"{self.parsed.path}\" method=\"post\" id=\"room-apl-node-form\">"
+                             "<div class=\"form-item\"><label for=\"edit-field-tel-und-0-value\">电话</label>"
+                             "<input type=\"text\" id=\"edit-field-tel-und-0-value\" "
+                             "name=\"field_tel[und][0][value]\" value=\"\" size=\"12\"></div>"
+                             f"<input type=\"hidden\" name=\"form_build_id\" value=\"{form_build_id}\">"
+                             f"<input type=\"hidden\" name=\"form_token\" value=\"{form_token}\">"
+                             "<input type=\"hidden\" name=\"form_id\" value=\"room_apl_node_form\">"
+                             "<input type=\"submit\" id=\"edit-submit\" name=\"op\" value=\"保存\" class=\"form-submit\">"
+                             "</form>", title)
+
+    def _slot_submit(self, room, reserve_date, index):
+        session_id = self._require_session()
+        if session_id is None:
+            return
+        state = self.server.state
+        with state.lock:
+            form = state.forms.pop(self.form.get("form_build_id", ""), None)
+        if form != (session_id, self.form.get("form_token")):
+            self._slot_form(room, reserve_date, index, "表单已过期，请重新提交。")
+            return
+        if not self.form.get("field_tel[und][0][value]"):
+            self._slot_form(room, reserve_date, index, "电话字段是必填的。")
+            return
+        account = state.sessions[session_id]
+        with state.lock:
+            slot_state = self._slot_state(room, reserve_date, index, account)
+            if slot_state == "open":
+                state.bookings.setdefault((room, reserve_date, index), []).append(account)
+                state.flash.setdefault(session_id, []).append(("status", "预约成功。"))
+        if slot_state != "open":
+            reason = {"full": "该时间段已约满。", "not_open": "该时间段尚未开放预约。",
+                      "booked": "您已经预约了该时间段，不能重复预约。", "missing": "时间段不存在。"}[slot_state]
+            self._send_html(200, f"<div class=\"messages error\"><h2 class=\"element-invisible\">错误消息</h2>{reason}</div>"
+                                 "<h1 id=\"page-title\">预约失败</h1>", "预约失败")
+            return
+        self._redirect(f"/room/{room}")
+
+
+class MockServer:
+    """
+    场馆预约系统和统一身份认证的本地模拟服务器
+
+    同一个端口上，127.0.0.1 作为 cgyy.xmu.edu.cn，localhost 作为 ids.xmu.edu.cn，
+    两个主机名的 Cookie 互相独立，和真实环境一致。
+
+    属性:
+        config (MockConfig): 行为配置，运行中可以直接修改
+        state (MockState): 会话和预约记录
+    """
+
+    def __init__(self, config=None, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or MockConfig()
+        self.httpd.state = MockState()
+        self.httpd.cgyy_base_url = self.cgyy_base_url
+        self.httpd.ids_base_url = self.ids_base_url
+        self.thread = None
+
+    @property
+    def config(self):
+        return self.httpd.config
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    @property
+    def cgyy_base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def ids_base_url(self):
+        return f"http://localhost:{self.port}"
+
+    def start(self):
+        """在后台线程中启动服务器"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        """清空所有会话、预约记录和请求日志"""
+        self.httpd.state = MockState()
+
+    def create_session(self, account="mock-user"):
+        """
+        跳过登录流程直接创建一个场馆预约系统会话，用于只测试预约阶段
+
+        返回:
+            dict: 可以直接交给 HTTP 客户端的会话 Cookie
+        """
+        session_id = secrets.token_hex(12)
+        with self.state.lock:
+            self.state.sessions[session_id] = account
+        return {"name": SESSION_COOKIE, "value": session_id, "domain": "127.0.0.1", "path": "/"}
+
+    def requests(self):
+        """返回请求日志的副本"""
+        with self.state.lock:
+            return list(self.state.request_log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="场馆预约系统本地模拟服务器")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--full", nargs="*", default=[], help="已约满的时间段，格式为 场馆:编号，例如 1:14")
+    parser.add_argument("--clock-skew", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        full_slots={tuple(int(part) for part in item.split(":")) for item in args.full},
+                        clock_skew=args.clock_skew)
+    server = MockServer(config, args.port)
+    print(f"GYM_CGYY_BASE_URL={server.cgyy_base_url}")
+    print(f"GYM_IDS_BASE_URL={server.ids_base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+from collections import namedtuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from http_submit import PHONE_FIELD_ID, SUBMIT_BUTTON_ID
+from retry_policy import ERROR_TITLE_PATTERN
+from urls import ids_host
+
+# 页面状态
+FORM_OPEN = "form_open"  # 预约表单可以填写
+FULL = "full"  # 时间段已约满
+NOT_OPEN = "not_open"  # 时间段尚未开放
+BOOKED = "booked"  # 已经预约了该时间段
+LOGGED_OUT = "logged_out"  # 被重定向到登录页面，会话已失效
+ERROR_PAGE = "error"  # 429/5xx 错误页
+UNAVAILABLE = "unavailable"  # 页面已加载，但既没有表单也没有能识别的提示
+
+# 提交结果
+CONFIRMED = "confirmed"  # 服务器接受了预约
+REJECTED = "rejected"  # 服务器拒绝了预约，例如重复预约、表单过期、字段校验失败
+UNKNOWN = "unknown"  # 超时或页面无法识别，需要重新打开预约表单核对
+
+# 点击提交后等待结果页面的超时时间（秒）
+VERIFY_TIMEOUT = 5
+
+# 提示消息中的关键字 -> 页面状态，按顺序匹配
+MESSAGE_RULES = [
+    (BOOKED, ("已经预约", "已预约", "不能重复预约")),
+    (FULL, ("约满", "已满", "名额不足")),
+    (NOT_OPEN, ("未开放", "尚未开放", "不在预约时间", "还未到")),
+]
+
+# 页面分类结果；status 为错误页的状态码，message 为页面上的提示消息
+PageState = namedtuple("PageState", ["state", "message", "status"])
+
+# 提交结果；reason 为服务器的提示消息或无法确认的原因
+SubmitResult = namedtuple("SubmitResult", ["outcome", "reason"])
+
+# 一次 JS 调用读取分类需要的全部信息，页面还在加载时返回 null
+CLASSIFY_SCRIPT = """
+const [casHost, phoneId, submitId] = arguments;
+if (location.hostname === casHost) return {kind: 'cas'};
+const text = selector => Array.from(document.querySelectorAll(selector), e => {
+    // 去掉 Drupal 给读屏软件准备的隐藏标题，例如 "错误消息"
+    const copy = e.cloneNode(true);
+    copy.querySelectorAll('.element-invisible').forEach(hidden => hidden.remove());
+    return copy.textContent.trim();
+}).join(' ');
+return {
+    kind: 'cgyy',
+    title: document.title,
+    form: !!(document.getElementById(phoneId) && document.getElementById(submitId)),
+    login: !!document.querySelector('#user_name, #username'),
+    messages: text('div.messages'),
+    errors: text('div.messages.error'),
+    notices: text('div.messages.status'),
+    loaded: !!document.getElementById('page-title') || document.readyState === 'complete'
+};
+"""
+
+# 点击提交前在旧页面上留下的标记，结果页面加载后标记随旧页面消失
+SUBMIT_PENDING_SCRIPT = "window.__gymSubmitPending = true;"
+VERIFY_SCRIPT = "if (window.__gymSubmitPending) return null;" + CLASSIFY_SCRIPT
+
+
+def classify_message(message):
+    """根据提示消息判断时间段状态，无法识别时返回 UNAVAILABLE"""
+    for state, keywords in MESSAGE_RULES:
+        if any(keyword in message for keyword in keywords):
+            return state
+    return UNAVAILABLE
+
+
+def classify_facts(facts):
+    """把 CLASSIFY_SCRIPT 读取到的信息转换为 PageState，页面还在加载时返回 None"""
+    if facts is None:
+        return None
+    if facts["kind"] == "cas":
+        return PageState(LOGGED_OUT, "", None)
+    match = ERROR_TITLE_PATTERN.match(facts["title"] or "")
+    if match:
+        return PageState(ERROR_PAGE, facts["title"], int(match.group(1)))
+    if facts["form"]:
+        return PageState(FORM_OPEN, facts["messages"], None)
+    if facts["login"]:
+        return PageState(LOGGED_OUT, "", None)
+    if facts["messages"]:
+        return PageState(classify_message(facts["messages"]), facts["messages"], None)
+    if facts["loaded"]:
+        return PageState(UNAVAILABLE, "", None)
+    return None
+
+
+def classify_submit(facts):
+    """
+    把提交后结果页面的信息转换为 SubmitResult，页面还在加载时返回 None
+
+    Drupal 保存成功后跳转到其他页面并显示 status 消息；校验失败、重复预约等情况重新显示表单或
+    失败页面，并带有 error 消息。被重定向到登录页面或遇到错误页时无法判断预约是否已经保存，记为 UNKNOWN。
+    """
+    if facts is None:
+        return None
+    if facts["kind"] == "cas":
+        return SubmitResult(UNKNOWN, "提交后被重定向到统一身份认证")
+    if ERROR_TITLE_PATTERN.match(facts["title"] or ""):
+        return SubmitResult(UNKNOWN, facts["title"])
+    if facts["errors"]:
+        return SubmitResult(REJECTED, facts["errors"])
+    if facts["notices"]:
+        return SubmitResult(CONFIRMED, facts["notices"])
+    if facts["form"]:
+        return SubmitResult(REJECTED, facts["messages"] or "提交后仍停留在预约表单")
+    if facts["loaded"]:
+        return SubmitResult(UNKNOWN, facts["messages"] or "结果页面上没有提示消息")
+    return None
+
+
+def recheck_submit(result, state):
+    """
+    提交结果为 UNKNOWN 时，根据重新打开的预约表单页面判断：页面显示已经预约了该时间段才算成功
+
+    参数:
+        result (SubmitResult): 原来的提交结果
+        state (PageState): 重新打开的预约表单页面的状态
+
+    返回:
+        SubmitResult: CONFIRMED 或 REJECTED
+    """
+    if state.state == BOOKED:
+        return SubmitResult(CONFIRMED, state.message)
+    return SubmitResult(REJECTED, state.message or result.reason)
+
+
+
+def classify_html(html, url):
+    """
+    按与 pages.classify() 相同的规则判断一个已下载页面的状态，用于 HTTP 请求和离线测试
+
+    参数:
+        html (str): 页面 HTML
+        url (str): 页面的最终地址
+
+    返回:
+        PageState: 页面状态
+    """
+    return classify_facts(html_facts(html, url))
+
+
+def html_facts(html, url):
+    """从已下载的页面读取与 CLASSIFY_SCRIPT 相同的信息"""
+    if urlparse(url).hostname == ids_host():
+        return {"kind": "cas"}
+    soup = BeautifulSoup(html, "html.parser")
+    for hidden in soup.select("div.messages .element-invisible"):
+        hidden.decompose()
+
+    def text(selector):
+        return " ".join(element.get_text().strip() for element in soup.select(selector))
+
+    return {
+        "kind": "cgyy",
+        "title": soup.title.get_text() if soup.title is not None else "",
+        "form": soup.find(id=PHONE_FIELD_ID) is not None and soup.find(id=SUBMIT_BUTTON_ID) is not None,
+        "login": soup.select_one("#user_name, #username") is not None,
+        "messages": text("div.messages"),
+        "errors": text("div.messages.error"),
+        "notices": text("div.messages.status"),
+        "loaded": True,
+    }
+
+
+def redirect_target(status, location, url):
+    """
+    提交响应是跳转到场馆预约系统内页面的重定向时返回跳转后的绝对地址，否则返回 None
+
+    提交方用它判断是否需要再请求一次跳转后的页面，结果交给 verify_submit_response。
+    """
+    if status not in (301, 302, 303) or not location:
+        return None
+    target = urljoin(url, location)
+    return None if urlparse(target).hostname == ids_host() else target
+
+
+def verify_submit_response(status, location, html, url, target_html=None):
+    """
+    根据 HTTP 提交的响应判断结果
+
+    表单提交时不自动跟随重定向。Drupal 保存成功后会跳转，但校验失败时也可能跳转回表单并显示错误消息，
+    所以跳转本身不能说明预约成功：按跳转后页面上的提示消息判断，跳转回预约表单的不算成功；
+    没有读到跳转后的页面时记为 UNKNOWN，由调用方重新打开表单核对。返回 200 时解析页面上的提示消息。
+
+    参数:
+        status (int): 响应状态码
+        location (str): 重定向地址
+        html (str): 响应内容
+        url (str): 提交地址
+        target_html (str): 跳转后页面的内容，见 redirect_target；为 None 表示没有读到
+
+    返回:
+        SubmitResult: 提交结果
+    """
+    if status in (301, 302, 303):
+        target = urljoin(url, location)
+        if urlparse(target).hostname == ids_host():
+            return classify_submit({"kind": "cas"})
+        path = urlparse(target).path or target
+        if target_html is None:
+            return SubmitResult(UNKNOWN, f"提交后跳转到 {path}，没有读到跳转后的页面")
+        result = classify_submit(html_facts(target_html, target))
+        if path == urlparse(url).path and (result is None or result.outcome == CONFIRMED):
+            return SubmitResult(UNKNOWN, f"提交后跳转回预约表单: {result.reason if result else path}")
+        return result or SubmitResult(UNKNOWN, f"提交后跳转到 {path}")
+    return classify_submit(html_facts(html, url)) or SubmitResult(UNKNOWN, f"状态码 {status}")
@@ -0,0 +1,175 @@
+import time
+
+from selenium.common.exceptions import NoSuchWindowException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+import interaction
+from http_submit import PHONE_FIELD_ID, SUBMIT_BUTTON_ID
+from interaction import fill_fields, wait_for
+from page_state import (CLASSIFY_SCRIPT, SUBMIT_PENDING_SCRIPT, UNKNOWN, VERIFY_SCRIPT, VERIFY_TIMEOUT, SubmitResult,
+                        classify_facts, classify_submit)
+from retry_policy import interruptible_sleep
+from urls import ids_host
+
+
+def classify(driver):
+    """
+    用一次 DOM 查询判断当前页面的状态
+
+    返回:
+        PageState: 页面状态，页面还在加载时返回 None
+    """
+    return classify_facts(driver.execute_script(CLASSIFY_SCRIPT, ids_host(), PHONE_FIELD_ID, SUBMIT_BUTTON_ID))
+
+
+class HomePage:
+    """场馆预约系统首页：未登录时显示登录表单，登录后显示使用须知"""
+
+    NOTICE = (By.CSS_SELECTOR, "#block-block-1 p")
+    USERNAME = (By.ID, "user_name")
+    PASSWORD = (By.CSS_SELECTOR, "#form input[type='password']")
+    LOGIN_BUTTON = (By.ID, "login")
+    NOTICE_TEXT = "本系统仅供在校师生使用，不得在体育场馆进行其他无关的活动。"
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def logged_in(self):
+        """返回可以直接用于等待的条件：出现使用须知时为 True"""
+        return EC.text_to_be_present_in_element(self.NOTICE, self.NOTICE_TEXT)
+
+    def wait_ready(self, timeout):
+        """
+        等待首页加载
+
+        返回:
+            WebElement | bool: 未登录时返回账号输入框，已登录时返回 True
+        """
+        return wait_for(self.driver, EC.any_of(self.logged_in(), EC.presence_of_element_located(self.USERNAME)),
+                        timeout)
+
+    def login(self, username_input, username, password, timeout):
+        """填写账号密码并登录，等待出现使用须知"""
+        password_input = self.driver.find_element(*self.PASSWORD)
+        fill_fields(self.driver, [(username_input, username), (password_input, password)])
+        wait_for(self.driver, EC.element_to_be_clickable(self.LOGIN_BUTTON), timeout).click()
+        wait_for(self.driver, self.logged_in(), timeout)
+
+
+class CasLoginPage:
+    """统一身份认证登录页面"""
+
+    WEIXIN_TAB = (By.ID, "userNameLogin_a")
+    USERNAME = (By.ID, "username")
+    PASSWORD = (By.ID, "password")
+    SUBMIT = (By.ID, "login_submit")
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def login(self, username, password, timeout=10):
+        """等待登录表单出现，填写账号密码并提交"""
+        username_field = wait_for(self.driver, EC.presence_of_element_located(self.USERNAME), timeout)
+        password_field = self.driver.find_element(*self.PASSWORD)
+        fill_fields(self.driver, [(username_field, username), (password_field, password)])
+        wait_for(self.driver, EC.element_to_be_clickable(self.SUBMIT), timeout).click()
+
+
+class RoomPage:
+    """预约总览页面"""
+
+    TITLE = (By.ID, "page-title")
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def is_loaded(self):
+        return bool(self.driver.find_elements(*self.TITLE))
+
+
+class SlotFormPage:
+    """
+    时间段预约表单页面（room_apl）
+
+    表单可以填写时直接提交；约满、未开放、已预约、会话失效和错误页都由 classify() 一次识别，
+    不再依靠 find_element 抛出异常来判断。
+    """
+
+    PHONE = (By.ID, PHONE_FIELD_ID)
+    SUBMIT = (By.ID, SUBMIT_BUTTON_ID)
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def classify(self):
+        return classify(self.driver)
+
+    def wait_state(self, timeout=30, poll_frequency=None):
+        """
+        等待页面加载到可以判断状态
+
+        返回:
+            PageState: 页面状态
+
+        异常:
+            TimeoutException: 超时仍无法判断
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.classify()
+            if state is not None:
+                return state
+            if time.monotonic() >= deadline:
+                raise TimeoutException("等待预约表单页面加载超时")
+            interruptible_sleep(poll_frequency or interaction.POLL_FREQUENCY)
+
+    def fill_and_submit(self, phone_number, timer, before_send=None):
+        """
+        填写电话号码并提交
+
+        参数:
+            phone_number (str): 电话号码
+            timer (StepTimer): 分步计时器
+            before_send (callable): 点击提交按钮前调用，例如 Trigger.mark_submit
+
+        异常:
+            NoSuchElementException: 页面上没有预约表单
+        """
+        with timer.step("查找预约表单"):
+            input_element = self.driver.find_element(*self.PHONE)
+            submit_button = self.driver.find_element(*self.SUBMIT)
+
+        # 直接写入电话号码，覆盖可能存在的旧值
+        with timer.step("填写电话号码", removed_sleep=0.5):
+            fill_fields(self.driver, [(input_element, phone_number)])
+
+        with timer.step("点击提交"):
+            self.driver.execute_script(SUBMIT_PENDING_SCRIPT)
+            if before_send is not None:
+                before_send()
+            submit_button.click()
+
+    def verify_submit(self, timeout=VERIFY_TIMEOUT, poll_frequency=None):
+        """
+        等待提交后的结果页面，读取 Drupal 的 status/error 消息
+
+        返回:
+            SubmitResult: 提交结果，超时返回 UNKNOWN
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                result = classify_submit(self.driver.execute_script(VERIFY_SCRIPT, ids_host(), PHONE_FIELD_ID,
+                                                                    SUBMIT_BUTTON_ID))
+            except NoSuchWindowException:
+                raise
+            except WebDriverException:
+                # 页面正在跳转
+                result = None
+            if result is not None:
+                return result
+            if time.monotonic() >= deadline:
+                return SubmitResult(UNKNOWN, "等待提交结果超时")
+            interruptible_sleep(poll_frequency or interaction.POLL_FREQUENCY)
+
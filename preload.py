@@ -0,0 +1,148 @@
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from http_submit import PHONE_FIELD_ID, SUBMIT_BUTTON_ID
+from interaction import wait_for
+from page_state import CLASSIFY_SCRIPT, LOGGED_OUT, classify_facts
+from pages import SlotFormPage
+from retry_policy import GOVERNOR, AuthExpiredError
+from urls import ids_host, slot_form_url
+
+# GUI 中最多选择一个主要时间段和三个备选时间段
+MAX_TABS = 4
+
+# 页面导航耗时（毫秒），加载未完成时返回 null
+NAVIGATION_DURATION_SCRIPT = """
+const entry = performance.getEntriesByType('navigation')[0];
+return entry && entry.loadEventEnd > 0 ? entry.loadEventEnd - entry.startTime : null;
+"""
+
+# 判断标签页的状态，刷新前留下的旧页面返回 null，其余与 pages.classify 相同
+PAGE_STATE_SCRIPT = "if (window.__gymPreloadStale) return null;" + CLASSIFY_SCRIPT
+
+
+class TabPreloader:
+    """
+    在同一个已登录浏览器的多个标签页中预先打开各个时间段的预约表单
+
+    打开标签页时只用 JS 修改地址，不等待页面加载，所有表单页面并行加载；
+    到达开放时间后按优先顺序切换标签页直接填写提交，已经有表单的标签页在关键路径上不再有页面加载。
+    开放前打开的页面可能还没有表单，轮到这个时间段时才刷新它的标签页，刷新和其他请求一样经过 GOVERNOR 节流；
+    这种情况下预加载只省去了新建标签页的时间，页面加载仍在关键路径上。
+
+    属性:
+        driver: 已登录的浏览器驱动
+        tabs (dict): 时间段编号 -> 标签页句柄，按优先顺序排列
+        load_times (dict): 时间段编号 -> 最近一次页面加载耗时（秒）
+    """
+
+    def __init__(self, driver, room, reserve_date, slots):
+        self.driver = driver
+        self.room = room
+        self.reserve_date = reserve_date
+        self.slots = list(slots)[:MAX_TABS]
+        self.main_handle = None
+        self.tabs = {}
+        self.load_times = {}
+
+    def open(self):
+        """为每个时间段打开一个标签页并开始加载，随后切回原来的标签页"""
+        self.main_handle = self.driver.current_window_handle
+        for slot in self.slots:
+            self.driver.switch_to.new_window("tab")
+            self.driver.execute_script("window.location.href = arguments[0];",
+                                       slot_form_url(self.room, self.reserve_date, slot))
+            self.tabs[slot] = self.driver.current_window_handle
+        self.driver.switch_to.window(self.main_handle)
+        print(f"已在 {len(self.tabs)} 个标签页中预加载时间段 {list(self.tabs)}")
+
+    def has_form(self, slot):
+        """切换到时间段的标签页，返回页面上是否已有预约表单"""
+        self.driver.switch_to.window(self.tabs[slot])
+        return bool(self.driver.find_elements(*SlotFormPage.PHONE))
+
+    def refresh_if_missing(self, slot):
+        """
+        即将在时间段的标签页中提交时，页面上还没有表单（例如开放前打开的页面）则刷新这个标签页
+
+        只刷新即将提交的标签页，排在后面的时间段等轮到时再判断，开放时刻不会同时发出多个页面请求。
+
+        返回:
+            bool: 是否刷新了标签页
+        """
+        try:
+            if self.has_form(slot):
+                return False
+            GOVERNOR.before_request()
+            self.driver.execute_script("window.__gymPreloadStale = true; window.location.reload();")
+        except WebDriverException:
+            # 页面仍在加载，等待时再判断
+            return False
+        self.load_times.pop(slot, None)
+        print(f"标签页 {slot} 中还没有预约表单，已刷新")
+        return True
+
+    def activate(self, slot, timeout=10):
+        """
+        切换到时间段的标签页，等待页面加载到可以判断状态
+
+        参数:
+            slot (int): 时间段编号
+            timeout (float): 等待页面加载的超时时间（秒）
+
+        返回:
+            PageState: 页面状态，超时仍无法判断时返回 None
+        """
+        self.driver.switch_to.window(self.tabs[slot])
+        try:
+            state = wait_for(self.driver, lambda driver: classify_facts(
+                driver.execute_script(PAGE_STATE_SCRIPT, ids_host(), PHONE_FIELD_ID, SUBMIT_BUTTON_ID)), timeout)
+        except TimeoutException:
+            return None
+        if state.state == LOGGED_OUT:
+            raise AuthExpiredError("预加载的时间段页面被重定向到统一身份认证，登录会话已失效")
+        if slot not in self.load_times:
+            duration = self.driver.execute_script(NAVIGATION_DURATION_SCRIPT)
+            if duration is not None:
+                self.load_times[slot] = duration / 1000
+        return state
+
+    def close(self, keep=None):
+        """
+        关闭预加载的标签页
+
+        参数:
+            keep (int): 保留这个时间段的标签页并切换过去，例如刚提交过的页面
+        """
+        for slot, handle in self.tabs.items():
+            if slot == keep:
+                continue
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except WebDriverException:
+                pass
+        target = self.tabs.get(keep, self.main_handle)
+        self.tabs = {}
+        try:
+            self.driver.switch_to.window(target)
+        except WebDriverException:
+            pass
+
+
+def report_saving(elapsed, waited, tried, load_times):
+    """
+    估算预加载相对于逐个加载页面节省的时间
+
+    参数:
+        elapsed (float): 开放后到点击提交的实际耗时（秒）
+        waited (float): 其中等待标签页加载的时间（秒）
+        tried (list): 依次尝试过的时间段编号
+        load_times (dict): 时间段编号 -> 页面加载耗时（秒）
+
+    返回:
+        tuple: (逐个加载的预计耗时, 节省的秒数)；缺少加载耗时时返回 (None, None)
+    """
+    if any(slot not in load_times for slot in tried):
+        return None, None
+    sequential = elapsed - waited + sum(load_times[slot] for slot in tried)
+    return sequential, sequential - elapsed
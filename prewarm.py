@@ -0,0 +1,201 @@
+import socket
+import ssl
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 预先解析的域名在这么多秒内直接使用缓存的地址
+DNS_TTL = 300
+
+# 在浏览器中发一个不等待结果的 HEAD 请求，让浏览器为该站点建立并保持一条连接
+WARM_SCRIPT = """
+fetch(arguments[0], {method: 'HEAD', credentials: 'include', cache: 'no-store'}).catch(() => {});
+"""
+
+# 当前页面导航的 DNS、TCP、TLS 耗时（毫秒），复用连接时都为 0
+NAVIGATION_TIMING_SCRIPT = """
+const entry = performance.getEntriesByType('navigation')[0];
+if (!entry) return null;
+return {
+    dns: entry.domainLookupEnd - entry.domainLookupStart,
+    tcp: (entry.secureConnectionStart || entry.connectEnd) - entry.connectStart,
+    tls: entry.secureConnectionStart ? entry.connectEnd - entry.secureConnectionStart : 0
+};
+"""
+
+# 一次新连接的开销（秒），tls 为 None 表示 http 站点
+HandshakeCost = namedtuple("HandshakeCost", ["host", "dns", "tcp", "tls"])
+
+_original_getaddrinfo = socket.getaddrinfo
+_dns_cache = {}  # 主机名 -> (getaddrinfo 结果, 过期的单调时间)，只包含 resolve() 解析过的预约站点
+_dns_users = 0  # 正在使用缓存的预约数，界面线程和预约队列可能同时运行
+_dns_lock = threading.Lock()
+
+
+def _cached_getaddrinfo(host, port, family=0, type_=0, proto=0, flags=0):
+    """先查预先解析的地址，只处理 TCP 连接的常见调用，其他主机和过期的地址交给系统解析"""
+    entry = _dns_cache.get(host)
+    if entry is not None and entry[1] < time.monotonic():
+        _dns_cache.pop(host, None)
+        entry = None
+    if entry is None or type_ not in (0, socket.SOCK_STREAM) or proto or flags:
+        return _original_getaddrinfo(host, port, family, type_, proto, flags)
+    try:
+        port = int(port or 0)
+    except (TypeError, ValueError):
+        return _original_getaddrinfo(host, port, family, type_, proto, flags)
+    return [(info_family, info_type, info_proto, canonname, (sockaddr[0], port) + tuple(sockaddr[2:]))
+            for info_family, info_type, info_proto, canonname, sockaddr in entry[0]
+            if family in (0, info_family)]
+
+
+def install_dns_cache():
+    """
+    让本进程中的 HTTP 客户端（urllib3、http.client、asyncio）使用预先解析的地址
+
+    每次调用都要对应一次 uninstall_dns_cache()，最好用 dns_cache()。
+    """
+    global _dns_users
+    with _dns_lock:
+        if _dns_users == 0:
+            socket.getaddrinfo = _cached_getaddrinfo
+        _dns_users += 1
+
+
+def uninstall_dns_cache():
+    """最后一个使用者退出时恢复系统的 getaddrinfo 并清空缓存"""
+    global _dns_users
+    with _dns_lock:
+        _dns_users = max(0, _dns_users - 1)
+        if _dns_users == 0:
+            socket.getaddrinfo = _original_getaddrinfo
+            _dns_cache.clear()
+
+
+@contextmanager
+def dns_cache():
+    """只在一次预约期间使用预先解析的地址，界面和守护进程中的其他代码不受影响"""
+    install_dns_cache()
+    try:
+        yield
+    finally:
+        uninstall_dns_cache()
+
+
+def resolve(host, port=443):
+    """
+    解析域名并缓存结果
+
+    返回:
+        tuple: (getaddrinfo 结果, 解析耗时秒数)
+    """
+    start = time.monotonic()
+    infos = _original_getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    elapsed = time.monotonic() - start
+    _dns_cache[host] = (infos, time.monotonic() + DNS_TTL)
+    return infos, elapsed
+
+
+def measure_handshake(url, timeout=5):
+    """
+    测量访问一个站点时新建连接的开销：DNS 解析、TCP 握手和 TLS 握手
+
+    参数:
+        url (str): 站点地址
+        timeout (float): 连接超时时间（秒）
+
+    返回:
+        HandshakeCost: 各部分耗时（秒）
+    """
+    parsed = urlparse(url)
+    https = parsed.scheme == "https"
+    port = parsed.port or (443 if https else 80)
+    infos, dns = resolve(parsed.hostname, port)
+    family, sock_type, proto, _, sockaddr = infos[0]
+
+    sock = socket.socket(family, sock_type, proto)
+    try:
+        sock.settimeout(timeout)
+        start = time.monotonic()
+        sock.connect(sockaddr)
+        tcp = time.monotonic() - start
+        tls = None
+        if https:
+            start = time.monotonic()
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+            tls = time.monotonic() - start
+    finally:
+        sock.close()
+    return HandshakeCost(parsed.hostname, dns, tcp, tls)
+
+
+def warm_connections(url, submitter=None, driver=None):
+    """
+    让浏览器和 HTTP 客户端各自建立或刷新一条到站点的长连接
+
+    参数:
+        url (str): 站点地址，通常是首页
+        submitter (HttpSubmitter): 需要预热的 HTTP 客户端
+        driver: 需要预热的浏览器驱动，请求在后台发出，不等待结果
+    """
+    if submitter is not None:
+        try:
+            submitter.warm(url)
+        except Exception as e:
+            print(f"预热 HTTP 连接失败: {e}")
+    if driver is not None:
+        # 延迟导入，只用 HTTP 客户端时不必加载 Selenium
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            driver.execute_script(WARM_SCRIPT, url)
+        except WebDriverException as e:
+            print(f"预热浏览器连接失败: {e}")
+
+
+def preflight(site_urls, submitter=None, driver=None):
+    """
+    预约开放前的预热：解析并缓存 DNS，测量新建连接的开销，再预热浏览器和 HTTP 客户端的长连接
+
+    缓存的地址只在调用方的 dns_cache() 范围内生效。
+
+    参数:
+        site_urls (list): 需要预热的站点地址，第一个用于预热长连接
+        submitter (HttpSubmitter): 需要预热的 HTTP 客户端
+        driver: 需要预热的浏览器驱动
+
+    返回:
+        list: 各站点的 HandshakeCost
+    """
+    costs = []
+    for url in site_urls:
+        try:
+            cost = measure_handshake(url)
+        except OSError as e:
+            print(f"预热 {urlparse(url).hostname} 失败: {e}")
+            continue
+        costs.append(cost)
+        tls = f"，TLS 握手 {cost.tls * 1000:.0f} 毫秒" if cost.tls is not None else ""
+        print(f"{cost.host}: DNS 解析 {cost.dns * 1000:.0f} 毫秒，TCP 握手 {cost.tcp * 1000:.0f} 毫秒{tls}")
+    warm_connections(site_urls[0], submitter, driver)
+    return costs
+
+
+def navigation_timing(driver):
+    """
+    当前页面导航时建立连接的耗时
+
+    返回:
+        dict: {"dns": 秒, "tcp": 秒, "tls": 秒}，浏览器不支持时返回 None
+    """
+    from selenium.common.exceptions import WebDriverException
+
+    try:
+        timing = driver.execute_script(NAVIGATION_TIMING_SCRIPT)
+    except WebDriverException:
+        return None
+    if timing is None:
+        return None
+    return {name: max(0.0, value) / 1000 for name, value in timing.items()}
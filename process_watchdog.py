@@ -0,0 +1,315 @@
+import atexit
+import glob
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+
+import psutil
+
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".gym_reserve")
+
+# 整个浏览器进程树（驱动、浏览器主进程和渲染进程）的常驻内存上限
+RSS_CEILING = 1536 * 2 ** 20
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 5
+
+# 驱动退出后等待浏览器进程自行结束的秒数，超时后强制结束
+QUIT_GRACE = 3
+
+_instances = itertools.count()
+
+
+def process_tree(pid):
+    """进程及其所有子进程，进程不存在时返回空列表"""
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def process_tree_rss(pid):
+    """统计进程及其所有子进程的常驻内存（字节）"""
+    total = 0
+    for process in process_tree(pid):
+        try:
+            total += process.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+def _same_process(pid, create_time):
+    """pid 仍然是当初记录的那个进程（没有被系统复用给其他进程）"""
+    try:
+        return psutil.Process(pid).create_time() == create_time
+    except psutil.NoSuchProcess:
+        return False
+
+
+def _kill(processes):
+    """强制结束进程，返回实际结束的数量"""
+    killed = 0
+    for process in processes:
+        try:
+            process.kill()
+            killed += 1
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.AccessDenied as e:
+            print(f"无法结束进程 {process.pid}: {e}")
+    psutil.wait_procs(processes, timeout=QUIT_GRACE)
+    return killed
+
+
+def reap_stale(directory=STATE_DIR):
+    """
+    结束之前异常退出（例如被强制结束）的进程遗留的浏览器进程
+
+    每个看门狗把自己启动的浏览器进程记录在 browser-pids-<进程号>-<序号>.json 中，
+    记录者已经退出而其中的进程还活着，说明它们是孤儿进程。
+
+    返回:
+        int: 结束的进程数
+    """
+    killed = 0
+    for path in glob.glob(os.path.join(directory, "browser-pids-*.json")):
+        try:
+            owner = int(os.path.basename(path).split("-")[2])
+        except (IndexError, ValueError):
+            continue
+        if psutil.pid_exists(owner):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            recorded = []
+        orphans = []
+        for pid, create_time in recorded:
+            if _same_process(pid, create_time):
+                orphans.append(psutil.Process(pid))
+        if orphans:
+            killed += _kill(orphans)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if killed:
+        print(f"结束了之前遗留的 {killed} 个浏览器进程")
+    return killed
+
+
+class ProcessWatchdog:
+    """
+    浏览器进程看门狗
+
+    记录本工具启动的每个浏览器进程树（驱动进程及其所有子进程），后台定期采样进程数和常驻内存：
+    驱动退出后仍未结束的进程、quit() 失败或程序退出时遗留的进程都会被强制结束；
+    进程树内存超过上限时由 DriverPool 在两次尝试之间重建浏览器。
+    采样结果写入指标文件（JSON Lines），长时间运行时可以观察内存变化。
+
+    属性:
+        rss_ceiling (int): 单个浏览器进程树的常驻内存上限（字节），为 None 时不限制
+        interval (float): 采样间隔（秒）
+        metrics_path (str): 指标文件路径，为 None 时只在内存中记录
+        peak_rss (int): 所有浏览器进程的内存峰值（字节）
+        peak_processes (int): 浏览器进程数的峰值
+        recycles (int): 因内存超限重建浏览器的次数
+        reaped (int): 强制结束的遗留进程数
+    """
+
+    def __init__(self, rss_ceiling=RSS_CEILING, interval=SAMPLE_INTERVAL, metrics_path=None,
+                 state_dir=STATE_DIR):
+        self.rss_ceiling = rss_ceiling
+        self.interval = interval
+        self.metrics_path = metrics_path
+        self.peak_rss = 0
+        self.peak_processes = 0
+        self.recycles = 0
+        self.reaped = 0
+        self._pid_file = os.path.join(state_dir, f"browser-pids-{os.getpid()}-{next(_instances)}.json")
+        self._trees = {}  # 驱动进程号 -> {进程号: psutil.Process}，包括已经脱离父进程的子进程
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """清理之前遗留的进程，开始后台采样；程序退出时自动结束所有浏览器进程"""
+        reap_stale(os.path.dirname(self._pid_file))
+        atexit.register(self.close)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="process-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"浏览器进程采样失败: {e}")
+
+    @staticmethod
+    def _root_pid(driver):
+        process = getattr(getattr(driver, "service", None), "process", None)
+        return process.pid if process is not None else None
+
+    def track(self, driver):
+        """开始跟踪一个新启动的驱动的进程树"""
+        pid = self._root_pid(driver)
+        if pid is None:
+            return
+        with self._lock:
+            self._trees[pid] = {process.pid: process for process in process_tree(pid)}
+        self._save_pids()
+
+    def _refresh(self, pid):
+        """把进程树中新出现的子进程加入记录，返回仍然存活的进程"""
+        known = self._trees[pid]
+        for process in process_tree(pid):
+            known.setdefault(process.pid, process)
+        alive = []
+        for child_pid, process in list(known.items()):
+            if process.is_running():
+                alive.append(process)
+            else:
+                del known[child_pid]
+        return alive
+
+    def tree_rss(self, driver):
+        """驱动进程树当前的常驻内存（字节）"""
+        pid = self._root_pid(driver)
+        if pid is None or pid not in self._trees:
+            return 0
+        with self._lock:
+            processes = self._refresh(pid)
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total
+
+    def over_ceiling(self, driver):
+        """驱动进程树的内存是否超过上限"""
+        if self.rss_ceiling is None:
+            return False
+        rss = self.tree_rss(driver)
+        if rss <= self.rss_ceiling:
+            return False
+        print(f"浏览器进程内存 {rss / 2 ** 20:.0f} MB 超过上限 {self.rss_ceiling / 2 ** 20:.0f} MB，重建浏览器")
+        self.recycles += 1
+        return True
+
+    def release(self, driver, graceful=True):
+        """
+        驱动 quit() 之后调用：等待进程树结束，超时后强制结束剩下的进程
+
+        参数:
+            driver: 已经调用过 quit() 的驱动
+            graceful (bool): quit() 是否成功，失败时不再等待，直接强制结束
+
+        返回:
+            int: 强制结束的进程数
+        """
+        pid = self._root_pid(driver)
+        if pid is None:
+            return 0
+        with self._lock:
+            if pid not in self._trees:
+                return 0
+            self._refresh(pid)
+            processes = list(self._trees.pop(pid).values())
+        _, alive = psutil.wait_procs(processes, timeout=QUIT_GRACE if graceful else 0)
+        killed = _kill(alive) if alive else 0
+        if killed:
+            self.reaped += killed
+            print(f"驱动退出后仍有 {killed} 个浏览器进程未结束，已强制结束")
+        self._save_pids()
+        return killed
+
+    def sample(self):
+        """
+        采样所有被跟踪的浏览器进程的数量和内存，并追加写入指标文件
+
+        返回:
+            dict: 本次采样的指标
+        """
+        with self._lock:
+            processes = [process for pid in list(self._trees) for process in self._refresh(pid)]
+            trees = len(self._trees)
+        rss = 0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_processes = max(self.peak_processes, len(processes))
+        metrics = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "browsers": trees,
+            "processes": len(processes),
+            "rss_mb": round(rss / 2 ** 20, 1),
+            "recycles": self.recycles,
+            "reaped": self.reaped,
+        }
+        if self.metrics_path is not None:
+            os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+            with open(self.metrics_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(metrics, ensure_ascii=False) + "\n")
+        self._save_pids()
+        return metrics
+
+    def stats(self):
+        """供追踪记录使用的汇总指标"""
+        return {
+            "browser_peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+            "browser_peak_processes": self.peak_processes,
+            "browser_recycles": self.recycles,
+            "browser_reaped": self.reaped,
+        }
+
+    def _save_pids(self):
+        """把存活的浏览器进程记录到磁盘，本进程被强制结束后下次启动可以清理"""
+        with self._lock:
+            recorded = []
+            for known in self._trees.values():
+                for process in known.values():
+                    try:
+                        recorded.append([process.pid, process.create_time()])
+                    except psutil.NoSuchProcess:
+                        pass
+        try:
+            if recorded:
+                os.makedirs(os.path.dirname(self._pid_file), exist_ok=True)
+                with open(self._pid_file, "w", encoding="utf-8") as f:
+                    json.dump(recorded, f)
+            elif os.path.exists(self._pid_file):
+                os.remove(self._pid_file)
+        except OSError as e:
+            print(f"记录浏览器进程失败: {e}")
+
+    def close(self):
+        """停止采样，强制结束所有仍在运行的浏览器进程，打印汇总"""
+        atexit.unregister(self.close)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        with self._lock:
+            processes = [process for pid in list(self._trees) for process in self._refresh(pid)]
+            self._trees.clear()
+        if processes:
+            killed = _kill(processes)
+            self.reaped += killed
+            print(f"结束了 {killed} 个遗留的浏览器进程")
+        self._save_pids()
+        if self.peak_processes:
+            print(f"浏览器进程峰值 {self.peak_processes} 个，内存峰值 {self.peak_rss / 2 ** 20:.0f} MB，"
+                  f"因内存超限重建 {self.recycles} 次，强制结束遗留进程 {self.reaped} 个")
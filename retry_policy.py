@@ -0,0 +1,329 @@
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 错误类别
+TRANSIENT = "transient"  # 网络错误、超时、429/5xx，快速退避后重试
+AUTH_EXPIRED = "auth_expired"  # 会话失效，重新登录后立即重试
+SLOT_FULL = "slot_full"  # 所选时间段都已约满，很快就停止
+FATAL = "fatal"  # 浏览器被关闭、用户取消、参数错误等，立即停止
+
+# nginx 等服务器默认错误页的标题，例如 "502 Bad Gateway"
+ERROR_TITLE_PATTERN = re.compile(r"^\s*(429|5\d\d)\b")
+
+
+class BrowserClosedException(Exception):
+    """自定义异常，表示浏览器已被关闭"""
+    pass
+
+
+class ReservationCancelled(Exception):
+    """用户取消了预约"""
+    pass
+
+
+class AuthExpiredError(Exception):
+    """页面被重定向到统一身份认证，登录会话已失效"""
+    pass
+
+
+class AllSlotsFullError(Exception):
+    """所有偏好的时间段都已约满或未开放"""
+    pass
+
+
+class SlotNotOpenError(Exception):
+    """所选时间段还没有开放预约，应立即重试而不是按约满处理"""
+
+    def __init__(self, slots):
+        super().__init__(f"时间段 {slots} 尚未开放")
+        self.slots = slots
+
+
+class ServerBusyError(Exception):
+    """服务器返回 429 或 5xx"""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or f"服务器繁忙，状态码 {status}")
+        self.status = status
+
+
+def classify_error(error):
+    """
+    把异常归入 TRANSIENT、AUTH_EXPIRED、SLOT_FULL 或 FATAL
+
+    参数:
+        error (Exception): 预约过程中出现的异常
+
+    返回:
+        str: 错误类别
+    """
+    # 延迟导入，避免与 http_submit 循环导入，界面启动时也不必加载 Selenium
+    from http_submit import SlotUnavailableError
+
+    if "selenium" in sys.modules:
+        from selenium.common.exceptions import NoSuchElementException, NoSuchWindowException
+    else:
+        # 没有加载 Selenium 时不会出现它的异常，异步引擎分类错误时也不必加载
+        NoSuchElementException = NoSuchWindowException = ()
+
+    if isinstance(error, (BrowserClosedException, ReservationCancelled, NoSuchWindowException, ValueError, KeyError)):
+        return FATAL
+    if isinstance(error, AuthExpiredError):
+        return AUTH_EXPIRED
+    if isinstance(error, (AllSlotsFullError, SlotUnavailableError, NoSuchElementException)):
+        return SLOT_FULL
+    # 其余异常都按临时错误退避重试：ServerBusyError、SlotNotOpenError、Selenium 的超时和页面错误、网络错误，
+    # 以及没有预料到的异常。后者多半也是页面跳转中途的偶发错误，时间预算和次数上限保证重试最终会停止
+    return TRANSIENT
+
+
+def error_page_status(driver):
+    """当前页面是 429/5xx 错误页时返回状态码，否则返回 False；可以直接作为等待条件使用"""
+    match = ERROR_TITLE_PATTERN.match(driver.title or "")
+    return int(match.group(1)) if match else False
+
+
+def retry_after_seconds(value):
+    """解析 Retry-After 头中的秒数，无法解析时返回 None"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CancelToken:
+    """
+    跨线程取消一次预约
+
+    界面线程调用 cancel()，预约线程在 cancel_scope 中运行，所有 interruptible_sleep 会立即抛出
+    ReservationCancelled；on_cancel 注册的回调（例如关闭浏览器）让正在进行的页面等待也立即失败。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """取消预约并执行回调，回调可能较慢（例如关闭浏览器），界面线程应在其他线程中调用"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"取消预约时执行回调出错: {e}")
+
+    def on_cancel(self, callback):
+        """注册取消时执行的回调，已经取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        """注销 on_cancel 注册的回调，多次预约共用一个 token 时由每次预约结束时调用"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, seconds):
+        """等待 seconds 秒，期间被取消时提前返回 True"""
+        return self._event.wait(seconds)
+
+    def check(self):
+        """已经取消时抛出 ReservationCancelled"""
+        if self._event.is_set():
+            raise ReservationCancelled("预约已取消")
+
+
+_local = threading.local()
+
+
+@contextmanager
+def cancel_scope(token):
+    """在当前线程中使用 token 作为取消信号，token 为 None 时不可取消"""
+    previous = getattr(_local, "token", None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def interruptible_sleep(seconds):
+    """代替 time.sleep，当前线程的预约被取消时立即抛出 ReservationCancelled"""
+    token = getattr(_local, "token", None)
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise ReservationCancelled("预约已取消")
+
+
+class Backoff:
+    """
+    带抖动的指数退避
+
+    第 n 次的等待时间在 [0, min(cap, base * 2^n)] 之间均匀随机（full jitter），
+    多个客户端同时重试时不会集中在同一时刻。
+    """
+
+    def __init__(self, base=0.2, cap=3.0):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+
+    def next(self):
+        """下一次重试前应等待的秒数"""
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** self.failures))
+        self.failures += 1
+        return delay
+
+    def reset(self):
+        self.failures = 0
+
+
+class RequestGovernor:
+    """
+    全局请求节流
+
+    浏览器和 HTTP 客户端发请求前都先调用 before_request()；收到 429/5xx 后进入冷却期，
+    冷却期内所有请求都会等待，连续出错时冷却时间加倍，请求成功后逐步恢复。
+
+    属性:
+        min_interval (float): 两次请求之间的最小间隔（秒）
+        max_penalty (float): 冷却时间上限（秒）
+    """
+
+    def __init__(self, min_interval=0.0, max_penalty=8.0):
+        self.min_interval = min_interval
+        self.max_penalty = max_penalty
+        self.penalty = 0.0
+        self.cooldown_until = 0.0
+        self.last_request = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """占用下一次请求的发送时刻，返回发送前需要等待的秒数，异步代码用 asyncio.sleep 等待"""
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self.cooldown_until, self.last_request + self.min_interval)
+            self.last_request = start_at
+        return start_at - now
+
+    def before_request(self):
+        """等待冷却期和最小间隔结束"""
+        delay = self.reserve()
+        if delay > 0:
+            # 冷却期可能长达 max_penalty 秒，期间取消预约应立即生效
+            interruptible_sleep(delay)
+
+    def record(self, status, retry_after=None):
+        """
+        记录一次响应的状态码
+
+        参数:
+            status (int): HTTP 状态码
+            retry_after (float): 服务器给出的 Retry-After 秒数
+        """
+        with self._lock:
+            if status == 429 or status >= 500:
+                self.penalty = min(self.max_penalty, max(0.5, self.penalty * 2))
+                wait = retry_after if retry_after is not None else random.uniform(self.penalty / 2, self.penalty)
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + wait)
+                print(f"服务器返回 {status}，所有请求暂停 {wait:.2f} 秒")
+            else:
+                self.penalty /= 2
+
+
+GOVERNOR = RequestGovernor()
+
+
+class RetryPolicy:
+    """
+    以时间预算代替次数的重试策略
+
+    属性:
+        budget (float): 从 start() 开始允许重试的总秒数，为 None 时不限时
+        max_attempts (int): 最大尝试次数
+        slot_full_limit (int): 连续多少次所有时间段都已约满后停止
+        needs_login (bool): 上一次错误是否要求重新登录
+    """
+
+    def __init__(self, budget=600, max_attempts=None, slot_full_limit=3, backoff=None):
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.slot_full_limit = slot_full_limit
+        self.backoff = backoff or Backoff()
+        self.attempts = 0
+        self.slot_full_count = 0
+        self.needs_login = False
+        self.started = time.monotonic()
+
+    def start(self, delay=0.0):
+        """
+        重新开始计算时间预算，例如定时执行到达开放时间时
+
+        参数:
+            delay (float): 从 delay 秒之后才开始计算；定时执行时传入距开放的秒数，准备阶段的重试不消耗预算
+        """
+        self.started = time.monotonic() + max(0.0, delay)
+        self.backoff.reset()
+
+    def remaining(self):
+        """剩余的时间预算（秒）"""
+        if self.budget is None:
+            return float("inf")
+        return self.budget - (time.monotonic() - self.started)
+
+    def next_attempt(self):
+        """开始新的一次尝试，预算或次数用尽时返回 False"""
+        if self.remaining() <= 0 or (self.max_attempts is not None and self.attempts >= self.max_attempts):
+            return False
+        self.attempts += 1
+        return True
+
+    def on_success(self):
+        self.backoff.reset()
+        self.slot_full_count = 0
+        self.needs_login = False
+
+    def on_error(self, error):
+        """
+        根据错误类别决定下一步
+
+        参数:
+            error (Exception): 本次尝试的异常
+
+        返回:
+            tuple: (错误类别, 重试前等待的秒数)；等待秒数为 None 表示应停止
+        """
+        kind = classify_error(error)
+        self.needs_login = kind == AUTH_EXPIRED
+        if kind == FATAL:
+            return kind, None
+        if kind == SLOT_FULL:
+            self.slot_full_count += 1
+            if self.slot_full_count >= self.slot_full_limit:
+                return kind, None
+            delay = 0.5
+        elif kind == AUTH_EXPIRED:
+            delay = 0.0
+        else:
+            self.slot_full_count = 0
+            delay = self.backoff.next()
+        if delay >= self.remaining():
+            return kind, None
+        return kind, delay
@@ -0,0 +1,201 @@
+import http.client
+import math
+import time
+from collections import namedtuple
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from retry_policy import ReservationCancelled, interruptible_sleep
+
+# offset: 服务器时间减去本地时间（秒）；uncertainty: offset 的误差范围（±秒）；rtt: 最小往返时间（秒）
+ClockEstimate = namedtuple("ClockEstimate", ["offset", "uncertainty", "rtt"])
+
+LOCAL_CLOCK = ClockEstimate(0.0, 0.0, 0.0)
+
+
+def _request_server_date(connection, path):
+    """发送一次 HEAD 请求，返回 (发送时刻, 收到时刻, 服务器 Date 头对应的时间戳)"""
+    sent = time.time()
+    connection.request("HEAD", path, headers={"Cache-Control": "no-cache"})
+    response = connection.getresponse()
+    received = time.time()
+    response.read()
+    date_header = response.getheader("Date")
+    if not date_header:
+        raise ValueError("服务器响应中没有 Date 头")
+    return sent, received, parsedate_to_datetime(date_header).timestamp()
+
+
+def estimate_server_offset(url, samples=8, timeout=5):
+    """
+    根据 HTTP Date 头估计服务器时钟与本地时钟的偏差
+
+    Date 头只精确到秒，所以每次请求只能得出 offset 落在 [D - 收到时刻, D + 1 - 发送时刻] 之间。
+    第一次请求之后，每次都把请求安排在预测的服务器整秒边界附近发出，
+    多个区间取交集后误差大约每次减半，最终受限于往返时间。
+
+    参数:
+        url (str): 服务器地址
+        samples (int): 采样次数（不含建立连接的预热请求）
+        timeout (float): 单次请求超时（秒）
+
+    返回:
+        ClockEstimate: 时钟偏差估计
+    """
+    parsed = urlparse(url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parsed.netloc, timeout=timeout)
+    path = parsed.path or "/"
+    try:
+        # 预热请求：建立 TCP/TLS 连接，不计入采样
+        _request_server_date(connection, path)
+
+        low, high = -math.inf, math.inf
+        rtts = []
+        for _ in range(samples):
+            if rtts and high - low < math.inf:
+                # 把请求的中点对准当前估计下的下一个服务器整秒
+                estimate = (low + high) / 2
+                rtt = min(rtts)
+                boundary = math.floor(time.time() + estimate + rtt) + 1
+                send_at = boundary - estimate - rtt / 2
+                interruptible_sleep(max(0.0, send_at - time.time()))
+
+            sent, received, server_time = _request_server_date(connection, path)
+            rtts.append(received - sent)
+            sample_low, sample_high = server_time - received, server_time + 1 - sent
+            if max(low, sample_low) > min(high, sample_high):
+                # 区间不相交说明本地时钟发生了跳变，丢弃之前的结果重新开始
+                low, high = sample_low, sample_high
+            else:
+                low, high = max(low, sample_low), min(high, sample_high)
+    finally:
+        connection.close()
+
+    return ClockEstimate((low + high) / 2, (high - low) / 2, min(rtts))
+
+
+def wait_until(target, spin=0.02):
+    """
+    高精度等待到本地时间戳 target
+
+    先分段粗略睡眠（每段不超过 1 秒，每次醒来重新读取系统时间，能应对漂移和休眠），
+    最后 spin 秒忙等，返回实际醒来的时间戳。在 cancel_scope 中调用时可以被取消。
+    """
+    while True:
+        remaining = target - time.time()
+        if remaining <= spin:
+            break
+        interruptible_sleep(min(remaining - spin, 1.0))
+    while time.time() < target:
+        pass
+    return time.time()
+
+
+class Trigger:
+    """
+    两阶段定时执行的触发点
+
+    准备阶段完成后调用 wait() 等待到开始时间，等待期间定期调用 keepalive 保持会话；
+    触发阶段第一次发出提交请求前调用 mark_submit() 记录实际提交时间与计划时间的差距。
+
+    开始时间按服务器时钟计算：clock_source 给出服务器与本地的时钟偏差，
+    实际触发时间再提前半个往返时间加 fire_offset，使第一个请求恰好在开放时刻到达服务器。
+
+    属性:
+        start_at (datetime): 计划的预约开放时间（服务器时间）
+        keepalive_interval (float): 保持会话的间隔（秒）
+        clock_source (callable): 返回 ClockEstimate 的函数，为 None 时使用本地时钟
+        fire_offset (float): 额外提前触发的秒数，可以为负数
+        clock (ClockEstimate): 最近一次的时钟偏差估计
+        fired (bool): 是否已经到达开始时间
+        first_submit_at (datetime): 实际首次提交的时间
+    """
+
+    # 距离开始时间不足这么多秒时不再刷新页面，避免开始时刻还有页面在加载
+    KEEPALIVE_GUARD = 10
+    # 距离开始时间不足这么多秒时重新校准一次时钟
+    RESYNC_BEFORE = 30
+    # 触发前这么多秒预热一次连接，短于服务器常见的长连接超时，又留出重新握手的时间
+    WARMUP_BEFORE = 3
+
+    def __init__(self, start_at, keepalive_interval=60, clock_source=None, fire_offset=0.0):
+        self.start_at = start_at
+        self.keepalive_interval = keepalive_interval
+        self.clock_source = clock_source
+        self.fire_offset = fire_offset
+        self.clock = LOCAL_CLOCK
+        self.fired = False
+        self.first_submit_at = None
+
+    def sync_clock(self):
+        """重新估计服务器时钟偏差，失败时沿用上一次的结果"""
+        if self.clock_source is None:
+            return
+        try:
+            self.clock = self.clock_source()
+            print(f"服务器时钟比本地{'快' if self.clock.offset >= 0 else '慢'} {abs(self.clock.offset) * 1000:.0f} 毫秒"
+                  f"（误差 ±{self.clock.uncertainty * 1000:.0f} 毫秒，往返 {self.clock.rtt * 1000:.0f} 毫秒）")
+        except ReservationCancelled:
+            raise
+        except Exception as e:
+            print(f"校准服务器时钟失败，沿用上一次结果: {e}")
+
+    def fire_time(self):
+        """按当前时钟估计计算的本地触发时间戳"""
+        return self.start_at.timestamp() - self.clock.offset - self.clock.rtt / 2 - self.fire_offset
+
+    def remaining(self):
+        """距离触发还有多少秒"""
+        return self.fire_time() - time.time()
+
+    def wait(self, keepalive=None, warmup=None):
+        """
+        等待到开始时间
+
+        参数:
+            keepalive (callable): 保持会话的回调，例如刷新当前页面
+            warmup (callable): 触发前 WARMUP_BEFORE 秒调用一次，刷新关键请求要用的连接
+        """
+        self.sync_clock()
+        resynced = self.remaining() <= self.RESYNC_BEFORE
+        last_keepalive = time.monotonic()
+        while True:
+            remaining = self.remaining()
+            if remaining <= self.KEEPALIVE_GUARD:
+                break
+            if not resynced and remaining <= self.RESYNC_BEFORE:
+                self.sync_clock()
+                resynced = True
+                continue
+            if keepalive is not None and time.monotonic() - last_keepalive >= self.keepalive_interval:
+                keepalive()
+                last_keepalive = time.monotonic()
+                print(f"已刷新会话，距离预约开放还有 {remaining:.0f} 秒")
+            # 每次最多睡 1 秒，重新读取系统时间，避免长时间睡眠产生漂移
+            interruptible_sleep(min(remaining - self.KEEPALIVE_GUARD, 1.0))
+
+        if warmup is not None and self.remaining() > self.WARMUP_BEFORE:
+            wait_until(self.fire_time() - self.WARMUP_BEFORE)
+            try:
+                warmup()
+            except Exception as e:
+                print(f"预热连接失败: {e}")
+
+        predicted = self.fire_time()
+        actual = wait_until(predicted)
+        self.fired = True
+        print(f"到达预约开放时间 {self.start_at.strftime('%Y-%m-%d %H:%M:%S')}，开始提交"
+              f"（预计触发 {datetime.fromtimestamp(predicted).strftime('%H:%M:%S.%f')[:-3]}，"
+              f"实际触发 {datetime.fromtimestamp(actual).strftime('%H:%M:%S.%f')[:-3]}，"
+              f"偏差 {(actual - predicted) * 1000:.1f} 毫秒）")
+
+    def mark_submit(self):
+        """记录首次提交时间，并打印与计划时间（按服务器时钟）的差距"""
+        if self.first_submit_at is not None:
+            return
+        self.first_submit_at = datetime.now()
+        gap = self.first_submit_at.timestamp() + self.clock.offset - self.start_at.timestamp()
+        print(f"首次提交时间 {self.first_submit_at.strftime('%H:%M:%S.%f')[:-3]}，"
+              f"按服务器时钟比计划时间晚 {gap * 1000:.0f} 毫秒")
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import time
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from urls import cgyy_host, ids_host
+
+STORE_DIR = os.path.join(os.path.expanduser("~"), ".gym_reserve")
+
+# CDP Network.setCookies 接受的 Cookie 字段
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+class SessionStore:
+    """
+    登录会话的加密存储
+
+    登录成功后保存场馆预约系统和统一身份认证的 Cookie，下次启动时恢复到新浏览器中，
+    会话仍然有效时就不必再走一遍登录流程。Cookie 用 Fernet 加密后写入磁盘，
+    密钥保存在同目录下仅当前用户可读的 session.key 中，也可以用环境变量 GYM_SESSION_KEY 指定。
+
+    属性:
+        directory (str): 存储目录
+        max_age (float): 保存的会话最长使用多少秒，超过后视为过期
+    """
+
+    def __init__(self, directory=STORE_DIR, max_age=12 * 3600):
+        self.directory = directory
+        self.max_age = max_age
+        self._fernet = None
+
+    def _cipher(self):
+        if self._fernet is None:
+            key = os.environ.get("GYM_SESSION_KEY")
+            if key is None:
+                os.makedirs(self.directory, exist_ok=True)
+                key_path = os.path.join(self.directory, "session.key")
+                if not os.path.exists(key_path):
+                    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(Fernet.generate_key())
+                with open(key_path, "rb") as f:
+                    key = f.read().strip()
+            self._fernet = Fernet(key)
+        return self._fernet
+
+    def _path(self, username):
+        digest = hashlib.sha256(username.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"session-{digest}.bin")
+
+    def save(self, driver, username):
+        """
+        保存浏览器中两个站点的 Cookie
+
+        参数:
+            driver: 已登录的浏览器驱动
+            username (str): 学号
+        """
+        hosts = (cgyy_host(), ids_host())
+        cookies = [{field: cookie[field] for field in COOKIE_FIELDS if field in cookie}
+                   for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+                   if cookie["domain"].lstrip(".") in hosts]
+        payload = json.dumps({"saved_at": time.time(), "cookies": cookies}).encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(username)
+        temp_path = path + ".tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._cipher().encrypt(payload))
+        os.replace(temp_path, path)
+        print(f"已加密保存登录会话（{len(cookies)} 个 Cookie）")
+
+    def load(self, username):
+        """
+        读取保存的 Cookie
+
+        返回:
+            list: Cookie 列表；没有保存、无法解密或已过期时返回 None
+        """
+        path = self._path(username)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                payload = json.loads(self._cipher().decrypt(f.read()))
+        except (InvalidToken, ValueError) as e:
+            print(f"无法读取保存的登录会话: {e}")
+            return None
+        now = time.time()
+        if now - payload["saved_at"] > self.max_age:
+            return None
+        # 去掉已经过期的 Cookie，会话 Cookie 的 expires 为 -1
+        return [cookie for cookie in payload["cookies"] if cookie.get("expires", -1) <= 0 or cookie["expires"] > now]
+
+    def restore(self, driver, username):
+        """
+        把保存的 Cookie 写入浏览器，不需要先打开对应站点
+
+        返回:
+            bool: 是否恢复了 Cookie
+        """
+        cookies = self.load(username)
+        if not cookies:
+            return False
+        for cookie in cookies:
+            if cookie.get("expires", -1) <= 0:
+                cookie.pop("expires", None)
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        print(f"已恢复保存的登录会话（{len(cookies)} 个 Cookie）")
+        return True
+
+    def clear(self, username):
+        """删除保存的会话"""
+        path = self._path(username)
+        if os.path.exists(path):
+            os.remove(path)
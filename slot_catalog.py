@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import re
+import time
+
+import urls
+from urls import ROOMS, TIME_TO_INDEX, normalize_activity, room_url
+
+CATALOG_PATH = os.path.join(os.path.expanduser("~"), ".gym_reserve", "slot_catalog.json")
+
+# 超过这么多秒没有核对过总览页面的场馆，在下一次预约时顺便核对
+CATALOG_TTL = 24 * 3600
+
+# 发现场馆时尝试的总览页面编号
+ROOM_CANDIDATES = (1, 2)
+
+# 总览页面标题中的关键字 -> 预约类型
+ACTIVITY_KEYWORDS = {"健身": "fitness", "游泳": "swimming"}
+
+PERIOD_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*[-~－—]\s*(\d{1,2}):(\d{2})")
+
+
+def normalize_period(match):
+    """把正则匹配到的时间段统一成 "09:30-11:00" 的格式"""
+    start_hour, start_minute, end_hour, end_minute = match.groups()
+    return f"{int(start_hour):02d}:{start_minute}-{int(end_hour):02d}:{end_minute}"
+
+
+def parse_room_page(html, room):
+    """
+    从预约总览页面解析场馆名称和时间段
+
+    总览页面只为可预约的时间段提供 room_apl 链接，链接所在的单元格中写着时间段；
+    已约满或未开放的时间段只有文字，能知道时间段但不知道编号。
+
+    参数:
+        html (str): 预约总览页面的 HTML
+        room (int): 场馆编号
+
+    返回:
+        tuple: (场馆名称, {时间段: 编号}, 页面中出现的所有时间段)
+    """
+    # 延迟导入，界面启动时只读取缓存，不必加载 HTML 解析器
+    from bs4 import BeautifulSoup
+
+    from availability import SLOT_LINK_PATTERN
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.find(id="page-title")
+    name = title.get_text(strip=True) if title is not None else ""
+    slots = {}
+    for link in soup.find_all("a", href=True):
+        match = SLOT_LINK_PATTERN.search(link["href"])
+        if match is None or int(match.group(1)) != room:
+            continue
+        cell = link.find_parent(["td", "li"]) or link.parent
+        period = PERIOD_PATTERN.search(cell.get_text(" ", strip=True)) or PERIOD_PATTERN.search(link.get_text())
+        if period is not None:
+            slots[normalize_period(period)] = int(match.group(3))
+    periods = {normalize_period(match) for match in PERIOD_PATTERN.finditer(soup.get_text(" "))}
+    return name, slots, periods
+
+
+def activity_of(name):
+    """根据场馆名称判断预约类型，无法判断时返回 None"""
+    return next((activity for keyword, activity in ACTIVITY_KEYWORDS.items() if keyword in name), None)
+
+
+def default_entries():
+    """内置的场馆和时间段编号，从未核对过总览页面时使用"""
+    return {activity: {"room": room, "name": name, "slots": dict(TIME_TO_INDEX[activity]), "checked_at": 0.0}
+            for activity, (room, name) in ROOMS.items()}
+
+
+class SlotCatalog:
+    """
+    场馆和时间段编号目录
+
+    界面的时间段下拉框和预约表单地址都从这里查询。目录来自解析 room/1、room/2 总览页面的结果，
+    按场馆预约系统的主机名分别保存在磁盘上；每次查询前只比较一次文件修改时间，
+    预约时已经打开了总览页面，超过 ttl 没有核对过的场馆顺便用这个页面核对，不会额外请求。
+
+    属性:
+        path (str): 缓存文件路径
+        ttl (float): 核对结果的有效期（秒）
+    """
+
+    def __init__(self, path=CATALOG_PATH, ttl=CATALOG_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._sites = {}
+        self._mtime = None
+
+    def _load(self):
+        """缓存文件被其他进程更新后重新读取"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._mtime = mtime
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._sites = json.load(f)
+            except (OSError, ValueError):
+                self._sites = {}
+        return self._sites
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._sites, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+    def entries(self):
+        """当前站点的目录 {预约类型: {"room", "name", "slots", "checked_at"}}"""
+        return self._load().get(urls.cgyy_host()) or default_entries()
+
+    def room(self, fitness_or_swimming):
+        """返回 (场馆编号, 场馆名称)"""
+        entry = self.entries()[normalize_activity(fitness_or_swimming)]
+        return entry["room"], entry["name"]
+
+    def periods(self, fitness_or_swimming):
+        """按开始时间排列的所有时间段"""
+        return sorted(self.entries()[normalize_activity(fitness_or_swimming)]["slots"])
+
+    def indexes(self, fitness_or_swimming, reserve_time):
+        """把按优先级排列的时间段（例如 "18:00-19:30"）转换为时间段编号"""
+        entry = self.entries()[normalize_activity(fitness_or_swimming)]
+        missing = [period for period in reserve_time if period not in entry["slots"]]
+        if missing:
+            raise KeyError(f"{entry['name']}没有这些时间段: {', '.join(missing)}")
+        return [entry["slots"][period] for period in reserve_time]
+
+    def is_stale(self, fitness_or_swimming):
+        """是否超过 ttl 没有核对过总览页面"""
+        entry = self.entries()[normalize_activity(fitness_or_swimming)]
+        return time.time() - entry.get("checked_at", 0.0) > self.ttl
+
+    def update(self, room, html):
+        """
+        用一个总览页面核对目录
+
+        页面中有链接的时间段更新编号；页面中已经不存在的时间段删除；
+        暂时约满、没有链接的时间段保留原来的编号。
+
+        参数:
+            room (int): 场馆编号
+            html (str): 总览页面的 HTML
+
+        返回:
+            bool: 目录是否有变化；页面无法识别时返回 False
+        """
+        name, slots, periods = parse_room_page(html, room)
+        activity = activity_of(name)
+        if activity is None or not periods:
+            return False
+        entries = self.entries()
+        old = entries.get(activity, {})
+        merged = {period: slots.get(period, old.get("slots", {}).get(period)) for period in periods}
+        merged = {period: index for period, index in sorted(merged.items()) if index is not None}
+        changed = old.get("room") != room or old.get("slots") != merged
+        if changed:
+            print(f"{name}的时间段有变化: {merged}")
+        entries = dict(entries)
+        entries[activity] = {"room": room, "name": name, "slots": merged, "checked_at": time.time()}
+        self._sites[urls.cgyy_host()] = entries
+        try:
+            self._save()
+        except OSError as e:
+            print(f"保存时间段目录失败: {e}")
+        return changed
+
+    def refresh(self, fetch, force=False):
+        """
+        请求各场馆的总览页面并核对目录
+
+        参数:
+            fetch (callable): fetch(url) 返回页面 HTML，例如 HttpSubmitter.fetch
+            force (bool): 为 False 时只在有场馆超过 ttl 没有核对时才请求
+
+        返回:
+            bool: 目录是否有变化
+        """
+        if not force and not any(self.is_stale(activity) for activity in self.entries()):
+            return False
+        changed = False
+        for room in ROOM_CANDIDATES:
+            try:
+                html = fetch(room_url(room))
+            except Exception as e:
+                print(f"获取 {room_url(room)} 失败: {e}")
+                continue
+            changed = self.update(room, html) or changed
+        return changed
+
+
+CATALOG = SlotCatalog()
+
+
+def slot_indexes(fitness_or_swimming, reserve_time):
+    """把按优先级排列的时间段转换为时间段编号，见 SlotCatalog.indexes"""
+    return CATALOG.indexes(fitness_or_swimming, reserve_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看或更新场馆时间段目录")
+    parser.add_argument("--refresh", metavar="STUDENT_ID", help="用该学号保存的登录会话重新解析总览页面")
+    args = parser.parse_args()
+
+    if args.refresh:
+        from http_submit import HttpSubmitter
+        from session_store import SessionStore
+
+        cookies = SessionStore().load(args.refresh)
+        if not cookies:
+            parser.error("没有保存的登录会话，请先登录一次")
+        submitter = HttpSubmitter()
+        submitter.headers["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies
+                                                if urls.cgyy_host() in cookie.get("domain", ""))
+        CATALOG.refresh(submitter.fetch, force=True)
+
+    for activity, entry in CATALOG.entries().items():
+        checked = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["checked_at"])) if entry["checked_at"] \
+            else "从未核对"
+        print(f"{entry['name']}（{activity}，room/{entry['room']}，{checked}）")
+        for period in sorted(entry["slots"]):
+            print(f"    {period}: {entry['slots'][period]}")
+
+
+if __name__ == "__main__":
+    main()
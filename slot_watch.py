@@ -0,0 +1,205 @@
+import random
+import statistics
+import time
+from datetime import datetime
+
+import urllib3
+
+import tracing
+from availability import parse_open_slots
+from http_submit import SlotUnavailableError
+from page_state import CONFIRMED, UNKNOWN, classify_html, recheck_submit
+from retry_policy import ServerBusyError, interruptible_sleep
+from urls import room_url, slot_form_url
+
+# 轮询间隔的下限和上限（秒）
+WATCH_FLOOR = 2
+WATCH_CEILING = 60
+
+# 离最近的时间段开始还有多少秒时，间隔为它的多少倍：1 小时以上按上限，2 分钟以内按下限
+WATCH_SCALE = 1 / 60
+
+# 在间隔上加减的随机比例，避免固定节奏的请求
+WATCH_JITTER = 0.2
+
+
+def poll_interval(seconds_to_start, floor=WATCH_FLOOR, ceiling=WATCH_CEILING, jitter=WATCH_JITTER):
+    """
+    下一次轮询前等待的秒数
+
+    临近开始时有人临时取消的可能最大，离开始越近轮询越快；加上随机抖动，但不低于下限。
+
+    参数:
+        seconds_to_start (float): 离最近一个还没开始的时间段开始还有多少秒
+        floor (float): 间隔下限（秒）
+        ceiling (float): 间隔上限（秒）
+        jitter (float): 随机抖动的比例
+
+    返回:
+        float: 等待秒数
+    """
+    base = min(ceiling, max(floor, seconds_to_start * WATCH_SCALE))
+    return max(floor, base * (1 + random.uniform(-jitter, jitter)))
+
+
+def session_starts(reserve_date, periods):
+    """各时间段（例如 "18:00-19:30"）在预约日期的开始时间"""
+    return [datetime.strptime(f"{reserve_date} {period.split('-')[0]}", "%Y-%m-%d %H:%M") for period in periods]
+
+
+def submit_over_http(submitter, room, reserve_date, phone_number):
+    """
+    生成只用 HTTP 提交的 submit 回调，供没有浏览器的异步引擎使用
+
+    返回:
+        callable: submit(按优先顺序排列的时间段编号) -> 是否预约成功
+    """
+    def submit(slots):
+        for slot in slots:
+            url = slot_form_url(room, reserve_date, slot)
+            try:
+                result = submitter.submit(url, phone_number)
+            except SlotUnavailableError as e:
+                print(f"{slot}:{str(e)}")
+                continue
+            if result.outcome == UNKNOWN:
+                result = recheck_submit(result, classify_html(submitter.fetch(url), url))
+            if result.outcome == CONFIRMED:
+                print(f"预约{slot}时间段成功！")
+                return True
+            print(f"{slot}:预约被拒绝: {result.reason}")
+        return False
+    return submit
+
+
+class SlotWatcher:
+    """
+    所选时间段都已约满后，用同一个登录会话监控总览页面，发现有人取消就立即提交
+
+    每次只请求一次总览页面，服务器支持时用条件请求，页面没有变化只返回 304；
+    轮询间隔见 poll_interval。所有时间段都已开始、超过 max_duration 或预约成功时停止。
+    请求或提交时的服务器繁忙和网络错误只记录下来，按正常间隔继续监控；只有会话失效和取消会结束监控。
+
+    属性:
+        submitter (HttpSubmitter): 带有会话 Cookie 的 HTTP 客户端
+        room (int): 场馆编号
+        reserve_date (str): 预约日期
+        slots (list): 按优先级排列的时间段编号
+        starts (list): 各时间段的开始时间
+        polls (int): 请求总览页面的次数
+        not_modified (int): 其中返回 304 的次数
+        bytes (int): 传输的字节数（响应头为估算值）
+        latencies (list): 每次发现空位到提交完成（含确认结果）的秒数
+        errors (int): 请求或提交出错后继续监控的次数
+    """
+
+    def __init__(self, submitter, room, reserve_date, slots, periods, floor=WATCH_FLOOR, ceiling=WATCH_CEILING,
+                 jitter=WATCH_JITTER, max_duration=None):
+        self.submitter = submitter
+        self.room = room
+        self.reserve_date = reserve_date
+        self.slots = list(slots)
+        self.starts = session_starts(reserve_date, periods)
+        self.floor = floor
+        self.ceiling = ceiling
+        self.jitter = jitter
+        self.max_duration = max_duration
+        self.polls = 0
+        self.not_modified = 0
+        self.bytes = 0
+        self.latencies = []
+        self.errors = 0
+        self.started = None
+        self._validators = None
+        self._open_slots = None
+
+    def pending(self, now=None):
+        """还没有开始的时间段 [(编号, 开始时间)]，保持优先顺序"""
+        now = now or datetime.now()
+        return [(slot, start) for slot, start in zip(self.slots, self.starts) if start > now]
+
+    def poll(self):
+        """
+        请求一次总览页面
+
+        返回:
+            set: 预约日期可预约的时间段编号，无法判断时返回 None；页面没有变化时返回上一次的结果
+        """
+        html, self._validators, size = self.submitter.fetch_conditional(room_url(self.room), self._validators)
+        self.polls += 1
+        self.bytes += size
+        if html is None:
+            self.not_modified += 1
+        else:
+            self._open_slots = parse_open_slots(html, self.room, self.reserve_date)
+        return self._open_slots
+
+    def run(self, submit):
+        """
+        开始监控
+
+        参数:
+            submit (callable): submit(按优先顺序排列的空出的时间段编号) -> 是否预约成功
+
+        返回:
+            bool: 是否预约成功
+        """
+        self.started = time.monotonic()
+        print(f"开始监控时间段 {self.slots} 的空位")
+        try:
+            while True:
+                pending = self.pending()
+                if not pending:
+                    print("所选时间段均已开始，停止监控")
+                    return False
+                if self.max_duration is not None and time.monotonic() - self.started >= self.max_duration:
+                    print("监控时间已用完，停止监控")
+                    return False
+
+                try:
+                    open_slots = self.poll()
+                    freed = [slot for slot, _ in pending if open_slots and slot in open_slots]
+                    if freed:
+                        detected = time.monotonic()
+                        print(f"发现空出的时间段 {freed}，立即提交")
+                        with tracing.span("watch_submit", slots=freed) as submit_span:
+                            success = submit(freed)
+                            self.latencies.append(time.monotonic() - detected)
+                            submit_span.attrs["detection_to_submit"] = round(self.latencies[-1], 6)
+                        print(f"从发现空位到提交完成耗时 {self.latencies[-1] * 1000:.0f} 毫秒")
+                        if success:
+                            return True
+                        # 页面已经变化，下一次请求完整页面
+                        self._validators = None
+                except (ServerBusyError, urllib3.exceptions.HTTPError, OSError) as e:
+                    # 监控要持续到时间段开始，偶尔的繁忙或网络错误不结束监控，按正常间隔稍后再试
+                    self.errors += 1
+                    self._validators = None
+                    print(f"监控请求出错，稍后继续: {e}")
+
+                seconds_to_start = min((start - datetime.now()).total_seconds() for _, start in pending)
+                interruptible_sleep(poll_interval(seconds_to_start, self.floor, self.ceiling, self.jitter))
+        finally:
+            self.report()
+
+    def stats(self):
+        """监控统计，用于写入追踪记录"""
+        minutes = (time.monotonic() - self.started) / 60 if self.started is not None else 0
+        return {
+            "polls": self.polls,
+            "polls_per_minute": round(self.polls / minutes, 2) if minutes > 0 else None,
+            "not_modified": self.not_modified,
+            "bytes": self.bytes,
+            "detections": len(self.latencies),
+            "errors": self.errors,
+            "detection_to_submit_p50": round(statistics.median(self.latencies), 6) if self.latencies else None,
+        }
+
+    def report(self):
+        """打印监控统计"""
+        stats = self.stats()
+        latency = (f"，发现空位到提交完成中位数 {stats['detection_to_submit_p50'] * 1000:.0f} 毫秒"
+                   if self.latencies else "")
+        print(f"共请求总览页面 {stats['polls']} 次（每分钟 {stats['polls_per_minute'] or 0} 次，"
+              f"其中 {stats['not_modified']} 次未变化），传输 {stats['bytes'] / 1024:.1f} KB，"
+              f"发现空位 {stats['detections']} 次{latency}")
@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 目录缓存、预约历史、登录会话都保存在 ~/.gym_reserve 下，测试时换成临时目录，不影响真实数据；
+# 这些路径在导入模块时计算，必须在导入之前修改
+os.environ["HOME"] = os.environ["USERPROFILE"] = tempfile.mkdtemp(prefix="gym_reserve_test_")
+
+# 模块都在仓库根目录，没有安装为包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import urls  # noqa: E402
+from mock_server import MockConfig, MockServer  # noqa: E402
+
+
+@pytest.fixture
+def restore_base_urls():
+    """测试结束后把场馆预约系统和统一身份认证的根地址恢复原样"""
+    original = (urls.CGYY_BASE_URL, urls.IDS_BASE_URL)
+    yield
+    urls.set_base_urls(*original)
+
+
+@pytest.fixture
+def mock_server(restore_base_urls):
+    """启动一个没有延迟的本地模拟服务器，并把根地址指向它"""
+    server = MockServer(MockConfig()).start()
+    urls.set_base_urls(server.cgyy_base_url, server.ids_base_url)
+    yield server
+    server.stop()
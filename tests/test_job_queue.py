@@ -0,0 +1,46 @@
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+
+from async_engine import reserve_queue
+from job_queue import FAILED, SUCCESS, ReservationJob, load_queue, trigger_groups
+
+
+def test_trigger_groups_orders_by_open_time_then_priority():
+    morning = datetime(2024, 10, 8, 8, 0)
+    evening = datetime(2024, 10, 8, 20, 0)
+    jobs = [
+        ReservationJob("fitness", "2024-10-10", ["18:00-19:30"], evening, priority=0),
+        ReservationJob("swimming", "2024-10-10", ["09:30-11:00"], morning, priority=2),
+        ReservationJob("fitness", "2024-10-11", ["18:00-19:30"], morning, priority=1),
+        ReservationJob("swimming", "2024-10-11", ["09:30-11:00"], None, priority=3),
+    ]
+    groups = trigger_groups(jobs)
+    assert [[job.priority for job in group] for group in groups] == [[3], [1, 2], [0]]
+
+
+def test_load_queue_uses_file_order_as_priority(tmp_path):
+    path = tmp_path / "queue.json"
+    path.write_text(json.dumps([
+        {"activity": "游泳", "date": "2024-10-15", "slots": ["09:30-11:00"], "start_at": "2024-10-08 08:00:00"},
+        {"activity": "fitness", "date": "2024-10-17", "slots": ["18:00-19:30"]},
+    ]), encoding="utf-8")
+    jobs = load_queue(path)
+    assert [(job.activity, job.priority) for job in jobs] == [("swimming", 0), ("fitness", 1)]
+    assert jobs[0].start_at == datetime(2024, 10, 8, 8, 0)
+    assert ReservationJob.from_dict(jobs[0].to_dict()).to_dict() == jobs[0].to_dict()
+
+
+def test_queue_books_every_job_with_one_session(mock_server):
+    reserve_date = (date.today() + timedelta(days=1)).isoformat()
+    jobs = [
+        ReservationJob("fitness", reserve_date, ["18:00-19:30", "19:30-21:00"], priority=0),
+        ReservationJob("swimming", reserve_date, ["09:30-11:00"], priority=1),
+        # 开放时间已过去很久，超出时间预算，不再尝试
+        ReservationJob("fitness", reserve_date, ["16:30-18:00"], datetime.now() - timedelta(hours=1), priority=2),
+    ]
+    assert not asyncio.run(reserve_queue("mock-user", jobs, cookies=[mock_server.create_session()], deadline=5,
+                                         trace_dir=None, history_path=None))
+    assert [job.status for job in jobs] == [SUCCESS, SUCCESS, FAILED]
+    assert [job.booked for job in jobs[:2]] == ["18:00-19:30", "09:30-11:00"]
+    assert len(mock_server.state.bookings) == 2
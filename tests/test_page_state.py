@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+import pytest
+
+import urls
+from benchmark import record_fixtures
+from http_submit import PHONE_NUMBER, HttpSubmitter
+from page_state import (BOOKED, CONFIRMED, FORM_OPEN, REJECTED, UNKNOWN, PageState, SubmitResult, classify_html,
+                        recheck_submit, verify_submit_response)
+from slot_catalog import CATALOG
+
+
+@pytest.fixture(scope="module")
+def recorded_pages():
+    """benchmark.py classify 使用的录制页面；判断时根地址仍指向录制用的模拟服务器"""
+    original = (urls.CGYY_BASE_URL, urls.IDS_BASE_URL)
+    yield record_fixtures()
+    urls.set_base_urls(*original)
+
+
+def test_classify_html_recorded_pages(recorded_pages):
+    assert len(recorded_pages) == 7
+    for name, page in recorded_pages.items():
+        assert classify_html(page["html"], page["url"]).state == page["expected"], name
+
+
+def test_recheck_submit_booked_page_confirms(recorded_pages):
+    booked = next(page for page in recorded_pages.values() if page["expected"] == BOOKED)
+    result = recheck_submit(SubmitResult(UNKNOWN, "等待提交结果超时"), classify_html(booked["html"], booked["url"]))
+    assert result.outcome == CONFIRMED
+
+
+def test_recheck_submit_open_form_rejects(recorded_pages):
+    form = next(page for page in recorded_pages.values() if page["expected"] == FORM_OPEN)
+    state = classify_html(form["html"], form["url"])
+    result = recheck_submit(SubmitResult(UNKNOWN, "等待提交结果超时"), state)
+    assert result.outcome == REJECTED
+    assert result.reason == (state.message or "等待提交结果超时")
+
+
+def test_recheck_submit_keeps_reason_without_message():
+    result = recheck_submit(SubmitResult(UNKNOWN, "提交请求出错"), PageState(FORM_OPEN, "", None))
+    assert result == SubmitResult(REJECTED, "提交请求出错")
+
+
+def test_verify_submit_response_redirect_needs_target_page():
+    url = "https://cgyy.xmu.edu.cn/room_apl/1/2024-10-12/14"
+    assert verify_submit_response(302, "/my_reservations", "", url).outcome == UNKNOWN
+    back_to_form = verify_submit_response(302, url, "", url, target_html="<html><title>预约</title></html>")
+    assert back_to_form.outcome == UNKNOWN
+
+
+def test_submit_against_mock_server(mock_server):
+    room = CATALOG.room("fitness")[0]
+    reserve_date = (date.today() + timedelta(days=1)).isoformat()
+    url = urls.slot_form_url(room, reserve_date, CATALOG.indexes("fitness", ["18:00-19:30"])[0])
+    cookie = mock_server.create_session()
+    submitter = HttpSubmitter()
+    submitter.headers["Cookie"] = f"{cookie['name']}={cookie['value']}"
+
+    assert submitter.submit(url, PHONE_NUMBER).outcome == CONFIRMED
+    assert classify_html(submitter.fetch(url), url).state == BOOKED
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from async_engine import reserve
+from http_submit import SlotUnavailableError
+from retry_policy import (AUTH_EXPIRED, FATAL, SLOT_FULL, TRANSIENT, AllSlotsFullError, AuthExpiredError,
+                          BrowserClosedException, ReservationCancelled, RetryPolicy, ServerBusyError, SlotNotOpenError,
+                          classify_error)
+
+
+@pytest.mark.parametrize("error, kind", [
+    (AuthExpiredError("会话失效"), AUTH_EXPIRED),
+    (AllSlotsFullError("约满"), SLOT_FULL),
+    (SlotUnavailableError("没有表单"), SLOT_FULL),
+    (ServerBusyError(503), TRANSIENT),
+    (SlotNotOpenError([14]), TRANSIENT),
+    (ConnectionResetError(), TRANSIENT),
+    (RuntimeError("未预料的异常"), TRANSIENT),
+    (ReservationCancelled("取消"), FATAL),
+    (BrowserClosedException(), FATAL),
+    (ValueError("参数错误"), FATAL),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+def test_slot_full_stops_after_limit():
+    policy = RetryPolicy(budget=60, slot_full_limit=3)
+    assert policy.on_error(AllSlotsFullError("约满"))[1] is not None
+    assert policy.on_error(AllSlotsFullError("约满"))[1] is not None
+    assert policy.on_error(AllSlotsFullError("约满")) == (SLOT_FULL, None)
+
+
+def test_needs_login_follows_last_error():
+    policy = RetryPolicy(budget=60)
+    assert policy.on_error(AuthExpiredError("会话失效")) == (AUTH_EXPIRED, 0.0)
+    assert policy.needs_login
+    policy.on_error(ServerBusyError(503))
+    assert not policy.needs_login
+    policy.on_error(AuthExpiredError("会话失效"))
+    policy.on_success()
+    assert not policy.needs_login
+
+
+def test_budget_and_max_attempts():
+    policy = RetryPolicy(budget=0.05, max_attempts=2)
+    assert policy.next_attempt()
+    assert policy.next_attempt()
+    assert not policy.next_attempt()
+
+    policy = RetryPolicy(budget=0.05)
+    assert policy.next_attempt()
+    time.sleep(0.06)
+    assert not policy.next_attempt()
+    assert policy.on_error(ServerBusyError(503))[1] is None
+
+
+def test_start_delay_defers_budget():
+    policy = RetryPolicy(budget=1)
+    policy.start(10)
+    assert policy.remaining() > 10
+
+
+def reserve_on(server, deadline):
+    reserve_date = (date.today() + timedelta(days=1)).isoformat()
+    return asyncio.run(reserve("mock-user", "fitness", reserve_date, ["18:00-19:30"], cookies=[server.create_session()],
+                               deadline=deadline, trace_dir=None, history_path=None))
+
+
+def test_not_open_form_is_retried_until_open(mock_server):
+    mock_server.config.opens_at = time.time() + 1
+    assert reserve_on(mock_server, deadline=10)
+    assert len(mock_server.state.bookings) == 1
+
+
+def test_deadline_stops_retrying(mock_server):
+    mock_server.config.opens_at = time.time() + 3600
+    start = time.monotonic()
+    assert not reserve_on(mock_server, deadline=1)
+    assert time.monotonic() - start < 5
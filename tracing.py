@@ -0,0 +1,237 @@
+import argparse
+import contextvars
+import functools
+import glob
+import json
+import os
+import secrets
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Span:
+    """
+    一个阶段的追踪记录
+
+    属性:
+        name (str): 阶段名称
+        attrs (dict): 附加属性，例如 URL、时间段编号
+        retries (int): 阶段内部的重试次数
+        outcome (str): 结果，ok / failed / 异常类型名，为 None 时按返回值或异常自动判断
+    """
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.retries = 0
+        self.outcome = None
+        self.start = time.monotonic()
+        self.wall_time = time.time()
+        self.end = None
+
+    def to_record(self, run_id):
+        record = {
+            "run_id": run_id,
+            "span": self.name,
+            "parent": self.parent,
+            "wall_time": datetime.fromtimestamp(self.wall_time).isoformat(timespec="milliseconds"),
+            "start": round(self.start, 6),
+            "end": round(self.end, 6),
+            "duration": round(self.end - self.start, 6),
+            "retries": self.retries,
+            "outcome": self.outcome,
+        }
+        record.update(self.attrs)
+        return record
+
+
+class Tracer:
+    """
+    一次预约运行的分阶段追踪，每个阶段结束时以 JSON Lines 格式追加写入追踪文件
+
+    属性:
+        run_id (str): 本次运行的编号
+        path (str): 追踪文件路径，为 None 时只在内存中记录
+        records (list): 已结束阶段的记录
+    """
+
+    def __init__(self, path=None, run_id=None):
+        self.run_id = run_id or f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{secrets.token_hex(2)}"
+        self.path = path
+        self.records = []
+        self.listeners = []
+        self._stack = []
+        self._lock = threading.Lock()
+        self._file = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def add_listener(self, listener):
+        """注册回调 listener(事件, 阶段)，事件为 "start" 或 "end"，在阶段开始和结束时调用"""
+        self.listeners.append(listener)
+
+    def current_span(self):
+        """当前正在进行的最内层阶段，没有时返回 None"""
+        return self._stack[-1] if self._stack else None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        记录一个阶段
+
+        参数:
+            name (str): 阶段名称
+            attrs: 写入记录的附加属性
+        """
+        parent = self._stack[-1].name if self._stack else None
+        span = Span(name, parent, attrs)
+        self._stack.append(span)
+        self._notify("start", span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.outcome is None:
+                span.outcome = type(e).__name__
+            raise
+        finally:
+            span.end = time.monotonic()
+            if span.outcome is None:
+                span.outcome = "ok"
+            self._stack.pop()
+            self._write(span.to_record(self.run_id))
+            self._notify("end", span)
+
+    def _notify(self, event, span):
+        for listener in self.listeners:
+            try:
+                listener(event, span)
+            except Exception as e:
+                print(f"追踪回调出错: {e}")
+
+    def _write(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def close(self):
+        """关闭追踪文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# 当前运行的追踪器按线程和 asyncio 任务分开保存，界面线程中的预约和预约队列同时运行时各自写自己的追踪文件
+_current = contextvars.ContextVar("tracer", default=Tracer())
+
+
+def start_run(trace_dir="traces"):
+    """
+    在当前线程（或 asyncio 任务）中开始一次新的运行，之后的 span() 都记录到这次运行中
+
+    参数:
+        trace_dir (str): 追踪文件目录，为 None 时不写文件
+
+    返回:
+        Tracer: 本次运行的追踪器
+    """
+    tracer = Tracer()
+    if trace_dir is not None:
+        tracer = Tracer(os.path.join(trace_dir, f"run-{tracer.run_id}.jsonl"), tracer.run_id)
+    _current.set(tracer)
+    return tracer
+
+
+def get_tracer():
+    """当前运行的追踪器"""
+    return _current.get()
+
+
+def span(name, **attrs):
+    """在当前运行中记录一个阶段，用法与 Tracer.span 相同"""
+    return _current.get().span(name, **attrs)
+
+
+def current_span():
+    """当前运行中正在进行的最内层阶段"""
+    return _current.get().current_span()
+
+
+def traced(name):
+    """
+    把函数调用记录为一个阶段的装饰器
+
+    函数返回 False 时结果记为 failed，抛出异常时记为异常类型名。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as current:
+                result = func(*args, **kwargs)
+                if result is False and current.outcome is None:
+                    current.outcome = "failed"
+                return result
+        return wrapper
+    return decorator
+
+
+def load_records(paths):
+    """读取一个或多个追踪文件中的所有记录"""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def percentile(values, fraction):
+    """最近秩百分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(records):
+    """
+    按阶段统计耗时
+
+    返回:
+        dict: 阶段名称 -> (次数, p50 秒数, p95 秒数, 失败次数, 重试总数)
+    """
+    by_span = {}
+    for record in records:
+        by_span.setdefault(record["span"], []).append(record)
+    summary = {}
+    for name, items in by_span.items():
+        durations = [item["duration"] for item in items]
+        summary[name] = (len(items), statistics.median(durations), percentile(durations, 0.95),
+                         sum(item["outcome"] != "ok" for item in items), sum(item["retries"] for item in items))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预约运行追踪工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="统计各阶段耗时的 p50/p95")
+    summary_parser.add_argument("paths", nargs="*", default=["traces"], help="追踪文件或目录")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path])
+    records = load_records(files)
+    runs = {record["run_id"] for record in records}
+    print(f"共 {len(runs)} 次运行，{len(records)} 条记录")
+    print(f"{'阶段':<28}{'次数':>6}{'p50(毫秒)':>12}{'p95(毫秒)':>12}{'失败':>6}{'重试':>6}")
+    for name, (count, p50, p95, failures, retries) in sorted(summarize(records).items(),
+                                                               key=lambda item: -item[1][1]):
+        print(f"{name:<30}{count:>6}{p50 * 1000:>12.0f}{p95 * 1000:>12.0f}{failures:>6}{retries:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+from urllib.parse import quote, urlparse
+
+# 可以通过环境变量或 set_base_urls 指向本地的模拟服务器
+CGYY_BASE_URL = os.environ.get("GYM_CGYY_BASE_URL", "https://cgyy.xmu.edu.cn")
+IDS_BASE_URL = os.environ.get("GYM_IDS_BASE_URL", "https://ids.xmu.edu.cn")
+
+# 内置的场馆和时间段编号，实际使用 slot_catalog 从总览页面核对过的结果
+# 预约类型 -> (场馆编号, 场馆名称)
+ROOMS = {"fitness": (1, "健身房"), "swimming": (2, "游泳馆")}
+
+# 预约类型 -> 时间段 -> 预约表单地址中的时间段编号
+TIME_TO_INDEX = {
+    "swimming": {
+        "09:30-11:00": 5,
+        "12:00-14:00": 4,
+        "14:30-16:00": 1,
+        "16:30-18:00": 2,
+        "18:30-20:30": 3,
+    },
+    "fitness": {
+        "10:30-12:00": 16,
+        "12:00-13:30": 10,
+        "13:30-15:00": 11,
+        "15:00-16:30": 12,
+        "16:30-18:00": 13,
+        "18:00-19:30": 14,
+        "19:30-21:00": 15,
+    }
+}
+
+
+def set_base_urls(cgyy_base_url, ids_base_url):
+    """修改场馆预约系统和统一身份认证的根地址"""
+    global CGYY_BASE_URL, IDS_BASE_URL
+    CGYY_BASE_URL = cgyy_base_url.rstrip("/")
+    IDS_BASE_URL = ids_base_url.rstrip("/")
+
+
+def cgyy_host():
+    """场馆预约系统的主机名，用于匹配会话 Cookie"""
+    return urlparse(CGYY_BASE_URL).hostname
+
+
+def ids_host():
+    """统一身份认证的主机名"""
+    return urlparse(IDS_BASE_URL).hostname
+
+
+def home_url():
+    """场馆预约系统首页"""
+    return f"{CGYY_BASE_URL}/"
+
+
+def idcallback_url():
+    """
+    统一身份认证登录后的回调地址
+
+    与其他地址一样使用根地址的协议（默认 https），不再经过 http 到 https 的重定向
+    """
+    return f"{CGYY_BASE_URL}/idcallback"
+
+
+def cas_weixin_url():
+    """统一身份认证的企业微信登录页面"""
+    return f"{IDS_BASE_URL}/authserver/login?service={quote(idcallback_url(), safe='')}"
+
+
+def cas_username_login_url():
+    """统一身份认证的账号密码登录页面，登录后回调场馆预约系统"""
+    return f"{IDS_BASE_URL}/authserver/login?type=userNameLogin&service={quote(idcallback_url(), safe='')}"
+
+
+def room_url(room):
+    """预约总览页面地址，room 为 1（健身房）或 2（游泳馆）"""
+    return f"{CGYY_BASE_URL}/room/{room}"
+
+
+def slot_form_url(room, reserve_date, index):
+    """某个时间段的预约表单地址"""
+    return f"{CGYY_BASE_URL}/room_apl/{room}/{reserve_date}/{index}/cg"
+
+
+def normalize_activity(fitness_or_swimming):
+    """把 "健身"/"游泳" 转换为 "fitness"/"swimming"，其他值原样返回"""
+    return {"游泳": "swimming", "健身": "fitness"}.get(fitness_or_swimming, fitness_or_swimming)
+
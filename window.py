@@ -1,16 +1,45 @@
 import json
 import os
+import statistics
 import sys
 import threading
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from PyQt6.QtCore import QDate, QTime
+from PyQt6.QtCore import QDate, QThread, QTime, QTimer
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, QComboBox,
                              QCalendarWidget, QLabel, QHBoxLayout, QTimeEdit, QMessageBox, QDateEdit, QCheckBox,
-                             QLineEdit)
+                             QLineEdit, QSpinBox, QGroupBox, QTreeWidget, QTreeWidgetItem, QTableWidget,
+                             QTableWidgetItem)
 
-from main import automated_login
+from job_queue import ACTIVITY_LABELS, STATUS_LABELS, ReservationJob
+from slot_catalog import CATALOG
+from tracing import percentile
+from urls import normalize_activity
+from worker import ReservationWorker
+
+
+def load_engine(async_engine=False, queue=False):
+    """
+    按需导入预约函数
+
+    main 和 async_engine 会加载 Selenium 等较重的模块，放到窗口显示之后再导入，窗口可以更快出现。
+
+    参数:
+        async_engine (bool): 是否使用异步引擎
+        queue (bool): 是否执行预约队列
+
+    返回:
+        callable: run_queue、run_reservation 或 automated_login
+    """
+    if queue:
+        from async_engine import run_queue
+        return run_queue
+    if async_engine:
+        from async_engine import run_reservation
+        return run_reservation
+    from main import automated_login
+    return automated_login
 
 
 class ReservationInterface(QWidget):
@@ -26,14 +55,28 @@ class ReservationInterface(QWidget):
         primary_time_slot (QComboBox): 用于选择首选时间段的下拉框
         alternative_slots (list): 包含三个用于选择备选时间段的下拉框列表
         start_time_edit (QTimeEdit): 用于设置自动开始时间的时间编辑器
+        queue_table (QTableWidget): 预约队列，每个任务一行，显示各自的状态和结果
+        queue_jobs (list): 预约队列中的 ReservationJob，按优先级排列
+        phase_tree (QTreeWidget): 运行状态面板，实时显示各阶段及其耗时
+        latency_table (QTableWidget): 各阶段耗时统计面板
     """
 
     def __init__(self):
         """初始化预约界面"""
         super().__init__()
         self.settings_file = "reservation_settings.json"
+        self.worker = None
+        self.worker_thread = None
+        self.running_phases = {}  # 阶段 id -> (树节点, 开始的单调时间)
+        self.phase_stack = []  # 正在进行的阶段树节点，最内层在最后
+        self.phase_durations = {}  # 阶段名称 -> [耗时秒数, ...]
+        self.queue_jobs = []
         self.initUI()
-        self.setGeometry(100, 100, 400, 700)  # 增加高度以容纳新的控件
+        self.setGeometry(100, 100, 520, 1100)  # 增加高度以容纳预约队列和运行状态面板
+
+        # 每 100 毫秒刷新正在进行的阶段的耗时
+        self.phase_timer = QTimer(self)
+        self.phase_timer.timeout.connect(self.refresh_running_phases)
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -90,8 +133,56 @@ class ReservationInterface(QWidget):
             alternative_layout.addWidget(QLabel(f"备选 {i + 1}:"))
             alternative_layout.addWidget(slot)
             self.alternative_slots.append(slot)
+        self.plan_button = QPushButton("按历史建议")
+        self.plan_button.setToolTip("根据预约历史排列备选时间段（售罄越慢越靠前），并建议提前准备时间")
+        self.plan_button.clicked.connect(self.apply_history_plan)
+        alternative_layout.addWidget(self.plan_button)
         layout.addLayout(alternative_layout)
 
+        # HTTP 直接提交选择框
+        self.http_submit_checkbox = QCheckBox("HTTP直接提交（更快）")
+        if 'use_http_submit' in settings:
+            self.http_submit_checkbox.setChecked(settings['use_http_submit'])
+        layout.addWidget(self.http_submit_checkbox)
+
+        # 记住登录会话选择框
+        self.remember_session_checkbox = QCheckBox("记住登录会话（加密保存，下次跳过登录）")
+        self.remember_session_checkbox.setChecked(settings.get('remember_session', True))
+        layout.addWidget(self.remember_session_checkbox)
+
+        # 快速浏览器模式选择框
+        self.fast_browser_checkbox = QCheckBox("快速浏览器模式（无界面，不加载图片和样式）")
+        if 'fast_browser' in settings:
+            self.fast_browser_checkbox.setChecked(settings['fast_browser'])
+        layout.addWidget(self.fast_browser_checkbox)
+
+        # 异步引擎选择框
+        self.async_engine_checkbox = QCheckBox("异步HTTP引擎（使用已保存的登录会话，不启动浏览器）")
+        if 'async_engine' in settings:
+            self.async_engine_checkbox.setChecked(settings['async_engine'])
+        layout.addWidget(self.async_engine_checkbox)
+
+        # 多标签页预加载选择框
+        self.preload_tabs_checkbox = QCheckBox("开放前在多个标签页中预加载所选时间段（不使用HTTP提交时有效）")
+        if 'preload_tabs' in settings:
+            self.preload_tabs_checkbox.setChecked(settings['preload_tabs'])
+        layout.addWidget(self.preload_tabs_checkbox)
+
+        # 约满后监控空位选择框
+        self.watch_checkbox = QCheckBox("所选时间段都约满时继续监控空位，有人取消立即预约（直到时间段开始）")
+        if 'watch' in settings:
+            self.watch_checkbox.setChecked(settings['watch'])
+        layout.addWidget(self.watch_checkbox)
+
+        # 重试时间预算
+        deadline_layout = QHBoxLayout()
+        deadline_layout.addWidget(QLabel("重试时限(秒):"))
+        self.deadline_spin = QSpinBox()
+        self.deadline_spin.setRange(10, 7200)
+        self.deadline_spin.setValue(settings.get('deadline', 600))
+        deadline_layout.addWidget(self.deadline_spin)
+        layout.addLayout(deadline_layout)
+
         # 预约时间执行选择框
         self.scheduled_execution_checkbox = QCheckBox("预约时间执行")
         if 'scheduled_execution' in settings:
@@ -116,14 +207,75 @@ class ReservationInterface(QWidget):
         else:
             self.start_time_edit.setTime(QTime.currentTime())
         scheduled_time_layout.addWidget(self.start_time_edit)
+        scheduled_time_layout.addWidget(QLabel("提前准备(秒):"))
+        self.lead_time_spin = QSpinBox()
+        self.lead_time_spin.setRange(0, 1800)
+        self.lead_time_spin.setValue(settings.get('lead_time', 120))
+        scheduled_time_layout.addWidget(self.lead_time_spin)
+        scheduled_time_layout.addWidget(QLabel("提前触发(毫秒):"))
+        self.fire_offset_spin = QSpinBox()
+        self.fire_offset_spin.setRange(-2000, 2000)
+        self.fire_offset_spin.setValue(settings.get('fire_offset_ms', 0))
+        scheduled_time_layout.addWidget(self.fire_offset_spin)
         self.scheduled_time_widget.setLayout(scheduled_time_layout)
         self.scheduled_time_widget.setVisible(self.scheduled_execution_checkbox.isChecked())
         layout.addWidget(self.scheduled_time_widget)
 
-        # 确认按钮
-        confirm_button = QPushButton("确认")
-        confirm_button.clicked.connect(self.confirm_selection)
-        layout.addWidget(confirm_button)
+        # 预约队列：多个日期和活动共用一次登录，按开放时间和优先级依次预约
+        self.queue_group = QGroupBox("预约队列（队列不为空时，确认后用一个登录会话依次预约队列中的任务）")
+        queue_layout = QVBoxLayout()
+        self.queue_table = QTableWidget(0, 5)
+        self.queue_table.setHorizontalHeaderLabels(["日期", "活动", "时间段", "开放时间", "状态"])
+        self.queue_table.verticalHeader().setVisible(False)
+        self.queue_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.queue_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.queue_table.setMaximumHeight(150)
+        queue_layout.addWidget(self.queue_table)
+        queue_button_layout = QHBoxLayout()
+        self.add_job_button = QPushButton("加入队列")
+        self.add_job_button.setToolTip("把当前选择的日期、活动、时间段和预约开始时间加入队列")
+        self.add_job_button.clicked.connect(self.add_to_queue)
+        queue_button_layout.addWidget(self.add_job_button)
+        self.remove_job_button = QPushButton("移除所选")
+        self.remove_job_button.clicked.connect(self.remove_from_queue)
+        queue_button_layout.addWidget(self.remove_job_button)
+        self.clear_queue_button = QPushButton("清空队列")
+        self.clear_queue_button.clicked.connect(self.clear_queue)
+        queue_button_layout.addWidget(self.clear_queue_button)
+        queue_layout.addLayout(queue_button_layout)
+        self.queue_group.setLayout(queue_layout)
+        layout.addWidget(self.queue_group)
+        for index, entry in enumerate(settings.get('queue', [])):
+            self.queue_jobs.append(ReservationJob.from_dict(dict(entry, priority=index)))
+        self.refresh_queue_table()
+
+        # 确认和取消按钮
+        button_layout = QHBoxLayout()
+        self.confirm_button = QPushButton("确认")
+        self.confirm_button.clicked.connect(self.confirm_selection)
+        button_layout.addWidget(self.confirm_button)
+        self.cancel_button = QPushButton("取消预约")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_reservation)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+
+        # 运行状态面板
+        self.status_group = QGroupBox("运行状态")
+        status_layout = QVBoxLayout()
+        self.status_label = QLabel("未开始")
+        status_layout.addWidget(self.status_label)
+        self.phase_tree = QTreeWidget()
+        self.phase_tree.setHeaderLabels(["阶段", "耗时(毫秒)", "结果"])
+        self.phase_tree.setColumnWidth(0, 260)
+        status_layout.addWidget(self.phase_tree)
+        self.latency_table = QTableWidget(0, 5)
+        self.latency_table.setHorizontalHeaderLabels(["阶段", "次数", "最近(毫秒)", "p50(毫秒)", "p95(毫秒)"])
+        self.latency_table.verticalHeader().setVisible(False)
+        status_layout.addWidget(self.latency_table)
+        self.status_group.setLayout(status_layout)
+        self.status_group.setVisible(False)
+        layout.addWidget(self.status_group)
 
         self.setLayout(layout)
         self.setWindowTitle('预约系统')
@@ -160,7 +312,17 @@ class ReservationInterface(QWidget):
             'alternative_slots': [slot.currentText() for slot in self.alternative_slots if slot.currentText()],
             'scheduled_execution': self.scheduled_execution_checkbox.isChecked(),
             'start_date': self.start_date_edit.date().toString("yyyy-MM-dd"),
-            'start_time': self.start_time_edit.time().toString("HH:mm")
+            'start_time': self.start_time_edit.time().toString("HH:mm"),
+            'lead_time': self.lead_time_spin.value(),
+            'fire_offset_ms': self.fire_offset_spin.value(),
+            'use_http_submit': self.http_submit_checkbox.isChecked(),
+            'fast_browser': self.fast_browser_checkbox.isChecked(),
+            'remember_session': self.remember_session_checkbox.isChecked(),
+            'deadline': self.deadline_spin.value(),
+            'preload_tabs': self.preload_tabs_checkbox.isChecked(),
+            'watch': self.watch_checkbox.isChecked(),
+            'async_engine': self.async_engine_checkbox.isChecked(),
+            'queue': [job.to_dict() for job in self.queue_jobs]
         }
         with open(self.settings_file, 'w') as f:
             json.dump(settings, f)
@@ -169,16 +331,12 @@ class ReservationInterface(QWidget):
         """
         更新时间段选项
 
-        根据选择的活动类型更新可用的时间段。
+        根据选择的活动类型更新可用的时间段，时间段来自 slot_catalog 缓存的目录，不发请求。
 
         参数:
             activity (str): 选择的活动类型
         """
-        if activity == "游泳":
-            slots = ["09:30-11:00", "12:00-14:00", "14:30-16:00", "16:30-18:00", "18:30-20:30"]
-        else:  # 健身
-            slots = ["10:30-12:00", "12:00-13:30", "13:30-15:00", "15:00-16:30", "16:30-18:00", "18:00-19:30",
-                     "19:30-21:00"]
+        slots = CATALOG.periods(normalize_activity(activity))
 
         self.primary_time_slot.clear()
         for slot in self.alternative_slots:
@@ -220,6 +378,35 @@ class ReservationInterface(QWidget):
         """获取当前选择的所有时间段"""
         return [self.primary_time_slot.currentText()] + [slot.currentText() for slot in self.alternative_slots]
 
+    def apply_history_plan(self):
+        """
+        根据预约历史调整备选时间段的顺序和提前准备时间
+
+        已经选择了备选时间段时只调整它们的顺序，否则从所有时间段中挑选售罄最慢的几个。
+        """
+        from attempt_history import HistoryStore, suggest_alternatives, suggest_lead_time
+
+        activity = normalize_activity(self.activity_combo.currentText())
+        primary = self.primary_time_slot.currentText()
+        chosen = [slot.currentText() for slot in self.alternative_slots if slot.currentText()]
+        store = HistoryStore()
+        try:
+            ordered = suggest_alternatives(store, activity, primary, chosen or self.get_all_slots())
+            lead_time = suggest_lead_time(store, activity)
+        except Exception as e:
+            self.show_error_message("读取预约历史失败", str(e))
+            return
+
+        others = [slot for slot in self.get_all_slots() if slot != primary]
+        ordered = ordered[:len(self.alternative_slots)]
+        for combo, period in zip(self.alternative_slots, ordered + [""] * len(self.alternative_slots)):
+            self.update_combo_box(combo, others)
+            combo.setCurrentText(period)
+        print(f"按预约历史建议的备选顺序: {ordered}")
+        if lead_time is not None:
+            self.lead_time_spin.setValue(min(lead_time, self.lead_time_spin.maximum()))
+            print(f"按准备阶段耗时建议提前 {lead_time} 秒准备")
+
     def toggle_scheduled_execution(self, state):
         """切换预约时间执行界面的显示状态"""
         if state == 2:  # 选中状态
@@ -227,8 +414,85 @@ class ReservationInterface(QWidget):
         else:
             self.scheduled_time_widget.hide()
 
+    def get_scheduled_start(self, selected_date):
+        """
+        读取并检查预约开始时间
+
+        参数:
+            selected_date (str): 预约日期，格式为 yyyy-MM-dd
+
+        返回:
+            datetime: 预约开始时间；没有勾选预约时间执行时返回 None，时间不合理时提示错误并返回 False
+        """
+        if not self.scheduled_execution_checkbox.isChecked():
+            return None
+        start_date = self.start_date_edit.date().toPyDate()
+        start_time = self.start_time_edit.time().toPyTime()
+        start_datetime = datetime.combine(start_date, start_time)
+        current_datetime = datetime.now()
+        if start_datetime <= current_datetime:
+            self.show_error_message("预约时间错误",
+                                    f"预约开始时间 {start_datetime.strftime('%Y-%m-%d %H:%M')} 不能早于当前时间：{current_datetime.strftime('%Y-%m-%d %H:%M')}")
+            return False
+        reservation_date = QDate.fromString(selected_date, "yyyy-MM-dd").toPyDate()
+        if reservation_date < start_date:
+            self.show_error_message("预约日期错误",
+                                    f"预约日期 {selected_date} 不能早于预约开始时间的日期：{start_date.strftime('%Y-%m-%d')}")
+            return False
+        return start_datetime
+
+    def add_to_queue(self):
+        """把当前选择的日期、活动、时间段和预约开始时间作为一个任务加入预约队列"""
+        selected_date = self.calendar.selectedDate().toString("yyyy-MM-dd")
+        start_at = self.get_scheduled_start(selected_date)
+        if start_at is False:
+            return
+        slots = [slot for slot in self.get_current_slots() if slot]
+        job = ReservationJob(self.activity_combo.currentText(), selected_date, slots, start_at,
+                             len(self.queue_jobs))
+        if any(dict(existing.to_dict(), priority=job.priority) == job.to_dict() for existing in self.queue_jobs):
+            self.show_error_message("任务重复", "队列中已有相同的预约任务。")
+            return
+        self.queue_jobs.append(job)
+        self.refresh_queue_table()
+        print(f"已加入预约队列: {job.describe()}")
+
+    def remove_from_queue(self):
+        """移除所选的任务，其余任务按原来的顺序重新排列优先级"""
+        rows = {index.row() for index in self.queue_table.selectionModel().selectedRows()}
+        self.queue_jobs = [job for row, job in enumerate(self.queue_jobs) if row not in rows]
+        for priority, job in enumerate(self.queue_jobs):
+            job.priority = priority
+        self.refresh_queue_table()
+
+    def clear_queue(self):
+        """清空预约队列"""
+        self.queue_jobs = []
+        self.refresh_queue_table()
+
+    def refresh_queue_table(self):
+        """按 queue_jobs 重新填写预约队列表格"""
+        self.queue_table.setRowCount(len(self.queue_jobs))
+        for row, job in enumerate(self.queue_jobs):
+            values = [job.reserve_date, ACTIVITY_LABELS[job.activity], "/".join(job.slots),
+                      job.start_at.strftime("%m-%d %H:%M") if job.start_at else "立即",
+                      STATUS_LABELS[job.status]]
+            for column, value in enumerate(values):
+                self.queue_table.setItem(row, column, QTableWidgetItem(value))
+        self.queue_table.resizeColumnsToContents()
+
+    def on_job_updated(self, job):
+        """预约队列中的任务状态变化时更新对应的一行，结果说明显示在提示中"""
+        item = self.queue_table.item(job["priority"], 4)
+        if item is None:
+            return
+        item.setText(STATUS_LABELS[job["status"]])
+        item.setToolTip(job["message"])
+        if job["booked"]:
+            item.setText(f"{STATUS_LABELS[job['status']]} {job['booked']}")
+
     def confirm_selection(self):
-        """确认选择并开始预约任务"""
+        """确认选择并开始预约任务；预约队列不为空时执行队列"""
         student_id = self.student_id_input.text()
         password = self.password_input.text()
 
@@ -236,6 +500,11 @@ class ReservationInterface(QWidget):
             self.show_error_message("信息不完整", "请输入学号和密码。")
             return
 
+        if self.queue_jobs:
+            self.start_queue(student_id, password)
+            self.save_settings()
+            return
+
         selected_date = self.calendar.selectedDate().toString("yyyy-MM-dd")
         selected_activity = self.activity_combo.currentText()
         primary_time_slot = self.primary_time_slot.currentText()
@@ -249,35 +518,53 @@ class ReservationInterface(QWidget):
         }
         print("预约信息:", result)
 
-        if self.scheduled_execution_checkbox.isChecked():
-            start_date = self.start_date_edit.date().toPyDate()
-            start_time = self.start_time_edit.time().toPyTime()
-            start_datetime = datetime.combine(start_date, start_time)
-            current_datetime = datetime.now()
-            if start_datetime <= current_datetime:
-                self.show_error_message("预约时间错误",
-                                        f"预约开始时间 {start_datetime.strftime('%Y-%m-%d %H:%M')} 不能早于当前时间：{current_datetime.strftime('%Y-%m-%d %H:%M')}")
-                return
-            reservation_date = QDate.fromString(selected_date, "yyyy-MM-dd").toPyDate()
-            if reservation_date < start_date:
-                self.show_error_message("预约日期错误",
-                                        f"预约日期 {selected_date} 不能早于预约开始时间的日期：{start_date.strftime('%Y-%m-%d')}")
-                return
-            wait_seconds = (start_datetime - current_datetime).total_seconds()
-            print(f"系统将在 {start_datetime.strftime('%Y-%m-%d %H:%M:%S')} 开始自动预约，请保持程序运行。")
-            # 创建并启动定时线程
-            timer_thread = threading.Thread(target=self.timed_execution,
-                                            args=(wait_seconds, student_id, password, selected_activity, selected_date,
-                                                  all_slots))
-            timer_thread.start()
+        start_datetime = self.get_scheduled_start(selected_date)
+        if start_datetime is False:
+            return
+        if start_datetime is not None:
+            lead_time = self.lead_time_spin.value()
+            prepare_datetime = start_datetime - timedelta(seconds=lead_time)
+            print(f"系统将在 {start_datetime.strftime('%Y-%m-%d %H:%M:%S')} 开始自动预约，"
+                  f"提前 {lead_time} 秒登录准备，请保持程序运行。")
+            self.start_worker((student_id, password, selected_activity, selected_date, all_slots),
+                              dict(self.get_engine_options(), start_at=start_datetime), prepare_datetime)
         else:
             print("立即开始预约...")
-            immediate_thread = threading.Thread(target=self.immediate_execution,
-                                                args=(
-                                                student_id, password, selected_activity, selected_date, all_slots))
-            immediate_thread.start()
+            self.start_worker((student_id, password, selected_activity, selected_date, all_slots),
+                              self.get_engine_options())
         self.save_settings()
-        self.close()
+
+    def start_queue(self, student_id, password):
+        """
+        执行预约队列
+
+        所有任务共用一个登录会话，由 run_queue 在各自的开放时间前 lead_time 秒开始准备，不需要界面等待。
+        界面保留队列的配置，执行的是它们的副本，每次执行都从头开始。
+        """
+        jobs = [ReservationJob.from_dict(job.to_dict()) for job in self.queue_jobs]
+        self.refresh_queue_table()
+        print(f"开始执行预约队列，共 {len(jobs)} 个任务")
+        options = {
+            'queue': True,
+            'browser_profile': "fast" if self.fast_browser_checkbox.isChecked() else "default",
+            'lead_time': self.lead_time_spin.value(),
+            'fire_offset': self.fire_offset_spin.value() / 1000,
+            'deadline': self.deadline_spin.value(),
+        }
+        self.start_worker((student_id, password, jobs), options)
+
+    def get_engine_options(self):
+        """获取预约引擎选项，async_engine 之外的选项都传递给 automated_login"""
+        return {
+            'use_http_submit': self.http_submit_checkbox.isChecked(),
+            'browser_profile': "fast" if self.fast_browser_checkbox.isChecked() else "default",
+            'fire_offset': self.fire_offset_spin.value() / 1000,
+            'remember_session': self.remember_session_checkbox.isChecked(),
+            'deadline': self.deadline_spin.value(),
+            'preload_tabs': self.preload_tabs_checkbox.isChecked(),
+            'watch': self.watch_checkbox.isChecked(),
+            'async_engine': self.async_engine_checkbox.isChecked(),
+        }
 
     def show_error_message(self, title, message):
         """显示错误消息"""
@@ -288,25 +575,119 @@ class ReservationInterface(QWidget):
         error_msg.setWindowTitle("错误")
         error_msg.exec()
 
-    def timed_execution(self, wait_seconds,student_id,password, activity, date, slots):
+    def start_worker(self, args, options, prepare_at=None):
         """
-        定时执行预约任务
+        在 QThread 中启动预约任务，窗口保持打开并显示运行状态
 
         参数:
-            wait_seconds (float): 等待的秒数
-            activity (str): 选择的活动
-            date (str): 选择的日期
-            slots (list): 选择的时间段列表
+            args (tuple): 预约函数的位置参数
+            options (dict): 预约引擎选项，见 get_engine_options；选择异步引擎时使用 run_reservation，
+                否则使用 automated_login；queue 为 True 时使用 run_queue，见 start_queue
+            prepare_at (datetime): 开始准备的时间，为 None 时立即执行
         """
-        time.sleep(wait_seconds)
-        print("开始执行预约...")
-        automated_login(student_id, password, activity, date, slots)
-
-    def immediate_execution(self,student_id, password, activity, date, slots):
-        """立即执行预约任务"""
-        print(f"立即执行预约: 活动 - {activity}, 日期 - {date}, 时间段 - {slots}")
-        # 这里调用 automated_login 或其他预约逻辑
-        automated_login(student_id, password, activity, date, slots)
+        queue = options.pop('queue', False)
+        target = load_engine(options.pop('async_engine', False), queue)
+        self.phase_tree.clear()
+        self.latency_table.setRowCount(0)
+        self.running_phases = {}
+        self.phase_stack = []
+        self.phase_durations = {}
+        self.status_group.setVisible(True)
+        self.status_label.setText(f"等待到 {prepare_at.strftime('%H:%M:%S')} 开始准备..." if prepare_at else "运行中...")
+
+        self.worker_thread = QThread(self)
+        self.worker = ReservationWorker(target, args, options, prepare_at, job_updates=queue)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.phase_started.connect(self.on_phase_started)
+        self.worker.phase_finished.connect(self.on_phase_finished)
+        self.worker.job_updated.connect(self.on_job_updated)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.worker.finished.connect(self.worker_thread.quit)
+        self.worker_thread.start()
+
+        self.confirm_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.queue_group.setEnabled(False)
+        self.phase_timer.start(100)
+
+    def on_phase_started(self, phase):
+        """阶段开始时在状态面板中添加一行，嵌套在正在进行的上一级阶段下"""
+        columns = [self.format_phase_name(phase), "0", "进行中"]
+        if self.phase_stack:
+            item = QTreeWidgetItem(self.phase_stack[-1], columns)
+            self.phase_stack[-1].setExpanded(True)
+        else:
+            item = QTreeWidgetItem(self.phase_tree, columns)
+        self.phase_stack.append(item)
+        self.running_phases[phase["id"]] = (item, phase["start"])
+        self.phase_tree.scrollToItem(item)
+        self.status_label.setText(f"正在进行: {phase['name']}")
+
+    def on_phase_finished(self, phase):
+        """阶段结束时写入最终耗时和结果，并更新耗时统计面板"""
+        item, _ = self.running_phases.pop(phase["id"], (None, None))
+        if item is None:
+            return
+        if item in self.phase_stack:
+            self.phase_stack.remove(item)
+        duration = phase["end"] - phase["start"]
+        item.setText(0, self.format_phase_name(phase))
+        item.setText(1, f"{duration * 1000:.0f}")
+        item.setText(2, phase["outcome"] + (f"（重试 {phase['retries']} 次）" if phase["retries"] else ""))
+        self.phase_durations.setdefault(phase["name"], []).append(duration)
+        self.update_latency_panel(phase["name"])
+
+    @staticmethod
+    def format_phase_name(phase):
+        """阶段名称后附上时间段、尝试次数等关键属性"""
+        details = [f"{key}={phase['attrs'][key]}" for key in ("attempt", "slot") if key in phase["attrs"]]
+        return f"{phase['name']} ({', '.join(details)})" if details else phase["name"]
+
+    def refresh_running_phases(self):
+        """刷新正在进行的阶段已经持续的时间"""
+        now = time.monotonic()
+        for item, start in self.running_phases.values():
+            item.setText(1, f"{(now - start) * 1000:.0f}")
+
+    def update_latency_panel(self, name):
+        """更新耗时统计面板中某个阶段的一行"""
+        durations = self.phase_durations[name]
+        rows = [self.latency_table.item(row, 0).text() for row in range(self.latency_table.rowCount())]
+        if name in rows:
+            row = rows.index(name)
+        else:
+            row = self.latency_table.rowCount()
+            self.latency_table.insertRow(row)
+        values = [name, str(len(durations)), f"{durations[-1] * 1000:.0f}",
+                  f"{statistics.median(durations) * 1000:.0f}", f"{percentile(durations, 0.95) * 1000:.0f}"]
+        for column, value in enumerate(values):
+            self.latency_table.setItem(row, column, QTableWidgetItem(value))
+
+    def on_worker_finished(self, success, message):
+        """预约任务结束"""
+        self.phase_timer.stop()
+        self.refresh_running_phases()
+        self.status_label.setText(message)
+        self.confirm_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.queue_group.setEnabled(True)
+        print(message)
+
+    def cancel_reservation(self):
+        """取消正在进行的预约，打断等待并关闭浏览器"""
+        if self.worker is not None:
+            self.status_label.setText("正在取消...")
+            self.cancel_button.setEnabled(False)
+            self.worker.cancel()
+
+    def closeEvent(self, event):
+        """关闭窗口时先取消正在进行的预约并等待浏览器关闭"""
+        if self.worker_thread is not None and self.worker_thread.isRunning():
+            self.worker.cancel_token.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait(15000)
+        super().closeEvent(event)
 
 
 def main():
@@ -314,6 +695,9 @@ def main():
     app = QApplication(sys.argv)
     ex = ReservationInterface()
     ex.show()
+    # 窗口显示后在后台导入预约引擎，用户点击确认时通常已经导入完成
+    threading.Thread(target=load_engine, args=(ex.async_engine_checkbox.isChecked(), bool(ex.queue_jobs)),
+                     daemon=True).start()
     sys.exit(app.exec())
 
 
@@ -0,0 +1,92 @@
+import threading
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from retry_policy import CancelToken, ReservationCancelled, cancel_scope
+from scheduler import wait_until
+
+
+class ReservationWorker(QObject):
+    """
+    在 QThread 中执行预约任务
+
+    预约引擎的每个阶段开始和结束时通过信号通知界面，信号跨线程自动排队到界面线程处理，
+    界面始终保持响应。cancel() 会打断所有等待并关闭浏览器。
+
+    信号:
+        phase_started (dict): 阶段开始，内容见 _snapshot
+        phase_finished (dict): 阶段结束
+        job_updated (dict): 预约队列中某个任务的状态变化，内容见 ReservationJob.snapshot
+        finished (bool, str): 任务结束，(是否预约成功, 结果说明)
+    """
+
+    phase_started = pyqtSignal(dict)
+    phase_finished = pyqtSignal(dict)
+    job_updated = pyqtSignal(dict)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, target, args, kwargs=None, prepare_at=None, job_updates=False):
+        """
+        参数:
+            target (callable): 预约函数，automated_login、run_reservation 或 run_queue
+            args (tuple): 预约函数的位置参数
+            kwargs (dict): 预约函数的关键字参数
+            prepare_at (datetime): 开始执行的时间，为 None 时立即执行
+            job_updates (bool): 预约函数是否接受 job_listener，执行预约队列时为 True
+        """
+        super().__init__()
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.prepare_at = prepare_at
+        self.cancel_token = CancelToken()
+        if job_updates:
+            self.kwargs["job_listener"] = self._on_job
+
+    @staticmethod
+    def _snapshot(span):
+        """复制阶段的当前状态，避免界面线程读到预约线程正在修改的对象"""
+        return {
+            "id": id(span),
+            "name": span.name,
+            "parent": span.parent,
+            "start": span.start,
+            "end": span.end,
+            "outcome": span.outcome,
+            "retries": span.retries,
+            "attrs": dict(span.attrs),
+        }
+
+    def _on_phase(self, event, span):
+        signal = self.phase_started if event == "start" else self.phase_finished
+        signal.emit(self._snapshot(span))
+
+    def _on_job(self, job):
+        self.job_updated.emit(job.snapshot())
+
+    def run(self):
+        """执行预约任务，在 QThread 启动时调用"""
+        success = False
+        try:
+            with cancel_scope(self.cancel_token):
+                if self.prepare_at is not None:
+                    print(f"等待到 {self.prepare_at.strftime('%Y-%m-%d %H:%M:%S')} 开始准备预约...")
+                    wait_until(self.prepare_at.timestamp())
+                    print("开始准备预约...")
+                success = bool(self.target(*self.args, cancel=self.cancel_token, phase_listener=self._on_phase,
+                                           **self.kwargs))
+            if success:
+                message = "预约成功"
+            elif self.cancel_token.cancelled:
+                message = "预约已取消"
+            else:
+                message = "预约失败"
+        except ReservationCancelled:
+            message = "预约已取消"
+        except Exception as e:
+            message = f"预约出错: {e}"
+        self.finished.emit(success, message)
+
+    def cancel(self):
+        """取消预约；关闭浏览器可能需要几秒，放在单独的线程中进行，不阻塞界面"""
+        threading.Thread(target=self.cancel_token.cancel, daemon=True).start()